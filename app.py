@@ -6,6 +6,13 @@ import streamlit as st
 import pandas as pd
 from pathlib import Path
 
+from modules.backends import create_backend
+from modules.checkpoint import fingerprint_bytes
+from modules.data_io import filter_with_advisor
+from modules.metrics import MAX_RUNS, get_collector
+from modules.result_store import get_result_store
+from modules.topics import TopicIndex, get_topic_index
+
 # Configuración de página
 st.set_page_config(
     page_title="Agente Asesores",
@@ -53,6 +60,199 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+
+# ============================================================
+# CACHÉ ENTRE INTERACCIONES
+# ============================================================
+def upload_fingerprint(uploaded) -> str:
+    """Hash del contenido de un archivo subido (se calcula una vez por archivo)."""
+    fingerprints = st.session_state.setdefault("upload_fingerprints", {})
+    key = (uploaded.name, uploaded.size, getattr(uploaded, "file_id", ""))
+    if key not in fingerprints:
+        fingerprints[key] = fingerprint_bytes(uploaded.getvalue())
+    return fingerprints[key]
+
+
+@st.cache_data(max_entries=4, show_spinner="Leyendo archivo...")
+def load_conversations(fingerprint: str, _uploaded) -> tuple:
+    """
+    Lee un archivo de conversaciones y filtra las que tienen asesor.
+
+    La clave de caché es el hash del contenido; el archivo en sí no se hashea.
+
+    Returns:
+        (total de filas, DataFrame con historial de asesor)
+    """
+    _uploaded.seek(0)
+    if _uploaded.name.endswith('.csv'):
+        df = pd.read_csv(_uploaded)
+    else:
+        df = pd.read_excel(_uploaded)
+
+    if "historial_de_mensajes_en_asesor" not in df.columns:
+        return len(df), df
+    return len(df), filter_with_advisor(df)
+
+
+@st.cache_data(max_entries=4, show_spinner="Leyendo resultados...")
+def load_results(fingerprint: str, _uploaded) -> pd.DataFrame:
+    """Lee un CSV de resultados (clave: hash del contenido)."""
+    _uploaded.seek(0)
+    return pd.read_csv(_uploaded)
+
+
+@st.cache_data(max_entries=16)
+def count_values(fingerprint: str, column: str, _df: pd.DataFrame) -> pd.Series:
+    """value_counts de una columna, calculado una vez por archivo."""
+    return _df[column].value_counts()
+
+
+@st.cache_data(max_entries=4, show_spinner="Detectando intereses...")
+def detect_interests(fingerprint: str, _texts: pd.Series) -> pd.DataFrame:
+    """Intereses del bot para todas las filas de un archivo."""
+    from modules.interests import get_default_detector
+
+    return get_default_detector().detect_frame(_texts)
+
+
+@st.cache_data(max_entries=16)
+def count_journal(path: str, mtime: float, size: int) -> int:
+    """Filas completadas de un diario (mtime y size invalidan la caché)."""
+    from modules.checkpoint import RunJournal
+
+    return len(RunJournal(path).completed_ids())
+
+
+def journal_completed(journal) -> int:
+    """Filas completadas de un diario sin releerlo en cada rerun."""
+    path = Path(journal.path)
+    if not path.exists():
+        return 0
+    stat = path.stat()
+    return count_journal(journal.path, stat.st_mtime, stat.st_size)
+
+
+@st.cache_data(max_entries=16, show_spinner="Leyendo resultados guardados...")
+def read_stored(kind: str, columns: tuple, companies: tuple, groups: tuple, date_from, date_to, revision) -> pd.DataFrame:
+    """Lectura proyectada del almacén (revision invalida la caché tras cada escritura)."""
+    return get_result_store().read(
+        kind,
+        columns=list(columns),
+        companies=list(companies),
+        groups=list(groups),
+        date_from=date_from,
+        date_to=date_to
+    )
+
+
+def stored_results(kind: str, columns: tuple, key: str) -> pd.DataFrame:
+    """Filtros por empresa, grupo y fecha sobre los resultados guardados."""
+    store = get_result_store()
+    partitions = store.partitions(kind)
+    if not partitions["date"]:
+        return None
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        companies = st.multiselect("Empresa", partitions["company_name"], key=f"{key}_companies")
+    with col2:
+        groups = st.multiselect("Grupo", partitions["group_name"], key=f"{key}_groups")
+    with col3:
+        dates = st.select_slider(
+            "Fechas",
+            options=partitions["date"],
+            value=(partitions["date"][0], partitions["date"][-1]),
+            key=f"{key}_dates"
+        )
+
+    return read_stored(
+        kind, tuple(columns), tuple(companies), tuple(groups),
+        dates[0], dates[-1], store.revision(kind)
+    )
+
+
+def save_results(df: pd.DataFrame, kind: str, run_id: str = None, writer=None) -> None:
+    """
+    Guarda resultados en el almacén (y los temas en el índice); un fallo no interrumpe el flujo.
+
+    Con writer (StoreWriter de una ejecución por bloques) las filas se
+    acumulan y se escriben (con sus temas) al cerrarlo con close_results.
+    """
+    try:
+        if writer is not None:
+            writer.add(df)
+            return
+        get_result_store().append(df, kind, run_id=run_id)
+        if kind == "analysis" and len(df):
+            index_topics(df)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudieron guardar los resultados para reportes: {str(e)}")
+
+
+def stored_rows(rows: list) -> list:
+    """Filas a guardar en el almacén: sin las reanudadas del checkpoint (ya guardadas)."""
+    return [row for row in rows if not row.get("resumed")]
+
+
+def session_analysis(columns: tuple = None) -> pd.DataFrame:
+    """
+    Análisis de la sesión: en memoria o, tras un análisis en streaming, leído del CSV de resultados.
+
+    Args:
+        columns: Columnas a leer del CSV (default: todas)
+
+    Returns:
+        DataFrame o None si no hay análisis en la sesión
+    """
+    if "analysis_df" in st.session_state:
+        return st.session_state["analysis_df"]
+    output_path = st.session_state.get("analysis_output")
+    if not output_path or not Path(output_path).exists():
+        return None
+    return pd.read_csv(output_path, usecols=(lambda col: col in columns) if columns else None)
+
+
+def start_session_run(name: str) -> str:
+    """
+    Inicia una ejecución de métricas y la registra en la sesión.
+
+    El colector es uno por proceso: el diagnóstico muestra (y reinicia)
+    solo las ejecuciones de la sesión actual.
+    """
+    run_id = get_collector().start_run(name)
+    runs = st.session_state.setdefault("metrics_runs", [])
+    runs.append(run_id)
+    # El colector solo conserva las últimas MAX_RUNS ejecuciones
+    del runs[:-MAX_RUNS]
+    return run_id
+
+
+def index_topics(df: pd.DataFrame) -> None:
+    """Agrega los temas de resultados guardados al índice persistente."""
+    topic_index = get_topic_index()
+    topic_index.update(df)
+    topic_index.save()
+
+
+def close_results(writer) -> None:
+    """Escribe lo acumulado por un StoreWriter; un fallo no interrumpe el flujo."""
+    try:
+        writer.close()
+    except Exception as e:
+        st.warning(f"⚠️ No se pudieron guardar los resultados para reportes: {str(e)}")
+
+
+@st.cache_resource(max_entries=4, show_spinner="Indexando temas...")
+def build_topic_index(fingerprint: str, _df: pd.DataFrame) -> TopicIndex:
+    """Índice de temas de un archivo de resultados (clave: hash del contenido)."""
+    return TopicIndex.from_results(_df)
+
+
+@st.cache_resource(show_spinner=False)
+def get_backend(api_key: str, model: str = "gemini-2.0-flash"):
+    """Cliente del modelo compartido entre interacciones (configura Gemini una vez)."""
+    return create_backend(api_key, model)
+
 # Sidebar de navegación
 st.sidebar.markdown("## 📊 Agente Asesores")
 st.sidebar.markdown("---")
@@ -89,6 +289,22 @@ if api_key:
     st.session_state["api_key"] = api_key
     st.sidebar.success("✓ API Key configurada")
 
+with st.sidebar.expander("🗄️ Caché de respuestas"):
+    from modules.llm_cache import get_default_cache
+
+    llm_cache = get_default_cache()
+    if llm_cache is None:
+        st.caption("Caché desactivada")
+    else:
+        cache_stats = llm_cache.stats()
+        st.caption(
+            f"{cache_stats['entries']} respuestas · "
+            f"{cache_stats['size_bytes'] / 1_048_576:.1f} MB · "
+            f"aciertos {cache_stats['hits']} / fallos {cache_stats['misses']}"
+        )
+        if st.button("Vaciar caché"):
+            llm_cache.clear()
+
 # ============================================================
 # PÁGINA: INICIO
 # ============================================================
@@ -153,31 +369,30 @@ elif page == "analisis_asesores":
         help="El archivo debe contener las columnas: conversation_id, historial_de_mensajes_en_bot, historial_de_mensajes_en_asesor"
     )
 
-    if uploaded_file:
-        # Leer archivo
+    streaming_mode = st.checkbox(
+        "⚡ Modo streaming (archivos grandes)",
+        help="Lee el archivo por bloques y escribe cada bloque analizado a disco; la memoria no crece con el tamaño del archivo"
+    )
+
+    if uploaded_file and not streaming_mode:
+        # Leer archivo (una sola vez por contenido; las interacciones reutilizan la caché)
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
+            file_fingerprint = upload_fingerprint(uploaded_file)
+            total_rows, df_with_advisor = load_conversations(file_fingerprint, uploaded_file)
 
-            st.success(f"✓ Archivo cargado: {len(df)} registros")
+            st.success(f"✓ Archivo cargado: {total_rows} registros")
 
             # Mostrar preview
             with st.expander("👀 Vista previa de datos", expanded=False):
-                st.dataframe(df.head(10), use_container_width=True)
+                st.dataframe(df_with_advisor.head(10), use_container_width=True)
 
             # Validar columnas requeridas
             required_cols = ["conversation_id", "historial_de_mensajes_en_asesor"]
-            missing_cols = [col for col in required_cols if col not in df.columns]
+            missing_cols = [col for col in required_cols if col not in df_with_advisor.columns]
 
             if missing_cols:
                 st.error(f"❌ Faltan columnas requeridas: {', '.join(missing_cols)}")
             else:
-                # Filtrar solo conversaciones con asesor
-                df_with_advisor = df[df["historial_de_mensajes_en_asesor"].notna() &
-                                     (df["historial_de_mensajes_en_asesor"] != "")]
-
                 st.info(f"📊 {len(df_with_advisor)} conversaciones con historial de asesor")
 
                 # Opciones de análisis
@@ -200,6 +415,58 @@ elif page == "analisis_asesores":
                         value=0
                     )
 
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    max_workers = st.slider(
+                        "Solicitudes concurrentes",
+                        min_value=1,
+                        max_value=32,
+                        value=8,
+                        help="Número de llamadas a Gemini en paralelo"
+                    )
+
+                with col2:
+                    pack_size = st.slider(
+                        "Conversaciones por solicitud",
+                        min_value=1,
+                        max_value=20,
+                        value=1,
+                        help="Agrupa varias conversaciones en una sola llamada para reducir solicitudes y tokens de instrucciones"
+                    )
+
+                use_dedup = st.checkbox(
+                    "🧬 Analizar una sola vez las conversaciones casi idénticas",
+                    value=False,
+                    help="Agrupa hilos con plantillas repetidas (mismo flujo, mismo saludo) y copia el resultado del representante al resto"
+                )
+
+                use_triage = st.checkbox(
+                    "⚡ Evaluar con reglas las conversaciones triviales",
+                    value=False,
+                    help="Sin respuesta del asesor o un único saludo genérico sin respuesta del cliente: se puntúan sin llamar a Gemini y quedan marcadas como heurísticas"
+                )
+
+                use_incremental = st.checkbox(
+                    "♻️ Reutilizar los análisis guardados de conversaciones sin cambios",
+                    value=False,
+                    help="Solo se envían a Gemini las conversaciones nuevas o modificadas desde ejecuciones anteriores"
+                )
+
+                # Checkpoint de la ejecución (por contenido del archivo)
+                from modules.checkpoint import RunJournal
+
+                journal = RunJournal.for_run("analisis", file_fingerprint)
+                completed_count = journal_completed(journal)
+
+                resume_run = True
+                if completed_count:
+                    resume_run = st.checkbox(
+                        f"Reanudar: {completed_count} conversaciones ya analizadas en una ejecución previa",
+                        value=True,
+                        help="Si se desmarca, se descarta el checkpoint y se analiza todo de nuevo"
+                    )
+
                 # Columnas a preservar del archivo original
                 st.markdown("#### Columnas a incluir del archivo original")
 
@@ -217,13 +484,13 @@ elif page == "analisis_asesores":
                 ]
 
                 # Filtrar solo las que existen en el archivo
-                available_cols = [col for col in recommended_cols if col in df.columns]
-                other_cols = [col for col in df.columns if col not in recommended_cols]
+                available_cols = [col for col in recommended_cols if col in df_with_advisor.columns]
+                other_cols = [col for col in df_with_advisor.columns if col not in recommended_cols]
 
                 # Selector de columnas
                 selected_cols = st.multiselect(
                     "Selecciona columnas a conservar",
-                    options=df.columns.tolist(),
+                    options=df_with_advisor.columns.tolist(),
                     default=available_cols,
                     help="Estas columnas se incluirán junto con el análisis"
                 )
@@ -236,7 +503,10 @@ elif page == "analisis_asesores":
                         # Importar módulo de análisis
                         from modules.advisor_analyzer import AdvisorAnalyzer
 
-                        analyzer = AdvisorAnalyzer(st.session_state["api_key"])
+                        analyzer = AdvisorAnalyzer(
+                            st.session_state["api_key"],
+                            backend=get_backend(st.session_state["api_key"])
+                        )
 
                         # Preparar datos
                         sample_df = df_with_advisor.iloc[start_from:].copy()
@@ -247,16 +517,52 @@ elif page == "analisis_asesores":
                         progress_bar = st.progress(0)
                         status_text = st.empty()
 
-                        results = []
-                        total = len(sample_df)
+                        def update_progress(done, total):
+                            status_text.text(f"Procesando {done}/{total}...")
+                            progress_bar.progress(done / total)
+
+                        rows = sample_df.to_dict("records")
+
+                        if not resume_run:
+                            journal.clear()
+
+                        run_id = start_session_run("analisis")
 
-                        for idx, (row_idx, row) in enumerate(sample_df.iterrows()):
-                            status_text.text(f"Procesando {idx+1}/{total}...")
-                            progress_bar.progress((idx + 1) / total)
+                        from modules.dedup import NearDuplicateIndex
+                        dedup = NearDuplicateIndex() if use_dedup else None
 
-                            # Analizar conversación
-                            analysis = analyzer.analyze_conversation(row.to_dict())
+                        previous = None
+                        if use_incremental:
+                            previous = get_result_store().lookup(
+                                "analysis", [analyzer.content_hash(row) for row in rows]
+                            )
 
+                        # Analizar conversaciones en paralelo
+                        analyses = analyzer.analyze_batch(
+                            rows,
+                            progress_callback=update_progress,
+                            max_workers=max_workers,
+                            journal=journal,
+                            pack_size=pack_size,
+                            dedup=dedup,
+                            triage=use_triage,
+                            previous=previous
+                        )
+
+                        if previous is not None:
+                            reused = sum(1 for analysis in analyses if analysis["reused"])
+                            st.info(f"♻️ {reused} conversaciones sin cambios reutilizaron su análisis guardado")
+
+                        if use_triage:
+                            heuristic = sum(1 for analysis in analyses if analysis["heuristic"])
+                            st.info(f"⚡ {heuristic} conversaciones triviales evaluadas con reglas, sin llamar al modelo")
+
+                        if dedup is not None:
+                            duplicates = sum(1 for analysis in analyses if analysis["duplicate_of"] is not None)
+                            st.info(f"🧬 {duplicates} conversaciones casi idénticas reutilizaron el análisis de su grupo")
+
+                        results = []
+                        for row, analysis in zip(rows, analyses):
                             # Combinar columnas originales con análisis
                             result = {}
 
@@ -270,38 +576,63 @@ elif page == "analisis_asesores":
 
                             results.append(result)
 
-                        # Crear DataFrame combinado
+                        # Filas fallidas: se guardan aparte para reintentarlas solas
+                        st.session_state["analysis_run_id"] = run_id
+                        st.session_state["analysis_failed"] = [
+                            (pos, row) for pos, (row, analysis) in enumerate(zip(rows, analyses))
+                            if not analysis["analysis_success"]
+                        ]
+
+                        # Guardar en el almacén con las columnas de partición
+                        # (los reutilizados se registran con `reused` bajo esta ejecución)
+                        save_results(
+                            pd.DataFrame([
+                                {
+                                    **{col: row.get(col) for col in ("conversation_id", "company_name", "group_name", "user_name")},
+                                    **analysis
+                                }
+                                for row, analysis in zip(rows, analyses)
+                                if not analysis.get("resumed")
+                            ]),
+                            "analysis",
+                            run_id
+                        )
+
+                        # Crear DataFrame combinado (única copia que se conserva)
                         results_df = pd.DataFrame(results)
+                        del results, rows, analyses, sample_df
 
                         # Guardar resultados en session state
-                        st.session_state["analysis_results"] = results
                         st.session_state["analysis_df"] = results_df
-                        st.session_state["original_df"] = sample_df
+                        st.session_state.pop("analysis_output", None)
 
                         status_text.text("✅ Análisis completado!")
 
-                        # Mostrar resumen
-                        results_df = pd.DataFrame(results)
-
+                        # Mostrar resumen (los errores no cuentan en los promedios)
                         st.markdown("### 📊 Resumen de Resultados")
 
+                        ok_df = results_df[results_df["analysis_success"]]
+
                         col1, col2, col3, col4 = st.columns(4)
 
                         with col1:
-                            avg_score = results_df["agent_score_numeric"].mean()
+                            avg_score = ok_df["agent_score_numeric"].mean()
                             st.metric("Promedio Score", f"{avg_score:.2f}/5")
 
                         with col2:
-                            top_advisors = len(results_df[results_df["agent_score_numeric"] >= 4])
-                            st.metric("Score ≥ 4", f"{top_advisors} ({top_advisors/len(results_df)*100:.1f}%)")
+                            top_advisors = len(ok_df[ok_df["agent_score_numeric"] >= 4])
+                            st.metric("Score ≥ 4", f"{top_advisors} ({top_advisors/max(len(ok_df), 1)*100:.1f}%)")
 
                         with col3:
-                            efficient = results_df["first_response_efficient"].sum()
-                            st.metric("Primera Resp. Eficiente", f"{efficient} ({efficient/len(results_df)*100:.1f}%)")
+                            efficient = ok_df["first_response_efficient"].sum()
+                            st.metric("Primera Resp. Eficiente", f"{efficient} ({efficient/max(len(ok_df), 1)*100:.1f}%)")
 
                         with col4:
                             st.metric("Total Analizados", len(results_df))
 
+                        if len(ok_df) < len(results_df):
+                            st.caption(f"{len(results_df) - len(ok_df)} conversaciones con error, excluidas de los promedios")
+
                         # Mostrar resultados
                         st.markdown("### 📋 Resultados Detallados")
                         st.dataframe(results_df, use_container_width=True)
@@ -316,6 +647,241 @@ elif page == "analisis_asesores":
                             use_container_width=True
                         )
 
+                # Reintento de filas fallidas sin repetir todo el lote
+                failed = st.session_state.get("analysis_failed", [])
+                if failed and "analysis_df" in st.session_state:
+                    st.warning(f"⚠️ {len(failed)} conversaciones fallaron en el último análisis")
+
+                    if st.button(f"🔁 Reintentar {len(failed)} fallidas", use_container_width=True):
+                        from modules.advisor_analyzer import AdvisorAnalyzer
+
+                        analyzer = AdvisorAnalyzer(
+                            st.session_state["api_key"],
+                            backend=get_backend(st.session_state["api_key"])
+                        )
+                        results_df = st.session_state["analysis_df"]
+                        start_session_run("analisis_reintento")
+                        retried = analyzer.retry_failed(
+                            [row for _, row in failed],
+                            [results_df.loc[pos].to_dict() for pos, _ in failed],
+                            max_workers=max_workers,
+                            journal=journal
+                        )
+
+                        for (pos, _), analysis in zip(failed, retried):
+                            for key, value in analysis.items():
+                                results_df.at[pos, key] = value
+
+                        # Las recuperadas se guardan igual que en la primera pasada
+                        save_results(
+                            pd.DataFrame([
+                                {
+                                    **{col: row.get(col) for col in ("conversation_id", "company_name", "group_name", "user_name")},
+                                    **analysis
+                                }
+                                for (_, row), analysis in zip(failed, retried)
+                                if analysis["analysis_success"]
+                            ]),
+                            "analysis",
+                            st.session_state.get("analysis_run_id")
+                        )
+
+                        st.session_state["analysis_failed"] = [
+                            (pos, row) for (pos, row), analysis in zip(failed, retried)
+                            if not analysis["analysis_success"]
+                        ]
+                        st.success(
+                            f"✓ {len(failed) - len(st.session_state['analysis_failed'])} "
+                            f"de {len(failed)} conversaciones recuperadas"
+                        )
+
+        except Exception as e:
+            st.error(f"❌ Error al procesar archivo: {str(e)}")
+
+    elif uploaded_file:
+        try:
+            from modules.checkpoint import DEFAULT_RUNS_DIR, RunJournal
+            from modules.data_io import CONTEXT_COLUMNS, ResultWriter, iter_chunks
+
+            # Solo se lee el primer bloque para validar y previsualizar
+            preview_df = next(iter_chunks(uploaded_file, 10))
+            uploaded_file.seek(0)
+
+            with st.expander("👀 Vista previa de datos", expanded=False):
+                st.dataframe(preview_df, use_container_width=True)
+
+            required_cols = ["conversation_id", "historial_de_mensajes_en_asesor"]
+            missing_cols = [col for col in required_cols if col not in preview_df.columns]
+
+            if missing_cols:
+                st.error(f"❌ Faltan columnas requeridas: {', '.join(missing_cols)}")
+            else:
+                col1, col2, col3 = st.columns(3)
+
+                with col1:
+                    chunk_size = st.number_input(
+                        "Filas por bloque",
+                        min_value=100,
+                        max_value=20000,
+                        value=1000,
+                        step=100
+                    )
+
+                with col2:
+                    max_workers = st.slider(
+                        "Solicitudes concurrentes",
+                        min_value=1,
+                        max_value=32,
+                        value=8
+                    )
+
+                with col3:
+                    pack_size = st.slider(
+                        "Conversaciones por solicitud",
+                        min_value=1,
+                        max_value=20,
+                        value=1
+                    )
+
+                use_dedup = st.checkbox(
+                    "🧬 Analizar una sola vez las conversaciones casi idénticas",
+                    value=False
+                )
+
+                use_triage = st.checkbox(
+                    "⚡ Evaluar con reglas las conversaciones triviales",
+                    value=False
+                )
+
+                use_incremental = st.checkbox(
+                    "♻️ Reutilizar los análisis guardados de conversaciones sin cambios",
+                    value=False
+                )
+
+                # Checkpoint de la ejecución (por contenido del archivo)
+                fingerprint = upload_fingerprint(uploaded_file)
+                journal = RunJournal.for_run("analisis", fingerprint)
+                completed_count = journal_completed(journal)
+
+                resume_run = True
+                if completed_count:
+                    resume_run = st.checkbox(
+                        f"Reanudar: {completed_count} conversaciones ya analizadas en una ejecución previa",
+                        value=True,
+                        key="streaming_resume",
+                        help="Si se desmarca, se descarta el checkpoint y se analiza todo de nuevo"
+                    )
+
+                if st.button("🚀 Iniciar Análisis en Streaming", type="primary", use_container_width=True):
+                    if not st.session_state.get("api_key"):
+                        st.error("❌ Configura tu API Key en el panel lateral")
+                    else:
+                        from modules.advisor_analyzer import AdvisorAnalyzer
+
+                        analyzer = AdvisorAnalyzer(
+                            st.session_state["api_key"],
+                            backend=get_backend(st.session_state["api_key"])
+                        )
+
+                        if not resume_run:
+                            journal.clear()
+
+                        output_path = str(Path(DEFAULT_RUNS_DIR) / f"analisis_{fingerprint}_resultados.csv")
+                        writer = ResultWriter(output_path)
+
+                        status_text = st.empty()
+                        run_id = start_session_run("analisis_streaming")
+                        st.session_state["analysis_streaming_run_id"] = run_id
+
+                        from modules.dedup import NearDuplicateIndex
+                        dedup = NearDuplicateIndex() if use_dedup else None
+
+                        # El almacén acumula los bloques y escribe por lotes (lo pendiente, al cerrar)
+                        store_writer = get_result_store().writer("analysis", run_id, on_write=index_topics)
+
+                        try:
+                            for chunk in iter_chunks(uploaded_file, chunk_size):
+                                chunk = filter_with_advisor(chunk)
+                                keep = [col for col in CONTEXT_COLUMNS if col in chunk.columns]
+                                rows = chunk.to_dict("records")
+                                start = writer.rows_written
+
+                                previous = None
+                                if use_incremental:
+                                    previous = get_result_store().lookup(
+                                        "analysis", [analyzer.content_hash(row) for row in rows]
+                                    )
+
+                                analyses = analyzer.analyze_batch(
+                                    rows,
+                                    progress_callback=lambda done, _: status_text.text(
+                                        f"Procesadas {start + done} conversaciones..."
+                                    ),
+                                    max_workers=max_workers,
+                                    journal=journal,
+                                    pack_size=pack_size,
+                                    dedup=dedup,
+                                    triage=use_triage,
+                                    previous=previous
+                                )
+
+                                # Cada bloque se escribe a disco y se descarta
+                                chunk_results = [
+                                    {**{col: row.get(col, "") for col in keep}, **analysis}
+                                    for row, analysis in zip(rows, analyses)
+                                ]
+                                writer.write(chunk_results)
+                                save_results(
+                                    pd.DataFrame(stored_rows(chunk_results)),
+                                    "analysis",
+                                    writer=store_writer
+                                )
+                        finally:
+                            # Un error a mitad del archivo no descarta los bloques ya acumulados
+                            close_results(store_writer)
+
+                        status_text.text(f"✅ Análisis completado: {writer.rows_written} conversaciones")
+
+                        # Resumen leyendo solo las columnas necesarias
+                        summary_df = pd.read_csv(
+                            output_path,
+                            usecols=lambda col: col in (
+                                "agent_score_numeric", "first_response_efficient", "client_intention",
+                                "analysis_success"
+                            )
+                        )
+                        # Reportes lee del CSV las columnas que necesita (no solo las del resumen)
+                        st.session_state["analysis_output"] = output_path
+                        st.session_state.pop("analysis_df", None)
+                        st.session_state.pop("analysis_failed", None)
+
+                        # Los errores no cuentan en los promedios
+                        ok_df = summary_df[summary_df["analysis_success"] == True]
+
+                        col1, col2, col3 = st.columns(3)
+
+                        with col1:
+                            st.metric("Promedio Score", f"{ok_df['agent_score_numeric'].mean():.2f}/5")
+
+                        with col2:
+                            top_advisors = int((ok_df["agent_score_numeric"] >= 4).sum())
+                            st.metric("Score ≥ 4", f"{top_advisors} ({top_advisors/max(len(ok_df), 1)*100:.1f}%)")
+
+                        with col3:
+                            st.metric("Total Analizados", len(summary_df))
+
+                        if len(ok_df) < len(summary_df):
+                            st.caption(f"{len(summary_df) - len(ok_df)} conversaciones con error, excluidas de los promedios")
+
+                        with open(output_path, "rb") as f:
+                            st.download_button(
+                                "📥 Descargar Resultados (CSV)",
+                                f,
+                                "analisis_asesores.csv",
+                                "text/csv",
+                                use_container_width=True
+                            )
+
         except Exception as e:
             st.error(f"❌ Error al procesar archivo: {str(e)}")
 
@@ -340,18 +906,43 @@ elif page == "analisis_intenciones":
     with tab1:
         st.markdown("### Distribución de Intenciones")
 
-        uploaded_results = st.file_uploader(
-            "📁 Cargar resultados del análisis (CSV)",
-            type=["csv"],
-            key="intentions_upload"
+        intentions_source = st.radio(
+            "Origen de los resultados",
+            ["Archivo CSV", "Resultados guardados"],
+            horizontal=True,
+            key="intentions_source"
         )
 
-        if uploaded_results:
-            results_df = pd.read_csv(uploaded_results)
+        results_df = None
+        if intentions_source == "Resultados guardados":
+            stored_columns = (
+                "conversation_id", "agent_score_numeric", "agent_score_text",
+                "client_intention", "use_case", "key_topics"
+            )
+            results_df = stored_results("analysis", stored_columns, key="intentions_store")
+            if results_df is None:
+                st.info("Aún no hay análisis guardados")
+            else:
+                # Misma revisión del almacén y mismos filtros: mismos conteos
+                results_fingerprint = "store-" + repr((
+                    get_result_store().revision("analysis"),
+                    *(st.session_state.get(f"intentions_store_{name}") for name in ("companies", "groups", "dates"))
+                ))
+        else:
+            uploaded_results = st.file_uploader(
+                "📁 Cargar resultados del análisis (CSV)",
+                type=["csv"],
+                key="intentions_upload"
+            )
+            if uploaded_results:
+                results_fingerprint = upload_fingerprint(uploaded_results)
+                results_df = load_results(results_fingerprint, uploaded_results)
+
+        if results_df is not None:
             st.session_state["intentions_df"] = results_df
 
             if "client_intention" in results_df.columns:
-                intention_counts = results_df["client_intention"].value_counts()
+                intention_counts = count_values(results_fingerprint, "client_intention", results_df)
 
                 col1, col2 = st.columns([2, 1])
 
@@ -374,6 +965,39 @@ elif page == "analisis_intenciones":
             else:
                 st.warning("El archivo no contiene la columna 'client_intention'")
 
+            if "key_topics" in results_df.columns:
+                st.markdown("### Temas más Frecuentes")
+
+                topic_filters = {}
+                if intentions_source == "Resultados guardados":
+                    # Índice persistente: mismos filtros de empresa y grupo
+                    topic_index = get_topic_index()
+                    topic_filters["companies"] = st.session_state.get("intentions_store_companies")
+                    topic_filters["groups"] = st.session_state.get("intentions_store_groups")
+                    st.session_state.pop("intentions_topics", None)
+                else:
+                    topic_index = build_topic_index(results_fingerprint, results_df)
+                    st.session_state["intentions_topics"] = topic_index
+
+                topic_filters["use_cases"] = st.multiselect(
+                    "Caso de uso",
+                    topic_index.values("use_case"),
+                    key="topics_use_cases"
+                )
+                top_topics = topic_index.top(20, **topic_filters)
+
+                if len(top_topics):
+                    import plotly.express as px
+                    fig = px.bar(
+                        top_topics, x="count", y="topic", orientation="h",
+                        title="Temas Clave",
+                        labels={"count": "Conversaciones", "topic": "Tema"}
+                    )
+                    fig.update_layout(yaxis={"categoryorder": "total ascending"})
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.info("No hay temas para los filtros seleccionados")
+
     # TAB 2: Top Asesores
     with tab2:
         st.markdown("### Respuestas de Asesores con Score 5")
@@ -419,16 +1043,54 @@ elif page == "analisis_intenciones":
                 if "intentions_df" in st.session_state and st.session_state.get("api_key"):
                     from modules.script_generator import generate_sales_script
 
+                    start_session_run("script")
                     with st.spinner("Generando script..."):
                         script = generate_sales_script(
                             st.session_state["intentions_df"],
-                            st.session_state["api_key"]
+                            st.session_state["api_key"],
+                            backend=get_backend(st.session_state["api_key"])
                         )
                         st.session_state["sales_script"] = script
                         st.text_area("Script Generado", script, height=400)
                 else:
                     st.error("Carga los datos y configura la API Key")
 
+            st.markdown("#### Scripts por Caso de Uso")
+            st.caption("Se generan en paralelo; solo se regeneran los casos de uso cuyas conversaciones cambiaron")
+
+            if st.button("🔄 Generar Scripts por Caso de Uso"):
+                if "intentions_df" in st.session_state and st.session_state.get("api_key"):
+                    from modules.script_generator import generate_scripts_by_use_case
+
+                    start_session_run("scripts_caso_uso")
+                    scripts_progress = st.progress(0)
+                    scripts = generate_scripts_by_use_case(
+                        st.session_state["intentions_df"],
+                        st.session_state["api_key"],
+                        backend=get_backend(st.session_state["api_key"]),
+                        previous=st.session_state.get("use_case_scripts"),
+                        progress_callback=lambda done, total: scripts_progress.progress(done / total)
+                    )
+                    if scripts:
+                        st.session_state["use_case_scripts"] = scripts
+                        reused = sum(1 for item in scripts.values() if item.get("reused"))
+                        if reused:
+                            st.info(f"♻️ {reused} de {len(scripts)} scripts sin cambios en sus conversaciones")
+                    else:
+                        st.warning("Los resultados no contienen la columna 'use_case'")
+                else:
+                    st.error("Carga los datos y configura la API Key")
+
+            use_case_scripts = st.session_state.get("use_case_scripts")
+            if use_case_scripts:
+                script_tabs = st.tabs(list(use_case_scripts))
+                for script_tab, (use_case, item) in zip(script_tabs, use_case_scripts.items()):
+                    with script_tab:
+                        st.text_area("Script", item["script"], height=300, key=f"use_case_script_{use_case}")
+                        if item.get("success") and st.button("Usar para el comparador", key=f"use_case_script_use_{use_case}"):
+                            st.session_state["sales_script"] = item["script"]
+                            st.success("✓ Script guardado")
+
     # TAB 4: Base de Conocimiento
     with tab4:
         st.markdown("### Base de Conocimiento")
@@ -448,17 +1110,45 @@ elif page == "analisis_intenciones":
                 st.session_state["knowledge_base"] = kb_text
                 st.success("✓ KB guardado")
         else:
+            kb_full = st.checkbox(
+                "📚 Leer todas las conversaciones (map-reduce)",
+                value=False,
+                help="Extrae hechos de bloques de conversaciones en paralelo y los consolida por etapas; sin esto solo se usan los temas e intenciones más frecuentes"
+            )
+
             if st.button("🔄 Generar KB desde Datos"):
                 if "intentions_df" in st.session_state and st.session_state.get("api_key"):
-                    from modules.kb_generator import generate_knowledge_base
+                    from modules.kb_generator import generate_knowledge_base, generate_knowledge_base_mapreduce
 
-                    with st.spinner("Generando KB..."):
-                        kb = generate_knowledge_base(
+                    start_session_run("kb")
+                    if kb_full:
+                        kb_progress = st.progress(0)
+                        kb, kb_report = generate_knowledge_base_mapreduce(
                             st.session_state["intentions_df"],
-                            st.session_state["api_key"]
+                            st.session_state["api_key"],
+                            backend=get_backend(st.session_state["api_key"]),
+                            progress_callback=lambda done, total: kb_progress.progress(min(1.0, done / total))
                         )
-                        st.session_state["knowledge_base"] = kb
-                        st.text_area("KB Generado", kb, height=400)
+                        if kb_report["failed_chunks"]:
+                            st.warning(
+                                f"⚠️ {kb_report['failed_chunks']} de {kb_report['chunks']} bloques de "
+                                "conversaciones fallaron y no están en la KB"
+                            )
+                        if kb_report["failed_groups"]:
+                            st.warning(
+                                f"⚠️ {kb_report['failed_groups']} consolidaciones fallaron; "
+                                "sus extractos pasaron sin consolidar"
+                            )
+                    else:
+                        with st.spinner("Generando KB..."):
+                            kb = generate_knowledge_base(
+                                st.session_state["intentions_df"],
+                                st.session_state["api_key"],
+                                backend=get_backend(st.session_state["api_key"]),
+                                topic_index=st.session_state.get("intentions_topics")
+                            )
+                    st.session_state["knowledge_base"] = kb
+                    st.text_area("KB Generado", kb, height=400)
                 else:
                     st.error("Carga los datos y configura la API Key")
 
@@ -503,24 +1193,77 @@ elif page == "comparador":
 
     if uploaded_compare:
         try:
-            if uploaded_compare.name.endswith('.csv'):
-                compare_df = pd.read_csv(uploaded_compare)
-            else:
-                compare_df = pd.read_excel(uploaded_compare)
-
-            # Filtrar conversaciones con asesor
-            compare_df = compare_df[
-                compare_df["historial_de_mensajes_en_asesor"].notna() &
-                (compare_df["historial_de_mensajes_en_asesor"] != "")
-            ]
+            # Lectura y filtro de conversaciones con asesor (en caché por contenido)
+            compare_fingerprint = upload_fingerprint(uploaded_compare)
+            _, compare_df = load_conversations(compare_fingerprint, uploaded_compare)
 
             st.success(f"✓ {len(compare_df)} conversaciones disponibles para comparar")
 
-            sample_size = st.slider(
-                "Tamaño de muestra",
-                min_value=10,
-                max_value=min(100, len(compare_df)),
-                value=min(50, len(compare_df))
+            # Intereses precalculados sobre toda la columna (sin llamar al modelo)
+            interest_df = None
+            if "historial_de_mensajes_en_bot" in compare_df.columns:
+                from modules.interests import get_default_detector
+
+                detector = get_default_detector()
+                interest_df = detect_interests(compare_fingerprint, compare_df["historial_de_mensajes_en_bot"])
+                labels = {label: category for category, (label, _) in detector.keywords.items()}
+
+                interest_filter = st.multiselect(
+                    "Filtrar por interés detectado en el bot",
+                    list(labels.keys()),
+                    help="Compara solo conversaciones donde el cliente expresó alguno de estos intereses"
+                )
+                if interest_filter:
+                    mask = interest_df[[labels[label] for label in interest_filter]].any(axis=1)
+                    compare_df = compare_df[mask]
+                    st.caption(f"{len(compare_df)} conversaciones con los intereses seleccionados")
+
+            if len(compare_df) < 10:
+                st.warning("⚠️ Se necesitan al menos 10 conversaciones para comparar")
+                st.stop()
+
+            adaptive = st.checkbox(
+                "🎯 Muestreo adaptativo",
+                value=False,
+                help="Muestra estratificada por grupo, asesor e interés; se detiene cuando la tasa de victorias y la diferencia de puntaje tienen intervalos de confianza suficientemente angostos"
+            )
+
+            if adaptive:
+                from modules.sampling import DEFAULT_SCORE_MARGIN, DEFAULT_WIN_MARGIN
+
+                sample_size = st.slider(
+                    "Máximo de conversaciones",
+                    min_value=10,
+                    max_value=min(1000, len(compare_df)),
+                    value=min(300, len(compare_df))
+                )
+                col1, col2 = st.columns(2)
+                with col1:
+                    win_margin = st.slider(
+                        "Margen de la tasa de victorias IA (±)",
+                        min_value=0.03, max_value=0.25, value=DEFAULT_WIN_MARGIN, step=0.01,
+                        format="%.2f"
+                    )
+                with col2:
+                    score_margin = st.slider(
+                        "Margen de la diferencia de puntaje (±)",
+                        min_value=0.1, max_value=1.0, value=DEFAULT_SCORE_MARGIN, step=0.05,
+                        format="%.2f"
+                    )
+            else:
+                sample_size = st.slider(
+                    "Tamaño de muestra",
+                    min_value=10,
+                    max_value=min(100, len(compare_df)),
+                    value=min(50, len(compare_df))
+                )
+
+            compare_workers = st.slider(
+                "Solicitudes concurrentes por etapa",
+                min_value=1,
+                max_value=16,
+                value=4,
+                help="Generaciones y evaluaciones en paralelo; ambas etapas se solapan entre conversaciones"
             )
 
             if st.button("🚀 Iniciar Comparación", type="primary", use_container_width=True):
@@ -533,50 +1276,146 @@ elif page == "comparador":
 
                     comparator = ResponseComparator(
                         api_key=st.session_state["api_key"],
+                        backend=get_backend(st.session_state["api_key"]),
                         sales_script=st.session_state.get("sales_script", ""),
                         knowledge_base=st.session_state.get("knowledge_base", "")
                     )
 
-                    sample_df = compare_df.sample(n=sample_size)
+                    # Checkpoint: depende del archivo, del script y del KB
+                    from modules.checkpoint import RunJournal, fingerprint_bytes
+
+                    journal = RunJournal.for_run(
+                        "comparacion",
+                        fingerprint_bytes(
+                            uploaded_compare.getvalue()
+                            + st.session_state.get("sales_script", "").encode("utf-8")
+                            + st.session_state.get("knowledge_base", "").encode("utf-8")
+                        )
+                    )
+                    completed = journal.completed_ids()
+
+                    if adaptive:
+                        from modules.sampling import primary_interest, stratified_order
+
+                        # Semilla fija: el mismo orden reanuda desde el checkpoint
+                        strata_df = compare_df
+                        if interest_df is not None:
+                            strata_df = compare_df.assign(
+                                interest=primary_interest(interest_df.loc[compare_df.index], detector.keywords)
+                            )
+                        sample_df = compare_df.loc[stratified_order(strata_df, seed=42).index].head(sample_size)
+                        resumed_df = sample_df[sample_df["conversation_id"].astype(str).isin(completed)]
+                    else:
+                        # Reutilizar primero las conversaciones ya comparadas
+                        done_mask = compare_df["conversation_id"].astype(str).isin(completed)
+                        resumed_df = compare_df[done_mask].head(sample_size)
+                        sample_df = pd.concat([
+                            resumed_df,
+                            compare_df[~done_mask].sample(
+                                n=min(sample_size - len(resumed_df), int((~done_mask).sum()))
+                            )
+                        ])
+
+                    if len(resumed_df):
+                        st.info(f"♻️ Reanudando: {len(resumed_df)} comparaciones recuperadas del checkpoint")
 
                     progress_bar = st.progress(0)
                     status_text = st.empty()
 
-                    results = []
-                    total = len(sample_df)
-
-                    for idx, (_, row) in enumerate(sample_df.iterrows()):
-                        status_text.text(f"Comparando {idx+1}/{total}...")
-                        progress_bar.progress((idx + 1) / total)
-
-                        result = comparator.compare(row.to_dict())
-                        results.append(result)
+                    def update_progress(done, total):
+                        status_text.text(f"Comparando {done}/{total}...")
+                        progress_bar.progress(done / total)
+
+                    sample_rows = sample_df.to_dict("records")
+                    run_id = start_session_run("comparacion")
+                    estimate = None
+                    if adaptive:
+                        results, estimate = comparator.compare_adaptive(
+                            sample_rows,
+                            win_margin=win_margin,
+                            score_margin=score_margin,
+                            progress_callback=update_progress,
+                            generation_workers=compare_workers,
+                            evaluation_workers=compare_workers,
+                            journal=journal
+                        )
+                        sample_rows = sample_rows[:len(results)]
+                    else:
+                        results = comparator.compare_batch(
+                            sample_rows,
+                            progress_callback=update_progress,
+                            generation_workers=compare_workers,
+                            evaluation_workers=compare_workers,
+                            journal=journal
+                        )
 
                     status_text.text("✅ Comparación completada!")
+                    if estimate and estimate["stopped_early"]:
+                        progress_bar.progress(1.0)
+                        st.info(
+                            f"🎯 Veredicto estable tras {len(results)} de {sample_size} conversaciones "
+                            f"({sample_size - len(results)} comparaciones evitadas)"
+                        )
+
+                    # Filas fallidas: se guardan aparte para reintentarlas solas
+                    st.session_state["comparison_failed"] = [
+                        (pos, row) for pos, (row, result) in enumerate(zip(sample_rows, results))
+                        if result["winner"] == "error"
+                    ]
+                    st.session_state["comparison_journal"] = journal
+                    st.session_state["comparison_run_id"] = run_id
 
                     results_df = pd.DataFrame(results)
                     st.session_state["comparison_results"] = results_df
 
-                    # Mostrar resumen
+                    save_results(
+                        results_df.assign(**{
+                            col: [row.get(col) for row in sample_rows]
+                            for col in ("company_name", "group_name", "user_name")
+                        }),
+                        "comparison",
+                        run_id
+                    )
+
+                    # Mostrar resumen (los errores no cuentan en los promedios)
                     st.markdown("### 📊 Resumen de Comparación")
 
+                    ok_df = results_df[results_df["winner"] != "error"]
+
                     col1, col2, col3, col4 = st.columns(4)
 
                     with col1:
-                        avg_advisor = results_df["advisor_score"].mean()
+                        avg_advisor = ok_df["advisor_score"].mean()
                         st.metric("Promedio Asesor", f"{avg_advisor:.2f}/5")
 
                     with col2:
-                        avg_ai = results_df["ai_score"].mean()
+                        avg_ai = ok_df["ai_score"].mean()
                         st.metric("Promedio IA", f"{avg_ai:.2f}/5")
 
                     with col3:
-                        ai_wins = (results_df["winner"] == "ia").sum()
-                        st.metric("Victorias IA", f"{ai_wins} ({ai_wins/len(results_df)*100:.1f}%)")
+                        ai_wins = (ok_df["winner"] == "ia").sum()
+                        st.metric("Victorias IA", f"{ai_wins} ({ai_wins/max(len(ok_df), 1)*100:.1f}%)")
 
                     with col4:
-                        advisor_wins = (results_df["winner"] == "asesor").sum()
-                        st.metric("Victorias Asesor", f"{advisor_wins} ({advisor_wins/len(results_df)*100:.1f}%)")
+                        advisor_wins = (ok_df["winner"] == "asesor").sum()
+                        st.metric("Victorias Asesor", f"{advisor_wins} ({advisor_wins/max(len(ok_df), 1)*100:.1f}%)")
+
+                    if len(ok_df) < len(results_df):
+                        st.caption(f"{len(results_df) - len(ok_df)} comparaciones con error, excluidas de los promedios")
+
+                    if estimate and estimate["n"] >= 2:
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.metric(
+                                "Tasa de victorias IA (empate = ½)",
+                                f"{estimate['win_rate']*100:.1f}% ± {estimate['win_margin']*100:.1f}%"
+                            )
+                        with col2:
+                            st.metric(
+                                "Diferencia de puntaje IA − Asesor",
+                                f"{estimate['score_diff']:+.2f} ± {estimate['score_margin']:.2f}"
+                            )
+                        st.caption("Intervalos al 95% corregidos por las revisiones intermedias")
 
                     st.dataframe(results_df, use_container_width=True)
 
@@ -590,6 +1429,57 @@ elif page == "comparador":
                         use_container_width=True
                     )
 
+            # Reintento de filas fallidas sin repetir toda la muestra
+            failed = st.session_state.get("comparison_failed", [])
+            if failed and "comparison_results" in st.session_state:
+                st.warning(f"⚠️ {len(failed)} comparaciones fallaron en la última ejecución")
+
+                if st.button(f"🔁 Reintentar {len(failed)} fallidas", use_container_width=True):
+                    from modules.response_comparator import ResponseComparator
+
+                    comparator = ResponseComparator(
+                        api_key=st.session_state["api_key"],
+                        backend=get_backend(st.session_state["api_key"]),
+                        sales_script=st.session_state.get("sales_script", ""),
+                        knowledge_base=st.session_state.get("knowledge_base", "")
+                    )
+                    results_df = st.session_state["comparison_results"]
+                    start_session_run("comparacion_reintento")
+                    retried = comparator.retry_failed(
+                        [row for _, row in failed],
+                        [results_df.loc[pos].to_dict() for pos, _ in failed],
+                        generation_workers=compare_workers,
+                        evaluation_workers=compare_workers,
+                        journal=st.session_state.get("comparison_journal")
+                    )
+
+                    for (pos, _), result in zip(failed, retried):
+                        for key, value in result.items():
+                            results_df.at[pos, key] = value
+
+                    # Las recuperadas se guardan igual que en la primera pasada
+                    recovered = [
+                        (row, result) for (_, row), result in zip(failed, retried)
+                        if result["comparison_success"]
+                    ]
+                    save_results(
+                        pd.DataFrame([result for _, result in recovered]).assign(**{
+                            col: [row.get(col) for row, _ in recovered]
+                            for col in ("company_name", "group_name", "user_name")
+                        }),
+                        "comparison",
+                        st.session_state.get("comparison_run_id")
+                    )
+
+                    st.session_state["comparison_failed"] = [
+                        (pos, row) for (pos, row), result in zip(failed, retried)
+                        if result["winner"] == "error"
+                    ]
+                    st.success(
+                        f"✓ {len(failed) - len(st.session_state['comparison_failed'])} "
+                        f"de {len(failed)} comparaciones recuperadas"
+                    )
+
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
 
@@ -602,18 +1492,40 @@ elif page == "reportes":
 
     st.markdown("---")
 
+    source = st.radio(
+        "Origen de los datos",
+        ["Sesión actual", "Resultados guardados"],
+        horizontal=True,
+        help="Los resultados guardados acumulan todas las ejecuciones, particionados por empresa, grupo y fecha"
+    )
+
     # Tabs de reportes
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "📊 Análisis de Asesores",
         "⚖️ Comparación",
-        "📥 Exportar"
+        "📥 Exportar",
+        "🩺 Diagnóstico"
     ])
 
     with tab1:
         st.markdown("### Métricas de Análisis de Asesores")
 
-        if "analysis_df" in st.session_state:
-            df = st.session_state["analysis_df"]
+        if source == "Resultados guardados":
+            df = stored_results(
+                "analysis",
+                ("analysis_success", "agent_score_numeric", "first_response_efficient", "client_intention"),
+                key="report_analysis"
+            )
+        else:
+            df = session_analysis(
+                ("analysis_success", "agent_score_numeric", "first_response_efficient", "client_intention")
+            )
+
+        if df is not None and len(df):
+
+            # Las filas con error (score 0) distorsionan las distribuciones
+            if "analysis_success" in df.columns:
+                df = df[df["analysis_success"] == True]
 
             import plotly.express as px
             import plotly.graph_objects as go
@@ -655,8 +1567,16 @@ elif page == "reportes":
     with tab2:
         st.markdown("### Métricas de Comparación")
 
-        if "comparison_results" in st.session_state:
-            df = st.session_state["comparison_results"]
+        if source == "Resultados guardados":
+            df = stored_results(
+                "comparison",
+                ("advisor_score", "ai_score", "winner"),
+                key="report_comparison"
+            )
+        else:
+            df = st.session_state.get("comparison_results")
+
+        if df is not None and len(df):
 
             import plotly.express as px
 
@@ -664,9 +1584,10 @@ elif page == "reportes":
 
             with col1:
                 # Comparación de promedios
+                ok_df = df[df["winner"] != "error"]
                 fig = px.bar(
                     x=["Asesor", "IA"],
-                    y=[df["advisor_score"].mean(), df["ai_score"].mean()],
+                    y=[ok_df["advisor_score"].mean(), ok_df["ai_score"].mean()],
                     title="Promedio de Scores",
                     labels={"x": "Tipo", "y": "Score Promedio"}
                 )
@@ -693,8 +1614,9 @@ elif page == "reportes":
         )
 
         if st.button("📥 Generar Exportación", type="primary"):
-            if "Análisis de Asesores" in export_options and "analysis_df" in st.session_state:
-                csv = st.session_state["analysis_df"].to_csv(index=False).encode('utf-8')
+            analysis_export = session_analysis() if "Análisis de Asesores" in export_options else None
+            if analysis_export is not None:
+                csv = analysis_export.to_csv(index=False).encode('utf-8')
                 st.download_button(
                     "Descargar Análisis de Asesores",
                     csv,
@@ -714,6 +1636,53 @@ elif page == "reportes":
             if not export_options:
                 st.warning("Selecciona al menos una opción")
 
+    with tab4:
+        st.markdown("### Diagnóstico de Llamadas al Modelo")
+
+        collector = get_collector()
+        session_runs = st.session_state.get("metrics_runs", [])
+        metrics_summary = collector.summary(runs=session_runs)
+
+        if metrics_summary:
+            metrics_df = pd.DataFrame(metrics_summary)
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Llamadas", int(metrics_df["calls"].sum()))
+            with col2:
+                total_calls = metrics_df["calls"].sum()
+                hit_rate = metrics_df["cache_hits"].sum() / total_calls * 100 if total_calls else 0
+                st.metric("Aciertos de caché", f"{hit_rate:.1f}%")
+            with col3:
+                st.metric("JSON inválidos", int(metrics_df["parse_failures"].sum()))
+            with col4:
+                st.metric("Espera por cuota", f"{metrics_df['wait_seconds'].sum():.1f}s")
+
+            st.dataframe(metrics_df, use_container_width=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.download_button(
+                    "📥 Prometheus",
+                    collector.to_prometheus(runs=session_runs).encode("utf-8"),
+                    "metricas_llm.prom",
+                    "text/plain"
+                )
+            with col2:
+                st.download_button(
+                    "📥 Llamadas (JSONL)",
+                    collector.to_jsonl(runs=session_runs).encode("utf-8"),
+                    "metricas_llm.jsonl",
+                    "application/jsonl"
+                )
+            with col3:
+                if st.button("🗑️ Reiniciar métricas"):
+                    collector.reset(runs=session_runs)
+                    st.session_state["metrics_runs"] = []
+                    st.rerun()
+        else:
+            st.info("👆 Aún no hay llamadas registradas en esta sesión")
+
 # Footer
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 💡 Ayuda")
@@ -0,0 +1,234 @@
+"""
+Benchmark del Pipeline de Análisis
+Mide filas/seg, latencia p50/p95/p99 y memoria pico por etapa contra el stub
+
+Uso:
+    python -m benchmarks.run                      # compara contra baselines.json
+    python -m benchmarks.run --rows 2000 --workers 32
+    python -m benchmarks.run --update-baseline    # guarda los resultados como baseline
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_conversations
+from modules.backends import LLMBackend, StubBackend
+
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+
+# Margen antes de considerar una regresión
+DEFAULT_TOLERANCE = 0.25
+
+
+class RecordingBackend(LLMBackend):
+    """Envuelve un backend y registra la latencia de cada llamada."""
+
+    def __init__(self, inner: LLMBackend):
+        self.inner = inner
+        self.model_name = inner.model_name
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, generation_config: dict = None):
+        start = time.perf_counter()
+        try:
+            return self.inner.generate(prompt, generation_config)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+    def reset(self) -> list:
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def measure(name: str, rows: int, backend: RecordingBackend, func) -> dict:
+    """
+    Ejecuta una etapa y devuelve sus métricas.
+
+    Args:
+        name: Nombre de la etapa
+        rows: Filas procesadas por la etapa
+        backend: Backend instrumentado
+        func: Función sin argumentos que ejecuta la etapa
+
+    Returns:
+        Diccionario con rows_per_sec, latencias (ms), llamadas y memoria pico (MB)
+    """
+    backend.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies = backend.reset()
+
+    return {
+        "stage": name,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 2) if elapsed else 0.0,
+        "calls": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "peak_mb": round(peak / 1_048_576, 2)
+    }
+
+
+def run_benchmarks(args) -> list:
+    from modules.advisor_analyzer import AdvisorAnalyzer
+    from modules.kb_generator import generate_knowledge_base, generate_knowledge_base_mapreduce
+    from modules.response_comparator import ResponseComparator
+    from modules.script_generator import generate_sales_script, generate_scripts_by_use_case
+
+    backend = RecordingBackend(StubBackend(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        error_rate=args.error_rate,
+        seed=args.seed
+    ))
+    conversations = generate_conversations(args.rows, seed=args.seed).to_dict("records")
+    compare_rows = conversations[:args.compare_rows]
+    results = {}
+
+    def analyze():
+        analyzer = AdvisorAnalyzer("", backend=backend)
+        results["analysis"] = analyzer.analyze_batch(conversations, max_workers=args.workers)
+
+    def analyze_packed():
+        analyzer = AdvisorAnalyzer("", backend=backend)
+        analyzer.analyze_batch(conversations, max_workers=args.workers, pack_size=args.pack_size)
+
+    def compare():
+        comparator = ResponseComparator("", sales_script="script", knowledge_base="kb", backend=backend)
+        comparator.compare_batch(
+            compare_rows,
+            generation_workers=args.workers,
+            evaluation_workers=args.workers
+        )
+
+    stages = [
+        measure("analyze_batch", len(conversations), backend, analyze),
+        measure(f"analyze_batch_packed_{args.pack_size}", len(conversations), backend, analyze_packed),
+        measure("compare_batch", len(compare_rows), backend, compare)
+    ]
+
+    analysis_df = pd.DataFrame(results["analysis"])
+    stages.append(measure(
+        "generate_sales_script", len(analysis_df), backend,
+        lambda: generate_sales_script(analysis_df, "", backend=backend)
+    ))
+    stages.append(measure(
+        "generate_scripts_by_use_case", len(analysis_df), backend,
+        lambda: generate_scripts_by_use_case(analysis_df, "", backend=backend, max_workers=args.workers)
+    ))
+    stages.append(measure(
+        "generate_knowledge_base", len(analysis_df), backend,
+        lambda: generate_knowledge_base(analysis_df, "", backend=backend)
+    ))
+    stages.append(measure(
+        "generate_knowledge_base_mapreduce", len(analysis_df), backend,
+        lambda: generate_knowledge_base_mapreduce(analysis_df, "", backend=backend, max_workers=args.workers)
+    ))
+
+    return stages
+
+
+def check_regressions(stages: list, baselines: dict, tolerance: float) -> list:
+    """
+    Compara contra los baselines guardados.
+
+    Returns:
+        Lista de mensajes de regresión (vacía si todo está dentro del margen)
+    """
+    problems = []
+    for stage in stages:
+        base = baselines.get(stage["stage"])
+        if not base:
+            continue
+        if stage["rows_per_sec"] < base["rows_per_sec"] * (1 - tolerance):
+            problems.append(
+                f"{stage['stage']}: {stage['rows_per_sec']} filas/s "
+                f"(baseline {base['rows_per_sec']})"
+            )
+        if stage["peak_mb"] > base["peak_mb"] * (1 + tolerance) + 1:
+            problems.append(
+                f"{stage['stage']}: memoria pico {stage['peak_mb']} MB "
+                f"(baseline {base['peak_mb']} MB)"
+            )
+    return problems
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n")[2])
+    parser.add_argument("--rows", type=int, default=400, help="Conversaciones sintéticas")
+    parser.add_argument("--compare-rows", type=int, default=100, help="Filas para el comparador")
+    parser.add_argument("--workers", type=int, default=16, help="Solicitudes concurrentes")
+    parser.add_argument("--pack-size", type=int, default=5, help="Conversaciones por solicitud en modo empaquetado")
+    parser.add_argument("--latency", default="lognormal",
+                        choices=["constant", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="Latencia simulada (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tasa de errores transitorios")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Margen de regresión (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Guarda los resultados como baseline")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    # El benchmark mide el pipeline, no la caché persistente
+    os.environ["LLM_CACHE_DISABLED"] = "1"
+
+    stages = run_benchmarks(args)
+    print(pd.DataFrame(stages).to_string(index=False))
+
+    if args.update_baseline:
+        BASELINE_PATH.write_text(
+            json.dumps({stage["stage"]: stage for stage in stages}, indent=2) + "\n",
+            encoding="utf-8"
+        )
+        print(f"\nBaseline guardado en {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("\nSin baseline: ejecuta con --update-baseline para crearlo")
+        return 0
+
+    problems = check_regressions(
+        stages,
+        json.loads(BASELINE_PATH.read_text(encoding="utf-8")),
+        args.tolerance
+    )
+    if problems:
+        print("\n❌ Regresiones detectadas:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+
+    print("\n✅ Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Generador de Conversaciones Sintéticas
+Produce filas con el formato de las exportaciones de WhatsApp (bot + asesor)
+"""
+import random
+
+import pandas as pd
+
+
+COMPANIES = ["Automotriz Andina", "Motores del Sur", "Autos Pacífico"]
+GROUPS = ["JETOUR", "SWM", "DFSK", "CHANGAN"]
+ADVISORS = ["Ana Torres", "Luis Pérez", "Carla Ríos", "Jorge Díaz", "Marta Vega", "Pedro Salas"]
+MODELS = ["X50", "DASHING", "T1", "T2", "S06"]
+
+BOT_TURNS = [
+    "BOT: ¡Hola! Bienvenido a {company}. ¿En qué modelo estás interesado?",
+    "CLIENT: Me interesa el {model}",
+    "BOT: ¿Cómo te gustaría comprarlo? 1) Contado 2) Financiamiento 3) Prueba de manejo",
+    "CLIENT: {option}",
+    "BOT: ¿Eres asalariado o independiente?",
+    "CLIENT: {employment}",
+    "BOT: Perfecto, te comunico con un asesor."
+]
+
+ADVISOR_OPENERS = [
+    "USER: Hola, buenas tardes, le saluda {advisor} de {company}. ¿En qué le puedo ayudar?",
+    "USER: Hola {client}, soy {advisor}. Vi que te interesa el {model} con {option_lower}, te cuento las opciones.",
+    "USER: Buen día, gracias por escribirnos. ¿Qué modelo le interesa?"
+]
+
+CLIENT_TURNS = [
+    "CLIENT: ¿Cuál es el precio del {model}?",
+    "CLIENT: ¿Cuánto sería la cuota mensual?",
+    "CLIENT: ¿Qué colores tienen disponibles?",
+    "CLIENT: ¿Puedo ir a verlo este sábado?",
+    "CLIENT: ¿Qué documentos necesito?",
+    "CLIENT: Ok, gracias",
+    "CLIENT: ¿Tienen alguna promoción?"
+]
+
+ADVISOR_TURNS = [
+    "USER: El {model} está desde $18.990 con bono de lanzamiento.",
+    "USER: Con un 20% de pie la cuota queda en aprox. $320 mensuales a 48 meses.",
+    "USER: Tenemos blanco, gris y rojo disponibles para entrega inmediata.",
+    "USER: Claro, le agendo la prueba de manejo el sábado a las 11:00 en nuestra sucursal.",
+    "USER: Necesito su cédula, 3 últimas liquidaciones y certificado de AFP.",
+    "USER: Se lo comparto en un momento.",
+    "USER: ¿Me confirma su nombre completo y RUT para avanzar?"
+]
+
+OPTIONS = ["Financiamiento", "Contado", "Prueba de manejo"]
+
+
+def generate_conversations(
+    n: int,
+    min_turns: int = 2,
+    max_turns: int = 12,
+    bot_ratio: float = 0.8,
+    seed: int = 42
+) -> pd.DataFrame:
+    """
+    Genera conversaciones sintéticas.
+
+    Args:
+        n: Número de filas
+        min_turns: Mínimo de intercambios asesor-cliente
+        max_turns: Máximo de intercambios asesor-cliente
+        bot_ratio: Proporción de filas con historial de bot
+        seed: Semilla
+
+    Returns:
+        DataFrame con las columnas del formato de entrada
+    """
+    rng = random.Random(seed)
+    rows = []
+
+    for i in range(n):
+        context = {
+            "company": rng.choice(COMPANIES),
+            "model": rng.choice(MODELS),
+            "option": rng.choice(OPTIONS),
+            "employment": rng.choice(["Asalariado", "Independiente"]),
+            "advisor": rng.choice(ADVISORS),
+            "client": rng.choice(["Carlos", "Daniela", "Felipe", "Sofía"])
+        }
+        context["option_lower"] = context["option"].lower()
+
+        bot = ""
+        if rng.random() < bot_ratio:
+            bot = "\n".join(turn.format(**context) for turn in BOT_TURNS)
+
+        turns = [rng.choice(ADVISOR_OPENERS).format(**context)]
+        for _ in range(rng.randint(min_turns, max_turns)):
+            turns.append(rng.choice(CLIENT_TURNS).format(**context))
+            turns.append(rng.choice(ADVISOR_TURNS).format(**context))
+
+        rows.append({
+            "conversation_id": f"conv_{i:07d}",
+            "historial_de_mensajes_en_bot": bot,
+            "historial_de_mensajes_en_asesor": "\n".join(turns),
+            "company_name": context["company"],
+            "group_name": rng.choice(GROUPS),
+            "user_name": context["advisor"]
+        })
+
+    return pd.DataFrame(rows)
@@ -2,24 +2,22 @@
 Módulo de Análisis de Asesores
 Evalúa la calidad de las respuestas de los asesores usando Gemini API
 """
-import google.generativeai as genai
+import hashlib
 import json
-import re
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 
+from modules.backends import create_backend
+from modules.compaction import ADVISOR_HISTORY_TOKENS, BOT_HISTORY_TOKENS, compact_history
+from modules.conversation import get_parsed
+from modules.llm import cache_response, discard_cached, generate_text
+from modules.metrics import get_collector, run_in_context
+from modules.retry import RetryBudget, error_type
+from modules.structured import SchemaError, complete_fields, generate_validated, json_config, parse_json, validate
+from modules.triage import triage_conversation
 
-ANALYSIS_PROMPT = """Eres un evaluador de calidad de atención en conversaciones de WhatsApp entre un asesor comercial y un cliente. El cliente ya pasó por un bot; ahora está hablando con el asesor (USER).
-
-CONTEXTO OPCIONAL DEL BOT (si está disponible):
-{historial_bot}
 
-CONVERSACIÓN ASESOR–CLIENTE (obligatorio):
-{historial_asesor}
-
-METADATOS: Empresa: {company_name}. Grupo: {group_name}. Asesor: {user_name}.
-
-INSTRUCCIONES:
+ANALYSIS_CRITERIA = """INSTRUCCIONES:
 1. Evalúa solo los mensajes del asesor (USER) en la conversación asesor–cliente.
 2. Primera respuesta: ¿El asesor reconoce el tema o la intención que ya traía el cliente desde el bot? ¿Saluda y ofrece algo útil (información, siguiente paso) cuando el contexto lo permite, o solo hace una pregunta genérica?
 3. Segunda respuesta y siguientes: ¿Responde a lo que el cliente acaba de decir? ¿Evita preguntas redundantes que el bot ya había resuelto? ¿Cada mensaje acerca a una solución (dato, cita, oferta)?
@@ -29,36 +27,119 @@ INSTRUCCIONES:
 TAMBIÉN EXTRAE:
 - La intención principal del cliente (qué busca/necesita)
 - El caso de uso detectado (FINANCIAMIENTO, COTIZACION, PRUEBA_MANEJO, VENTA_VEHICULO, SERVICIO, OTRO)
+"""
 
-FORMATO DE SALIDA (JSON):
-{{
-  "agent_score_numeric": <número del 1 al 5, donde 1 = muy deficiente, 5 = excelente>,
+RESULT_FIELDS = """  "agent_score_numeric": <número del 1 al 5, donde 1 = muy deficiente, 5 = excelente>,
   "agent_score_text": "<resumen en 2-4 líneas: fortalezas y debilidades del asesor en esta conversación, con foco en primera respuesta, eficiencia y claridad>",
   "first_response_efficient": <true si la primera respuesta reconoce contexto o aporta valor; false si es genérica o redundante>,
   "efficiency_notes": "<en una línea: si pudo ser más eficiente, cómo>",
   "client_intention": "<intención principal del cliente>",
   "use_case": "<FINANCIAMIENTO | COTIZACION | PRUEBA_MANEJO | VENTA_VEHICULO | SERVICIO | OTRO>",
   "key_topics": "<temas clave mencionados, separados por coma>"
-}}
+"""
+
+ANALYSIS_PROMPT = """Eres un evaluador de calidad de atención en conversaciones de WhatsApp entre un asesor comercial y un cliente. El cliente ya pasó por un bot; ahora está hablando con el asesor (USER).
+
+CONTEXTO OPCIONAL DEL BOT (si está disponible):
+{historial_bot}
+
+CONVERSACIÓN ASESOR–CLIENTE (obligatorio):
+{historial_asesor}
+
+METADATOS: Empresa: {company_name}. Grupo: {group_name}. Asesor: {user_name}.
+
+""" + ANALYSIS_CRITERIA + """
+FORMATO DE SALIDA (JSON):
+{{
+""" + RESULT_FIELDS + """}}
 
 Responde ÚNICAMENTE con el JSON, sin texto adicional.
 """
 
+# Varias conversaciones por solicitud: las instrucciones se envían una sola vez
+PACKED_ANALYSIS_PROMPT = """Eres un evaluador de calidad de atención en conversaciones de WhatsApp entre un asesor comercial y un cliente. El cliente ya pasó por un bot; ahora está hablando con el asesor (USER).
+
+Vas a evaluar {count} conversaciones independientes. Evalúa cada una por separado, sin mezclar información entre ellas.
+
+""" + ANALYSIS_CRITERIA + """
+{conversations}
+
+FORMATO DE SALIDA (arreglo JSON con un objeto por conversación, en el mismo orden):
+[
+  {{
+  "conversation_id": "<el id indicado en la conversación>",
+""" + RESULT_FIELDS + """  }}
+]
+
+Responde ÚNICAMENTE con el arreglo JSON, sin texto adicional.
+"""
+
+PACKED_ITEM = """=== CONVERSACIÓN id={conversation_id} ===
+CONTEXTO OPCIONAL DEL BOT (si está disponible):
+{historial_bot}
+
+CONVERSACIÓN ASESOR–CLIENTE (obligatorio):
+{historial_asesor}
+
+METADATOS: Empresa: {company_name}. Grupo: {group_name}. Asesor: {user_name}.
+"""
+
+# Campos de entrada que determinan el análisis (ver content_hash)
+HASHED_FIELDS = [
+    "historial_de_mensajes_en_bot",
+    "historial_de_mensajes_en_asesor",
+    "company_name",
+    "group_name",
+    "user_name"
+]
+
+# Un cambio en los prompts invalida los resultados previos
+PROMPT_VERSION = hashlib.sha1((ANALYSIS_PROMPT + PACKED_ANALYSIS_PROMPT).encode("utf-8")).hexdigest()[:8]
+
+USE_CASES = ["FINANCIAMIENTO", "COTIZACION", "PRUEBA_MANEJO", "VENTA_VEHICULO", "SERVICIO", "OTRO"]
+
+# Esquema de la respuesta del modelo (ver modules.structured)
+ANALYSIS_FIELDS = {
+    "agent_score_numeric": {"type": "integer", "minimum": 1, "maximum": 5},
+    "agent_score_text": {"type": "string"},
+    "first_response_efficient": {"type": "boolean"},
+    "efficiency_notes": {"type": "string"},
+    "client_intention": {"type": "string"},
+    "use_case": {"type": "string", "enum": USE_CASES},
+    "key_topics": {"type": "string"}
+}
+
+REQUIRED_FIELDS = list(ANALYSIS_FIELDS)
+
 
 class AdvisorAnalyzer:
     """Analizador de calidad de respuestas de asesores."""
 
-    def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-2.0-flash",
+        max_retries: int = 200,
+        backend=None,
+        history_tokens: int = ADVISOR_HISTORY_TOKENS,
+        bot_tokens: int = BOT_HISTORY_TOKENS
+    ):
         """
         Inicializa el analizador.
 
         Args:
             api_key: API Key de Google Gemini
             model: Modelo a usar (default: gemini-2.0-flash para mejor velocidad)
+            max_retries: Reintentos de errores transitorios permitidos en
+                toda la vida del analizador (una ejecución)
+            backend: LLMBackend a usar (default: según create_backend)
+            history_tokens: Presupuesto de tokens del historial con el asesor
+            bot_tokens: Presupuesto de tokens del historial con el bot
         """
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
-        self.delay = 0.5  # Delay entre llamadas API
+        self.backend = backend or create_backend(api_key, model)
+        self.retry_budget = RetryBudget(max_retries)
+        self.history_tokens = history_tokens
+        self.bot_tokens = bot_tokens
 
     def _safe_str(self, val, max_len: int = 3000) -> str:
         """Convierte valor a string de forma segura."""
@@ -67,23 +148,48 @@ class AdvisorAnalyzer:
         s = str(val)
         return s[:max_len] if len(s) > max_len else s
 
-    def _extract_json(self, text: str) -> dict:
-        """Extrae JSON de la respuesta."""
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except json.JSONDecodeError:
-                pass
+    def content_hash(self, conversation_data: dict) -> str:
+        """
+        Huella de lo que determina el análisis de una conversación.
 
+        Incluye los campos de HASHED_FIELDS, el modelo, los presupuestos de
+        historial y la versión de los prompts: si cambia cualquiera, la
+        conversación se vuelve a analizar.
+        """
+        digest = hashlib.sha1(
+            f"{PROMPT_VERSION}|{getattr(self.backend, 'model_name', '')}|"
+            f"{self.history_tokens}|{self.bot_tokens}".encode("utf-8")
+        )
+        for field in HASHED_FIELDS:
+            value = conversation_data.get(field)
+            text = "" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value)
+            digest.update(b"\x00" + text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _prompt_fields(self, conversation_data: dict) -> dict:
+        """Campos de la conversación listos para insertar en el prompt."""
         return {
-            "agent_score_numeric": 0,
-            "agent_score_text": "Error al parsear respuesta",
-            "first_response_efficient": False,
-            "efficiency_notes": "Error",
-            "client_intention": "No determinado",
-            "use_case": "OTRO",
-            "key_topics": ""
+            "historial_bot": compact_history(
+                get_parsed(conversation_data, "historial_de_mensajes_en_bot"),
+                self.bot_tokens,
+                anchor_role=None
+            ) or "No disponible",
+            "historial_asesor": compact_history(
+                get_parsed(conversation_data, "historial_de_mensajes_en_asesor"),
+                self.history_tokens
+            ),
+            "company_name": self._safe_str(
+                conversation_data.get("company_name", "N/A"),
+                100
+            ),
+            "group_name": self._safe_str(
+                conversation_data.get("group_name", "N/A"),
+                100
+            ),
+            "user_name": self._safe_str(
+                conversation_data.get("user_name", "N/A"),
+                100
+            )
         }
 
     def analyze_conversation(self, conversation_data: dict) -> dict:
@@ -97,36 +203,19 @@ class AdvisorAnalyzer:
             Diccionario con el análisis
         """
         # Preparar prompt
-        prompt = ANALYSIS_PROMPT.format(
-            historial_bot=self._safe_str(
-                conversation_data.get("historial_de_mensajes_en_bot", ""),
-                2000
-            ) or "No disponible",
-            historial_asesor=self._safe_str(
-                conversation_data.get("historial_de_mensajes_en_asesor", ""),
-                3000
-            ),
-            company_name=self._safe_str(
-                conversation_data.get("company_name", "N/A"),
-                100
-            ),
-            group_name=self._safe_str(
-                conversation_data.get("group_name", "N/A"),
-                100
-            ),
-            user_name=self._safe_str(
-                conversation_data.get("user_name", "N/A"),
-                100
-            )
-        )
+        prompt = ANALYSIS_PROMPT.format(**self._prompt_fields(conversation_data))
 
         try:
-            response = self.model.generate_content(prompt)
-            time.sleep(self.delay)  # Rate limiting
-
-            result = self._extract_json(response.text)
+            result = generate_validated(
+                self.backend,
+                prompt,
+                ANALYSIS_FIELDS,
+                stage="analysis",
+                retry_budget=self.retry_budget
+            )
             result["analysis_success"] = True
             result["error"] = None
+            result["error_type"] = None
 
             return result
 
@@ -140,32 +229,415 @@ class AdvisorAnalyzer:
                 "use_case": "OTRO",
                 "key_topics": "",
                 "analysis_success": False,
-                "error": str(e)
+                "error": str(e),
+                "error_type": error_type(e)
             }
 
+    def analyze_packed(self, conversations: list, ids: list = None) -> list:
+        """
+        Analiza varias conversaciones en una sola solicitud.
+
+        Las filas con algunos campos inválidos se completan pidiendo solo
+        esos campos; las que falten en la respuesta se reanalizan
+        individualmente con analyze_conversation.
+
+        Args:
+            conversations: Lista de diccionarios con datos
+            ids: Identificadores únicos dentro del paquete
+                (default: conversation_id de cada fila)
+
+        Returns:
+            Lista de análisis en el mismo orden que la entrada
+        """
+        if ids is None:
+            ids = [conv.get("conversation_id", f"row_{i}") for i, conv in enumerate(conversations)]
+        ids = [str(conv_id) for conv_id in ids]
+
+        prompt = PACKED_ANALYSIS_PROMPT.format(
+            count=len(conversations),
+            conversations="\n".join(
+                PACKED_ITEM.format(conversation_id=conv_id, **self._prompt_fields(conv))
+                for conv_id, conv in zip(ids, conversations)
+            )
+        )
+
+        by_id, checked = {}, {}
+        config = json_config(ANALYSIS_FIELDS, array=True, extra={"conversation_id": {"type": "string"}})
+        try:
+            # La respuesta se guarda en caché solo si trae todas las filas válidas
+            text = generate_text(
+                self.backend,
+                prompt,
+                generation_config=config,
+                retry_budget=self.retry_budget,
+                stage="analysis_packed",
+                cache_result=False
+            )
+            items = parse_json(text)
+            for item in items if isinstance(items, list) else []:
+                if isinstance(item, dict) and str(item.get("conversation_id")) in ids:
+                    by_id[str(item["conversation_id"])] = item
+            missing = sum(1 for conv_id in ids if conv_id not in by_id)
+            if missing:
+                get_collector().record_parse_failure("analysis_packed", missing)
+
+            checked = {conv_id: validate(item, ANALYSIS_FIELDS) for conv_id, item in by_id.items()}
+            if not missing and not any(invalid for _, invalid in checked.values()):
+                cache_response(self.backend, prompt, text, config)
+            else:
+                discard_cached(self.backend, prompt, config)
+        except SchemaError:
+            get_collector().record_parse_failure("analysis_packed", len(ids))
+            discard_cached(self.backend, prompt, config)
+        except Exception:
+            # Sin respuesta utilizable: todas las filas caen al modo individual
+            pass
+
+        results = []
+        for conv_id, conv in zip(ids, conversations):
+            item = by_id.get(conv_id)
+            if item is None:
+                results.append(self.analyze_conversation(conv))
+                continue
+
+            result, invalid = checked[conv_id]
+            if invalid:
+                # Solo los campos inválidos, con el prompt individual como contexto
+                try:
+                    result = complete_fields(
+                        self.backend,
+                        ANALYSIS_PROMPT.format(**self._prompt_fields(conv)),
+                        json.dumps(item, ensure_ascii=False),
+                        result,
+                        invalid,
+                        ANALYSIS_FIELDS,
+                        stage="analysis_packed",
+                        retry_budget=self.retry_budget
+                    )
+                except Exception:
+                    results.append(self.analyze_conversation(conv))
+                    continue
+
+            result["analysis_success"] = True
+            result["error"] = None
+            result["error_type"] = None
+            results.append(result)
+
+        return results
+
     def analyze_batch(
         self,
         conversations: list,
-        progress_callback=None
+        progress_callback=None,
+        max_workers: int = 1,
+        journal=None,
+        pack_size: int = 1,
+        dedup=None,
+        triage: bool = False,
+        previous: dict = None
     ) -> list:
         """
         Analiza un lote de conversaciones.
 
+        Con max_workers > 1 mantiene hasta ese número de llamadas a Gemini
+        en vuelo a la vez. El progreso se reporta desde el hilo que llama
+        (necesario para actualizar elementos de Streamlit).
+
         Args:
             conversations: Lista de diccionarios con datos
             progress_callback: Función para reportar progreso
+            max_workers: Número de solicitudes concurrentes
+            journal: RunJournal opcional; las conversaciones ya registradas
+                se reutilizan marcadas con `resumed` (ya se guardaron en la
+                ejecución que las registró) y cada análisis exitoso se agrega
+                al terminar
+            pack_size: Conversaciones por solicitud (ver analyze_packed)
+            dedup: NearDuplicateIndex opcional; solo se analiza un representante
+                por grupo de conversaciones casi idénticas y su resultado se
+                copia al resto con `duplicate_of`
+            triage: Resolver con reglas las conversaciones triviales (ver
+                triage_conversation) y marcarlas con `heuristic`
+            previous: {content_hash: análisis} de ejecuciones anteriores; solo
+                se analizan las conversaciones nuevas o modificadas, el resto
+                reutiliza su análisis marcado con `reused`
 
         Returns:
-            Lista de análisis
+            Lista de análisis en el mismo orden que la entrada, cada uno con
+            su `content_hash` (para reutilizarlo en ejecuciones incrementales)
         """
-        results = []
+        hashes = [self.content_hash(conv) for conv in conversations]
+
+        if previous is not None:
+            results = self._analyze_incremental(
+                conversations, hashes, progress_callback, max_workers, journal, pack_size, dedup, triage, previous
+            )
+        else:
+            results = self._analyze_batch(
+                conversations, progress_callback, max_workers, journal, pack_size, dedup, triage
+            )
+
+        for result, digest in zip(results, hashes):
+            result["content_hash"] = digest
+        return results
+
+    def _analyze_batch(
+        self,
+        conversations: list,
+        progress_callback=None,
+        max_workers: int = 1,
+        journal=None,
+        pack_size: int = 1,
+        dedup=None,
+        triage: bool = False
+    ) -> list:
+        """analyze_batch sin huellas de contenido."""
+        if triage:
+            return self._analyze_triaged(
+                conversations, progress_callback, max_workers, journal, pack_size, dedup
+            )
+
+        if dedup is not None:
+            return self._analyze_deduplicated(
+                conversations, progress_callback, max_workers, journal, pack_size, dedup
+            )
+
+        total = len(conversations)
+        results = [None] * total
+        ids = [conv.get("conversation_id", f"row_{i}") for i, conv in enumerate(conversations)]
+        completed = journal.take(ids) if journal else {}
+
+        pending = []
+        for i, conv_id in enumerate(ids):
+            previous = completed.get(str(conv_id))
+            if previous is not None:
+                results[i] = {**previous, "resumed": True}
+            else:
+                pending.append(i)
+
+        done = total - len(pending)
+        if progress_callback and done:
+            progress_callback(done, total)
+
+        pack_size = max(1, pack_size)
+        groups = [pending[k:k + pack_size] for k in range(0, len(pending), pack_size)]
+
+        def run_group(group):
+            if len(group) == 1:
+                return [self.analyze_conversation(conversations[group[0]])]
+            return self.analyze_packed(
+                [conversations[i] for i in group],
+                # Posición como sufijo: evita choques si hay ids repetidos
+                ids=[f"{ids[i]}#{i}" for i in group]
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {run_in_context(executor, run_group, group): group for group in groups}
+
+            for future in as_completed(futures):
+                group = futures[future]
+                for i, result in zip(group, future.result()):
+                    result["conversation_id"] = ids[i]
+                    results[i] = result
+
+                    if journal and result["analysis_success"]:
+                        journal.append(result)
+
+                done += len(group)
+                if progress_callback:
+                    progress_callback(done, total)
+
+        return results
+
+    def _analyze_incremental(
+        self,
+        conversations: list,
+        hashes: list,
+        progress_callback,
+        max_workers: int,
+        journal,
+        pack_size: int,
+        dedup,
+        triage: bool,
+        previous: dict
+    ) -> list:
+        """analyze_batch solo sobre las conversaciones sin análisis previo de su contenido."""
+        pending = [i for i, digest in enumerate(hashes) if digest not in previous]
+        reused = len(conversations) - len(pending)
+
+        analyses = self._analyze_batch(
+            [conversations[i] for i in pending],
+            progress_callback=(
+                (lambda done, _: progress_callback(reused + done, len(conversations)))
+                if progress_callback else None
+            ),
+            max_workers=max_workers,
+            journal=journal,
+            pack_size=pack_size,
+            dedup=dedup,
+            triage=triage
+        )
+
+        results = [None] * len(conversations)
+        for i, analysis in zip(pending, analyses):
+            analysis["reused"] = False
+            results[i] = analysis
 
         for i, conv in enumerate(conversations):
-            result = self.analyze_conversation(conv)
-            result["conversation_id"] = conv.get("conversation_id", f"row_{i}")
-            results.append(result)
+            if results[i] is None:
+                results[i] = {
+                    **previous[hashes[i]],
+                    "conversation_id": conv.get("conversation_id", f"row_{i}"),
+                    "reused": True
+                }
+
+        if progress_callback:
+            progress_callback(len(conversations), len(conversations))
+
+        return results
+
+    def _analyze_triaged(
+        self,
+        conversations: list,
+        progress_callback,
+        max_workers: int,
+        journal,
+        pack_size: int,
+        dedup
+    ) -> list:
+        """analyze_batch solo sobre las conversaciones que el triaje no resuelve."""
+        results = [triage_conversation(conv) for conv in conversations]
+        pending = [i for i, result in enumerate(results) if result is None]
+        resolved = len(conversations) - len(pending)
+
+        analyses = self._analyze_batch(
+            [conversations[i] for i in pending],
+            progress_callback=(
+                (lambda done, _: progress_callback(resolved + done, len(conversations)))
+                if progress_callback else None
+            ),
+            max_workers=max_workers,
+            journal=journal,
+            pack_size=pack_size,
+            dedup=dedup
+        )
+        for i, analysis in zip(pending, analyses):
+            analysis["heuristic"] = False
+            results[i] = analysis
+
+        for i, conv in enumerate(conversations):
+            if results[i].get("heuristic") is None:
+                results[i]["heuristic"] = True
+                results[i]["conversation_id"] = conv.get("conversation_id", f"row_{i}")
+                if dedup is not None:
+                    results[i]["duplicate_of"] = None
 
-            if progress_callback:
-                progress_callback(i + 1, len(conversations))
+        if progress_callback:
+            progress_callback(len(conversations), len(conversations))
 
         return results
+
+    def _analyze_deduplicated(
+        self,
+        conversations: list,
+        progress_callback,
+        max_workers: int,
+        journal,
+        pack_size: int,
+        dedup
+    ) -> list:
+        """analyze_batch sobre los representantes; copia el resultado a sus duplicados."""
+        ids = [str(conv.get("conversation_id", f"row_{i}")) for i, conv in enumerate(conversations)]
+        reps = [
+            dedup.add(conv.get("historial_de_mensajes_en_asesor", ""), conv_id)
+            for conv_id, conv in zip(ids, conversations)
+        ]
+
+        # Se analizan los representantes nuevos y los duplicados cuyo
+        # representante (de un bloque anterior) no tiene resultado válido
+        position = {conv_id: i for i, conv_id in enumerate(ids)}
+        to_analyze = [
+            i for i, rep in enumerate(reps)
+            if rep == ids[i] or (rep not in position and rep not in dedup.results)
+        ]
+        analyses = self._analyze_batch(
+            [conversations[i] for i in to_analyze],
+            progress_callback=progress_callback,
+            max_workers=max_workers,
+            journal=journal,
+            pack_size=pack_size
+        )
+
+        results = [None] * len(conversations)
+        for i, analysis in zip(to_analyze, analyses):
+            analysis["duplicate_of"] = None
+            results[i] = analysis
+            if reps[i] == ids[i] and analysis["analysis_success"]:
+                dedup.results[ids[i]] = analysis
+
+        # Si el representante falló, se analiza uno de sus duplicados en su
+        # lugar para no copiar el error a todo el grupo
+        failed = {ids[i] for i in to_analyze if reps[i] == ids[i] and not results[i]["analysis_success"]}
+        substitutes = {}
+        for i, rep in enumerate(reps):
+            if rep in failed and results[i] is None and rep not in substitutes:
+                substitutes[rep] = i
+        if substitutes:
+            retried = self._analyze_batch(
+                [conversations[i] for i in substitutes.values()],
+                max_workers=max_workers,
+                journal=journal,
+                pack_size=pack_size
+            )
+            for (rep, i), analysis in zip(substitutes.items(), retried):
+                analysis["duplicate_of"] = None
+                results[i] = analysis
+                if analysis["analysis_success"]:
+                    dedup.results[rep] = analysis
+                else:
+                    position[rep] = i
+
+        for i, rep in enumerate(reps):
+            if results[i] is not None:
+                continue
+            source = dedup.results.get(rep) or results[position[rep]]
+            results[i] = {**source, "conversation_id": conversations[i].get("conversation_id", ids[i]),
+                          "duplicate_of": rep}
+
+        if progress_callback:
+            progress_callback(len(conversations), len(conversations))
+
+        return results
+
+    def retry_failed(
+        self,
+        conversations: list,
+        results: list,
+        progress_callback=None,
+        max_workers: int = 1,
+        journal=None
+    ) -> list:
+        """
+        Reanaliza solo las conversaciones que fallaron en un lote previo.
+
+        Args:
+            conversations: Lista original de diccionarios con datos
+            results: Resultados de analyze_batch para esa lista
+            progress_callback: Función para reportar progreso
+            max_workers: Número de solicitudes concurrentes
+            journal: RunJournal opcional
+
+        Returns:
+            Lista de análisis con las filas fallidas reemplazadas
+        """
+        failed = [i for i, result in enumerate(results) if not result.get("analysis_success")]
+        retried = self.analyze_batch(
+            [conversations[i] for i in failed],
+            progress_callback=progress_callback,
+            max_workers=max_workers,
+            journal=journal
+        )
+
+        merged = list(results)
+        for i, result in zip(failed, retried):
+            merged[i] = result
+        return merged
@@ -0,0 +1,231 @@
+"""
+Módulo de Backends de Modelo
+Interfaz común para proveedores de LLM: Gemini y un stub local determinista
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+
+class LLMResponse:
+    """Respuesta de un backend: texto y consumo de tokens."""
+
+    __slots__ = ("text", "prompt_tokens", "output_tokens")
+
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+
+class BackendError(Exception):
+    """Error de un backend con código HTTP (usado por la clasificación de reintentos)."""
+
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+class LLMBackend:
+    """Interfaz de backend: cada implementación expone model_name y generate()."""
+
+    model_name = ""
+
+    def generate(self, prompt: str, generation_config: dict = None) -> LLMResponse:
+        """
+        Genera una respuesta para el prompt.
+
+        Args:
+            prompt: Prompt a enviar
+            generation_config: Configuración de generación opcional
+
+        Returns:
+            LLMResponse
+        """
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Backend de Google Gemini."""
+
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
+        """
+        Inicializa el cliente de Gemini.
+
+        Args:
+            api_key: API Key de Google Gemini
+            model: Modelo a usar
+        """
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model)
+        self.model_name = model
+
+    def generate(self, prompt: str, generation_config: dict = None) -> LLMResponse:
+        if generation_config:
+            response = self.model.generate_content(prompt, generation_config=generation_config)
+        else:
+            response = self.model.generate_content(prompt)
+
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            response.text,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0
+        )
+
+
+USE_CASES = ["FINANCIAMIENTO", "COTIZACION", "PRUEBA_MANEJO", "VENTA_VEHICULO", "SERVICIO", "OTRO"]
+
+STUB_TOPICS = ["precio", "financiamiento", "cuotas", "prueba de manejo", "modelo X50", "colores", "promoción", "entrega"]
+
+STUB_SENTENCES = [
+    "Hola, gracias por escribirnos; ya vi que te interesa el financiamiento.",
+    "Te comparto la cotización con las cuotas disponibles para el modelo que elegiste.",
+    "¿Te queda bien agendar una prueba de manejo esta semana en la sucursal más cercana?",
+    "Para avanzar necesito tu nombre completo y si eres asalariado o independiente.",
+    "Contamos con una promoción vigente de abono inicial reducido.",
+    "Quedo atento para enviarte la ficha técnica y los colores disponibles."
+]
+
+
+class StubBackend(LLMBackend):
+    """
+    Backend local sin red para benchmarks y pruebas de carga.
+
+    El contenido es determinista por prompt (mismo prompt, misma respuesta)
+    y válido según el formato que pide cada prompt del proyecto. Latencia,
+    errores y tokens siguen distribuciones configurables.
+    """
+
+    def __init__(
+        self,
+        model: str = "stub",
+        latency: str = "lognormal",
+        latency_mean: float = 0.8,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        permanent_error_rate: float = 0.0,
+        output_tokens: tuple = (80, 400),
+        seed: int = None
+    ):
+        """
+        Inicializa el stub.
+
+        Args:
+            model: Nombre del modelo simulado (clave de caché y de cuota)
+            latency: Distribución de latencia: constant, uniform, exponential o lognormal
+            latency_mean: Latencia media en segundos (mediana para lognormal)
+            latency_sigma: Dispersión de la lognormal
+            error_rate: Probabilidad de error transitorio (429/503)
+            permanent_error_rate: Probabilidad de error permanente (400)
+            output_tokens: Rango (mín, máx) de tokens de salida reportados
+            seed: Semilla para latencias y errores
+        """
+        if latency not in ("constant", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Distribución de latencia desconocida: {latency}")
+
+        self.model_name = model
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.permanent_error_rate = permanent_error_rate
+        self.output_tokens = output_tokens
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sample_latency(self) -> float:
+        if self.latency == "constant":
+            return self.latency_mean
+        if self.latency == "uniform":
+            return self._rng.uniform(0, 2 * self.latency_mean)
+        if self.latency == "exponential":
+            return self._rng.expovariate(1 / self.latency_mean) if self.latency_mean > 0 else 0.0
+        return self.latency_mean * math.exp(self._rng.gauss(0, self.latency_sigma))
+
+    def _content(self, prompt: str, rng: random.Random) -> str:
+        """Respuesta con el formato que pide el prompt."""
+        def analysis():
+            return {
+                "agent_score_numeric": rng.randint(1, 5),
+                "agent_score_text": rng.choice(STUB_SENTENCES),
+                "first_response_efficient": rng.random() < 0.6,
+                "efficiency_notes": rng.choice(STUB_SENTENCES),
+                "client_intention": rng.choice(["Cotizar un vehículo", "Solicitar financiamiento", "Agendar prueba de manejo"]),
+                "use_case": rng.choice(USE_CASES),
+                "key_topics": ", ".join(rng.sample(STUB_TOPICS, 3))
+            }
+
+        packed_ids = re.findall(r"=== CONVERSACIÓN id=(\S+) ===", prompt)
+        if packed_ids:
+            return json.dumps(
+                [{"conversation_id": conv_id, **analysis()} for conv_id in packed_ids],
+                ensure_ascii=False
+            )
+
+        if '"agent_score_numeric"' in prompt:
+            return json.dumps(analysis(), ensure_ascii=False)
+
+        if '"advisor_score"' in prompt:
+            advisor_score, ai_score = rng.randint(1, 5), rng.randint(1, 5)
+            winner = "asesor" if advisor_score > ai_score else "ia" if ai_score > advisor_score else "empate"
+            return json.dumps({
+                "advisor_score": advisor_score,
+                "ai_score": ai_score,
+                "advisor_justification": rng.choice(STUB_SENTENCES),
+                "ai_justification": rng.choice(STUB_SENTENCES),
+                "winner": winner,
+                "decisive_criterion": rng.choice(["RECONOCIMIENTO DEL CONTEXTO", "VALOR AGREGADO", "AVANCE", "CLARIDAD Y TONO"])
+            }, ensure_ascii=False)
+
+        return " ".join(rng.choice(STUB_SENTENCES) for _ in range(rng.randint(2, 8)))
+
+    def generate(self, prompt: str, generation_config: dict = None) -> LLMResponse:
+        with self._lock:
+            self.calls += 1
+            delay = self._sample_latency()
+            roll = self._rng.random()
+            output_tokens = self._rng.randint(*self.output_tokens)
+
+        time.sleep(delay)
+
+        if roll < self.permanent_error_rate:
+            raise BackendError("Stub: solicitud inválida", 400)
+        if roll < self.permanent_error_rate + self.error_rate:
+            raise BackendError("Stub: cuota excedida", 429)
+
+        # Contenido determinista: RNG sembrado con el hash del prompt
+        content_seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        text = self._content(prompt, random.Random(content_seed))
+
+        return LLMResponse(text, prompt_tokens=len(prompt) // 4 + 1, output_tokens=output_tokens)
+
+
+def create_backend(api_key: str, model: str = "gemini-2.0-flash") -> LLMBackend:
+    """
+    Crea el backend configurado.
+
+    LLM_BACKEND=stub usa StubBackend (sin API Key ni red); por defecto Gemini.
+
+    Args:
+        api_key: API Key de Google Gemini
+        model: Modelo a usar
+
+    Returns:
+        LLMBackend
+    """
+    if os.environ.get("LLM_BACKEND", "gemini").lower() == "stub":
+        return StubBackend(latency_mean=float(os.environ.get("LLM_STUB_LATENCY", 0.8)))
+    return GeminiBackend(api_key, model)
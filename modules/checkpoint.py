@@ -0,0 +1,147 @@
+"""
+Módulo de Checkpoints
+Diario append-only en disco para reanudar análisis y comparaciones
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+DEFAULT_RUNS_DIR = ".runs"
+
+
+def _json_default(value):
+    """Convierte escalares de numpy/pandas a tipos nativos."""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def fingerprint_bytes(data: bytes) -> str:
+    """Huella corta del contenido de un archivo de entrada."""
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def fingerprint_file(path: str, extra: bytes = b"") -> str:
+    """
+    Huella corta del contenido de un archivo, leído por bloques.
+
+    Coincide con fingerprint_bytes(contenido + extra), de modo que la CLI y
+    la app comparten checkpoints para el mismo archivo.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(extra)
+    return digest.hexdigest()[:12]
+
+
+class RunJournal:
+    """Diario JSONL de filas completadas, indexado por conversation_id."""
+
+    def __init__(self, path: str, id_field: str = "conversation_id"):
+        """
+        Inicializa el diario.
+
+        Args:
+            path: Ruta del archivo JSONL
+            id_field: Campo que identifica cada fila
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.id_field = id_field
+        self._lock = threading.Lock()
+        # Filas del diario aún no reutilizadas (se lee una sola vez por ejecución)
+        self._pending = None
+
+    @classmethod
+    def for_run(cls, kind: str, fingerprint: str, directory: str = DEFAULT_RUNS_DIR):
+        """
+        Diario de una ejecución identificada por tipo y huella de entrada.
+
+        Args:
+            kind: Tipo de ejecución (ej. "analisis", "comparacion")
+            fingerprint: Huella del archivo de entrada
+            directory: Carpeta de diarios
+
+        Returns:
+            RunJournal
+        """
+        return cls(os.path.join(directory, f"{kind}_{fingerprint}.jsonl"))
+
+    def load(self) -> dict:
+        """
+        Lee las filas completadas.
+
+        Returns:
+            Diccionario conversation_id (str) -> fila; la última escritura gana
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Línea truncada por una caída durante la escritura
+                    continue
+                records[str(record.get(self.id_field))] = record
+
+        return records
+
+    def completed_ids(self) -> set:
+        """IDs (como str) de las filas ya completadas."""
+        return set(self.load())
+
+    def take(self, ids) -> dict:
+        """
+        Entrega las filas completadas de los IDs dados.
+
+        El diario se lee una sola vez por instancia; las filas entregadas se
+        descartan de memoria, así que procesar un archivo por bloques no
+        vuelve a leer el diario en cada bloque y la memoria baja a medida
+        que se reutilizan las filas.
+
+        Args:
+            ids: IDs del bloque (se comparan como str)
+
+        Returns:
+            Diccionario conversation_id (str) -> fila, solo con los encontrados
+        """
+        with self._lock:
+            if self._pending is None:
+                self._pending = self.load()
+
+            found = {}
+            for conv_id in map(str, ids):
+                record = self._pending.pop(conv_id, None)
+                if record is not None:
+                    found[conv_id] = record
+            return found
+
+    def append(self, record: dict) -> None:
+        """
+        Agrega una fila completada y la persiste de inmediato.
+
+        Args:
+            record: Fila a guardar (debe contener id_field)
+        """
+        line = json.dumps(record, ensure_ascii=False, default=_json_default)
+
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        """Elimina el diario."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._pending = None
@@ -0,0 +1,362 @@
+"""
+Interfaz de Línea de Comandos
+Ejecuta análisis, comparaciones y generadores sin Streamlit
+
+Uso:
+    python -m modules.cli analyze conversaciones.csv -o analisis.csv --workers 16
+    python -m modules.cli compare conversaciones.xlsx -o comparacion.jsonl --script script.txt --kb kb.txt
+    python -m modules.cli script analisis.csv -o script.txt [--use-case FINANCIAMIENTO | --by-use-case]
+    python -m modules.cli kb analisis.csv -o kb.txt [--map-reduce --workers 16]
+    python -m modules.cli --metrics metricas.prom analyze conversaciones.csv -o analisis.csv
+    python -m modules.cli analyze conversaciones.csv -o analisis.csv --store --incremental
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from modules.checkpoint import RunJournal, fingerprint_file
+from modules.data_io import (
+    CONTEXT_COLUMNS,
+    ResultWriter,
+    filter_with_advisor,
+    iter_chunks,
+    read_table,
+    sample_chunks
+)
+from modules.dedup import NearDuplicateIndex
+from modules.metrics import get_collector
+from modules.result_store import get_result_store
+from modules.topics import get_topic_index
+
+
+# Máximo de conversaciones de compare --adaptive sin --sample
+DEFAULT_ADAPTIVE_SAMPLE = 1000
+
+
+def _report(label: str, done: int) -> None:
+    """Escribe el progreso en stderr (el total no se conoce al leer por bloques)."""
+    sys.stderr.write(f"\r{label}: {done} conversaciones")
+    sys.stderr.flush()
+
+
+def _read_text(path: str) -> str:
+    if not path:
+        return ""
+    return Path(path).read_text(encoding="utf-8")
+
+
+def _advisor_chunks(path: str, size: int, limit: int = 0):
+    """Bloques con historial de asesor, cortando tras `limit` filas."""
+    remaining = limit or None
+    for chunk in iter_chunks(path, size):
+        chunk = filter_with_advisor(chunk)
+        if remaining is not None:
+            chunk = chunk.head(remaining)
+            remaining -= len(chunk)
+        if len(chunk):
+            yield chunk
+        if remaining == 0:
+            break
+
+
+def run_analyze(args, api_key: str) -> None:
+    from modules.advisor_analyzer import AdvisorAnalyzer
+
+    if args.incremental:
+        # Los análisis reutilizados se vuelven a registrar bajo esta ejecución
+        args.store = True
+    journal = RunJournal.for_run("analisis", fingerprint_file(args.input)) if args.resume else None
+    analyzer = AdvisorAnalyzer(api_key, model=args.model)
+    writer = ResultWriter(args.output)
+    # Un solo índice para todo el archivo: agrupa duplicados entre bloques
+    dedup = NearDuplicateIndex(threshold=args.dedup) if args.dedup else None
+    # El almacén acumula los bloques y escribe por lotes (lo pendiente, al cerrar)
+    store_writer = get_result_store().writer(
+        "analysis", args.run_id, on_write=get_topic_index().update
+    ) if args.store else None
+    reused = 0
+
+    try:
+        # Cada bloque se analiza y se escribe antes de leer el siguiente
+        for chunk in _advisor_chunks(args.input, args.batch_size, args.limit):
+            keep = [col for col in CONTEXT_COLUMNS if col in chunk.columns]
+            rows = chunk.to_dict("records")
+            start = writer.rows_written
+            previous = None
+            if args.incremental:
+                previous = get_result_store().lookup("analysis", [analyzer.content_hash(row) for row in rows])
+            analyses = analyzer.analyze_batch(
+                rows,
+                progress_callback=lambda done, _: _report("Analizando", start + done),
+                max_workers=args.workers,
+                journal=journal,
+                pack_size=args.pack_size,
+                dedup=dedup,
+                triage=args.triage,
+                previous=previous
+            )
+            results = [
+                {**{col: row.get(col, "") for col in keep}, **analysis}
+                for row, analysis in zip(rows, analyses)
+            ]
+            writer.write(results)
+            reused += sum(1 for analysis in analyses if analysis.get("reused"))
+            if args.store:
+                # Los reanudados del checkpoint ya están en el almacén; los reutilizados
+                # se registran (con `reused`) para que la ejecución quede completa
+                fresh = pd.DataFrame([result for result in results if not result.get("resumed")])
+                store_writer.add(fresh)
+    finally:
+        # Un error a mitad del archivo no descarta los bloques ya acumulados
+        if args.store:
+            store_writer.close()
+            get_topic_index().save()
+
+    sys.stderr.write(f"\n✅ {writer.rows_written} análisis escritos en {args.output}\n")
+    if args.incremental:
+        sys.stderr.write(f"♻️ {reused} reutilizados del almacén, {writer.rows_written - reused} analizados\n")
+
+
+def run_compare(args, api_key: str) -> None:
+    from modules.response_comparator import ResponseComparator
+
+    chunks = _advisor_chunks(args.input, args.batch_size)
+    if args.adaptive and not args.sample:
+        # La parada secuencial evita recorrer todo el archivo: siempre hay un máximo
+        args.sample = DEFAULT_ADAPTIVE_SAMPLE
+    if args.sample:
+        # La muestra ocupa memoria proporcional a --sample, no al archivo
+        sample = sample_chunks(chunks, args.sample, seed=args.seed)
+        chunks = (sample.iloc[i:i + args.batch_size] for i in range(0, len(sample), args.batch_size))
+
+    sales_script = _read_text(args.script)
+    knowledge_base = _read_text(args.kb)
+    journal = None
+    if args.resume:
+        # Misma huella que la app: archivo + script + KB
+        journal = RunJournal.for_run(
+            "comparacion",
+            fingerprint_file(args.input, extra=(sales_script + knowledge_base).encode("utf-8"))
+        )
+
+    comparator = ResponseComparator(
+        api_key=api_key,
+        sales_script=sales_script,
+        knowledge_base=knowledge_base,
+        model=args.model
+    )
+    writer = ResultWriter(args.output)
+    store_writer = get_result_store().writer("comparison", args.run_id) if args.store else None
+    estimate = None
+    if args.adaptive:
+        chunks = [_adaptive_sample(chunks, args)]
+
+    try:
+        for chunk in chunks:
+            start = writer.rows_written
+            rows = chunk.to_dict("records")
+            if args.adaptive:
+                results, estimate = comparator.compare_adaptive(
+                    rows,
+                    win_margin=args.win_margin,
+                    score_margin=args.score_margin,
+                    progress_callback=lambda done, _: _report("Comparando", start + done),
+                    generation_workers=args.workers,
+                    evaluation_workers=args.workers,
+                    journal=journal
+                )
+                rows = rows[:len(results)]
+            else:
+                results = comparator.compare_batch(
+                    rows,
+                    progress_callback=lambda done, _: _report("Comparando", start + done),
+                    generation_workers=args.workers,
+                    evaluation_workers=args.workers,
+                    journal=journal
+                )
+            writer.write(results)
+            if args.store:
+                store_writer.add(
+                    pd.DataFrame([
+                        {**{col: row.get(col) for col in ("company_name", "group_name", "user_name")}, **result}
+                        for row, result in zip(rows, results)
+                    ])
+                )
+    finally:
+        if args.store:
+            store_writer.close()
+
+    sys.stderr.write(f"\n✅ {writer.rows_written} comparaciones escritas en {args.output}\n")
+    if estimate and estimate["n"] >= 2:
+        sys.stderr.write(
+            f"🎯 Victorias IA {estimate['win_rate']:.1%} ± {estimate['win_margin']:.1%}, "
+            f"diferencia de puntaje {estimate['score_diff']:+.2f} ± {estimate['score_margin']:.2f}"
+            f"{' (veredicto estable antes del máximo)' if estimate['stopped_early'] else ''}\n"
+        )
+
+
+def _adaptive_sample(chunks, args) -> pd.DataFrame:
+    """Muestra de --sample (ya acotada por sample_chunks) en orden de muestreo estratificado."""
+    from modules.interests import get_default_detector
+    from modules.sampling import primary_interest, stratified_order
+
+    df = pd.concat(list(chunks), ignore_index=True)
+    strata_df = df
+    if "historial_de_mensajes_en_bot" in df.columns:
+        detector = get_default_detector()
+        interests = detector.detect_frame(df["historial_de_mensajes_en_bot"])
+        strata_df = df.assign(interest=primary_interest(interests, detector.keywords))
+
+    return df.loc[stratified_order(strata_df, seed=args.seed).index]
+
+
+def run_script(args, api_key: str) -> None:
+    from modules.script_generator import (
+        generate_sales_script, generate_script_by_use_case, generate_scripts_by_use_case
+    )
+
+    df = read_table(args.input)
+    if args.by_use_case:
+        scripts = generate_scripts_by_use_case(
+            df,
+            api_key,
+            max_workers=args.workers,
+            progress_callback=lambda done, total: sys.stderr.write(f"\rGenerando scripts: {done}/{total} casos de uso")
+        )
+        sys.stderr.write("\n")
+        script = "\n\n".join(f"## {use_case}\n\n{item['script']}" for use_case, item in scripts.items())
+    elif args.use_case:
+        script = generate_script_by_use_case(df, api_key, args.use_case)
+    else:
+        script = generate_sales_script(df, api_key)
+
+    Path(args.output).write_text(script, encoding="utf-8")
+    sys.stderr.write(f"✅ Script escrito en {args.output}\n")
+
+
+def run_kb(args, api_key: str) -> None:
+    from modules.kb_generator import generate_knowledge_base, generate_knowledge_base_mapreduce
+
+    if args.map_reduce:
+        kb, report = generate_knowledge_base_mapreduce(
+            read_table(args.input),
+            api_key,
+            max_workers=args.workers,
+            progress_callback=lambda done, total: sys.stderr.write(f"\rGenerando KB: {done}/{total} solicitudes")
+        )
+        sys.stderr.write("\n")
+        if report["failed_chunks"]:
+            sys.stderr.write(
+                f"⚠️ {report['failed_chunks']} de {report['chunks']} bloques fallaron y no están en la KB\n"
+            )
+        if report["failed_groups"]:
+            sys.stderr.write(f"⚠️ {report['failed_groups']} consolidaciones fallaron; sus extractos pasaron sin consolidar\n")
+    else:
+        kb = generate_knowledge_base(read_table(args.input), api_key)
+    Path(args.output).write_text(kb, encoding="utf-8")
+    sys.stderr.write(f"✅ KB escrito en {args.output}\n")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m modules.cli",
+        description="Agente Asesores - procesamiento por lotes sin interfaz"
+    )
+    parser.add_argument("--api-key", help="API Key de Gemini (default: GEMINI_API_KEY)")
+    parser.add_argument("--model", default="gemini-2.0-flash", help="Modelo de Gemini")
+    parser.add_argument("--backend", choices=["gemini", "stub"],
+                        help="Backend de modelo (default: LLM_BACKEND o gemini); stub no usa red")
+    parser.add_argument("--metrics",
+                        help="Exporta métricas de llamadas al terminar (.prom para Prometheus, .jsonl por llamada)")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="Evalúa a los asesores")
+    analyze.add_argument("input", help="Archivo de conversaciones (.csv, .xlsx, .parquet)")
+    analyze.add_argument("-o", "--output", required=True, help="Salida (.csv o .jsonl)")
+    analyze.add_argument("--workers", type=int, default=8, help="Solicitudes concurrentes")
+    analyze.add_argument("--pack-size", type=int, default=1, help="Conversaciones por solicitud")
+    analyze.add_argument("--batch-size", type=int, default=500, help="Filas por bloque leído y escrito a disco")
+    analyze.add_argument("--limit", type=int, default=0, help="Máximo de conversaciones (0 = todas)")
+    analyze.add_argument("--dedup", type=float, default=0.0,
+                         help="Agrupa conversaciones casi idénticas con esta similitud (ej. 0.9; 0 = desactivado)")
+    analyze.add_argument("--triage", action="store_true",
+                         help="Evalúa con reglas las conversaciones triviales sin llamar al modelo")
+    analyze.add_argument("--store", action="store_true",
+                         help="Guarda también los resultados en el almacén Parquet de reportes (RESULTS_STORE_PATH)")
+    analyze.add_argument("--incremental", action="store_true",
+                         help="Reutiliza del almacén los análisis de conversaciones sin cambios (implica --store)")
+    analyze.add_argument("--no-resume", dest="resume", action="store_false",
+                         help="No usar ni escribir el checkpoint")
+    analyze.set_defaults(handler=run_analyze)
+
+    compare = commands.add_parser("compare", help="Compara respuestas asesor vs IA")
+    compare.add_argument("input", help="Archivo de conversaciones (.csv, .xlsx, .parquet)")
+    compare.add_argument("-o", "--output", required=True, help="Salida (.csv o .jsonl)")
+    compare.add_argument("--script", help="Archivo de texto con el script de ventas")
+    compare.add_argument("--kb", help="Archivo de texto con la base de conocimiento")
+    compare.add_argument("--sample", type=int, default=0, help="Tamaño de muestra (0 = todas)")
+    compare.add_argument("--seed", type=int, default=42, help="Semilla del muestreo")
+    compare.add_argument("--adaptive", action="store_true",
+                         help=f"Muestra estratificada (grupo, asesor, interés) que se detiene cuando el veredicto es estable; --sample fija el máximo (default: {DEFAULT_ADAPTIVE_SAMPLE})")
+    compare.add_argument("--win-margin", type=float, default=0.10,
+                         help="Semiancho máximo del intervalo de la tasa de victorias IA (con --adaptive)")
+    compare.add_argument("--score-margin", type=float, default=0.30,
+                         help="Semiancho máximo del intervalo de la diferencia de puntaje (con --adaptive)")
+    compare.add_argument("--workers", type=int, default=4, help="Solicitudes concurrentes por etapa")
+    compare.add_argument("--batch-size", type=int, default=500, help="Filas por bloque leído y escrito a disco")
+    compare.add_argument("--store", action="store_true",
+                         help="Guarda también los resultados en el almacén Parquet de reportes (RESULTS_STORE_PATH)")
+    compare.add_argument("--no-resume", dest="resume", action="store_false",
+                         help="No usar ni escribir el checkpoint")
+    compare.set_defaults(handler=run_compare)
+
+    script = commands.add_parser("script", help="Genera un script de ventas")
+    script.add_argument("input", help="Resultados del análisis (.csv, .xlsx, .parquet)")
+    script.add_argument("-o", "--output", required=True, help="Archivo de texto de salida")
+    script.add_argument("--use-case", help="Caso de uso específico (ej. FINANCIAMIENTO)")
+    script.add_argument("--by-use-case", action="store_true",
+                        help="Un script por cada caso de uso de los resultados, generados en paralelo")
+    script.add_argument("--workers", type=int, default=8, help="Solicitudes concurrentes (con --by-use-case)")
+    script.set_defaults(handler=run_script)
+
+    kb = commands.add_parser("kb", help="Genera la base de conocimiento")
+    kb.add_argument("input", help="Resultados del análisis (.csv, .xlsx, .parquet)")
+    kb.add_argument("-o", "--output", required=True, help="Archivo de texto de salida")
+    kb.add_argument("--map-reduce", action="store_true",
+                    help="Lee todas las conversaciones: extractos por bloque en paralelo y consolidación por etapas")
+    kb.add_argument("--workers", type=int, default=8, help="Solicitudes concurrentes (con --map-reduce)")
+    kb.set_defaults(handler=run_kb)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+
+    if args.backend:
+        os.environ["LLM_BACKEND"] = args.backend
+
+    api_key = args.api_key or os.environ.get("GEMINI_API_KEY")
+    if os.environ.get("LLM_BACKEND") == "stub":
+        api_key = api_key or "stub"
+    if not api_key:
+        sys.stderr.write("❌ Falta la API Key: usa --api-key o define GEMINI_API_KEY\n")
+        return 1
+
+    args.run_id = get_collector().start_run(args.command)
+    try:
+        args.handler(args, api_key)
+    finally:
+        if args.metrics:
+            get_collector().export(args.metrics)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
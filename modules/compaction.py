@@ -0,0 +1,154 @@
+"""
+Módulo de Compactación de Historiales
+Reduce un historial a un presupuesto de tokens trabajando por turnos:
+conserva la apertura y la primera respuesta del asesor, los turnos más
+recientes y colapsa mensajes repetidos (consecutivos y, si no alcanza,
+plantillas del asesor y del bot en todo el historial)
+"""
+import re
+
+from modules.conversation import ParsedConversation, parse_conversation
+from modules.rate_limiter import estimate_tokens
+
+
+# Presupuestos por defecto (equivalentes a los cortes previos de 3000/2000 caracteres)
+ADVISOR_HISTORY_TOKENS = 750
+BOT_HISTORY_TOKENS = 500
+
+# Roles cuyos mensajes repetidos suelen ser plantillas (el cliente no)
+TEMPLATE_ROLES = ("USER", "BOT")
+
+_SPACES = re.compile(r"\s+")
+
+
+def _format(role, content: str) -> str:
+    return f"{role}: {content}" if role else content
+
+
+def _collapse(turns: list) -> list:
+    """
+    Colapsa mensajes repetidos consecutivos.
+
+    Un mensaje idéntico (ignorando mayúsculas y espacios) al inmediatamente
+    anterior del mismo rol se cuenta en ese mensaje en lugar de repetirse.
+
+    Returns:
+        Lista de [rol, contenido, clave, mensajes originales que representa]
+    """
+    collapsed = []
+    for role, content in turns:
+        key = (role, _SPACES.sub(" ", content.casefold()).strip())
+        if collapsed and key == collapsed[-1][2]:
+            collapsed[-1][3] += 1
+            continue
+        collapsed.append([role, _SPACES.sub(" ", content).strip(), key, 1])
+    return collapsed
+
+
+def _collapse_templates(collapsed: list, start: int) -> list:
+    """
+    Colapsa las plantillas repetidas no consecutivas a partir de `start`.
+
+    Cada mensaje de TEMPLATE_ROLES que repite uno anterior (desde `start`)
+    se suma a la primera aparición. Solo se aplica cuando el historial no
+    cabe en el presupuesto: así una pregunta que el asesor vuelve a hacer
+    se conserva en su lugar siempre que haya espacio.
+    """
+    merged = collapsed[:start]
+    first = {}
+    for role, content, key, count in collapsed[start:]:
+        if role in TEMPLATE_ROLES and key in first:
+            first[key][3] += count
+            continue
+        item = [role, content, key, count]
+        if role in TEMPLATE_ROLES:
+            first[key] = item
+        merged.append(item)
+    return merged
+
+
+def _annotate(collapsed: list) -> list:
+    """(rol, contenido con (xN), mensajes originales que representa)."""
+    return [
+        (role, f"{content} (x{count})" if count > 1 else content, count)
+        for role, content, _, count in collapsed
+    ]
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Corte por caracteres (solo cuando un turno no cabe entero)."""
+    max_chars = max(0, max_tokens * 4)
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def compact_history(history, max_tokens: int, anchor_role: str = "USER") -> str:
+    """
+    Compacta un historial para que quepa en `max_tokens`.
+
+    Se conservan siempre los turnos hasta la primera respuesta de
+    `anchor_role` (inclusive). Si el resto no cabe, primero se colapsan
+    las plantillas repetidas del asesor y del bot; luego se agregan los
+    turnos más recientes que quepan. Los turnos intermedios omitidos se
+    reemplazan por un marcador con su cantidad.
+
+    Args:
+        history: Historial (texto o ParsedConversation ya parseado)
+        max_tokens: Presupuesto de tokens del resultado
+        anchor_role: Rol cuya primera respuesta se conserva (None: solo
+            el primer turno)
+
+    Returns:
+        Historial compactado ("" si no hay texto)
+    """
+    parsed = history if isinstance(history, ParsedConversation) else parse_conversation(history)
+    if estimate_tokens(parsed.text) <= max_tokens:
+        return parsed.text
+
+    collapsed = _collapse(list(parsed.items()))
+    turns = _annotate(collapsed)
+    lines = [_format(role, content) for role, content, _ in turns]
+    if estimate_tokens("\n".join(lines)) <= max_tokens:
+        return "\n".join(lines)
+
+    # Apertura: hasta el final del primer bloque de mensajes de anchor_role
+    head_end = 1
+    if anchor_role:
+        first = next((i for i, (role, _, _) in enumerate(turns) if role == anchor_role), None)
+        if first is not None:
+            head_end = first + 1
+            while head_end < len(turns) and turns[head_end][0] == anchor_role:
+                head_end += 1
+
+    # Plantillas repetidas fuera de la apertura (saludos, menús, recordatorios)
+    turns = _annotate(_collapse_templates(collapsed, head_end))
+    lines = [_format(role, content) for role, content, _ in turns]
+    if estimate_tokens("\n".join(lines)) <= max_tokens:
+        return "\n".join(lines)
+
+    budget = max_tokens
+    head = []
+    for line in lines[:head_end]:
+        if budget <= 1:
+            break
+        line = _truncate(line, budget - 1)
+        head.append(line)
+        budget -= estimate_tokens(line) + 1
+
+    # Turnos recientes, del último hacia atrás, mientras quepan
+    marker_tokens = 12
+    tail = []
+    for line in reversed(lines[head_end:]):
+        cost = estimate_tokens(line) + 1
+        if cost > budget - marker_tokens:
+            if not tail and budget - marker_tokens > 25:
+                # El último turno siempre aporta: se incluye recortado
+                tail.append(_truncate(line, budget - marker_tokens - 1))
+            break
+        tail.append(line)
+        budget -= cost
+    tail.reverse()
+
+    # Mensajes originales entre la apertura y los recientes
+    omitted = sum(count for _, _, count in turns[len(head):len(turns) - len(tail)])
+    middle = [f"[... {omitted} mensajes omitidos ...]"] if omitted > 0 else []
+    return "\n".join(head + middle + tail)
@@ -0,0 +1,171 @@
+"""
+Módulo de Conversaciones
+Parsea cada historial una sola vez a turnos compactos (rol, desplazamiento,
+largo) compartidos por el analizador y el comparador
+"""
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# "USER: ...", "CLIENT: ...", "BOT: ..." o "[USER] ..."
+ROLE_PATTERN = re.compile(r"^[ \t]*(?:\[(USER|CLIENT|BOT)\]|(USER|CLIENT|BOT)[ \t]*:)[ \t]*", re.MULTILINE)
+
+DEFAULT_CACHE_SIZE = 10_000
+
+
+# Roles codificados en un byte por turno
+ROLES = (None, "USER", "CLIENT", "BOT")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+class ParsedConversation:
+    """
+    Historial parseado: el texto original más sus turnos, sin copiar contenido.
+
+    Cada turno ocupa un byte de rol y dos enteros (desplazamiento y largo
+    del contenido dentro del texto original).
+    """
+
+    __slots__ = ("text", "roles", "offsets", "lengths")
+
+    def __init__(self, text: str, roles: bytes = b"", offsets=None, lengths=None):
+        self.text = text
+        self.roles = roles
+        self.offsets = offsets if offsets is not None else array("I")
+        self.lengths = lengths if lengths is not None else array("I")
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+    def role(self, i: int):
+        """Rol del turno i (None para texto sin marcador)."""
+        return ROLES[self.roles[i]]
+
+    def content(self, i: int) -> str:
+        """Contenido del turno i (sin el marcador de rol)."""
+        offset = self.offsets[i]
+        return self.text[offset:offset + self.lengths[i]]
+
+    def items(self):
+        """Itera (rol, contenido) por turno."""
+        for i in range(len(self.roles)):
+            yield ROLES[self.roles[i]], self.content(i)
+
+    def first_reply(self, role: str = "USER", stop_role: str = "CLIENT") -> list:
+        """
+        Contenidos del primer bloque de mensajes de `role`.
+
+        El bloque termina en el primer mensaje de `stop_role` posterior
+        (los mensajes de otros roles intermedios se ignoran).
+
+        Returns:
+            Lista de contenidos no vacíos
+        """
+        code, stop_code = _ROLE_CODES[role], _ROLE_CODES[stop_role]
+        parts = []
+        found = False
+        for i, turn_code in enumerate(self.roles):
+            if turn_code == code:
+                found = True
+                if self.lengths[i]:
+                    parts.append(self.content(i))
+            elif found and turn_code == stop_code:
+                break
+        return parts
+
+
+def parse_conversation(text) -> ParsedConversation:
+    """
+    Parsea un historial en turnos.
+
+    Las líneas sin marcador de rol continúan el turno anterior; el texto
+    previo al primer marcador queda como un turno con rol None.
+
+    Args:
+        text: Historial en el formato de exportación
+
+    Returns:
+        ParsedConversation (vacío si el valor es nulo)
+    """
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return ParsedConversation("")
+    text = str(text)
+
+    roles = bytearray()
+    offsets = array("I")
+    lengths = array("I")
+
+    matches = list(ROLE_PATTERN.finditer(text))
+    lead = text[:matches[0].start()] if matches else text
+    if lead.strip():
+        start = len(lead) - len(lead.lstrip())
+        roles.append(0)
+        offsets.append(start)
+        lengths.append(len(lead.rstrip()) - start)
+
+    bounds = [m.start() for m in matches[1:]] + [len(text)]
+    for match, end in zip(matches, bounds):
+        start = match.end()
+        roles.append(_ROLE_CODES[match.group(1) or match.group(2)])
+        offsets.append(start)
+        lengths.append(len(text[start:end].rstrip()))
+
+    return ParsedConversation(text, bytes(roles), offsets, lengths)
+
+
+class ConversationCache:
+    """Caché LRU de historiales parseados por (conversation_id, columna)."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_data: dict, field: str) -> ParsedConversation:
+        """
+        Devuelve la columna `field` de la conversación parseada.
+
+        Args:
+            conversation_data: Diccionario con datos de la conversación
+            field: Columna del historial (ej. historial_de_mensajes_en_asesor)
+
+        Returns:
+            ParsedConversation
+        """
+        text = conversation_data.get(field, "")
+        conv_id = conversation_data.get("conversation_id")
+        if conv_id is None:
+            return parse_conversation(text)
+
+        key = (str(conv_id), field)
+        with self._lock:
+            parsed = self._items.get(key)
+            if parsed is not None:
+                # El mismo id con otro texto (otro archivo) invalida la entrada
+                if parsed.text is text or parsed.text == (text if isinstance(text, str) else ""):
+                    self._items.move_to_end(key)
+                    return parsed
+
+        parsed = parse_conversation(text)
+        with self._lock:
+            self._items[key] = parsed
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return parsed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_cache = ConversationCache()
+
+
+def get_parsed(conversation_data: dict, field: str) -> ParsedConversation:
+    """Historial parseado desde la caché compartida del proceso."""
+    return _cache.get(conversation_data, field)
@@ -0,0 +1,175 @@
+"""
+Módulo de Entrada/Salida de Datos
+Lectura de archivos de conversaciones y escritura incremental de resultados
+"""
+import json
+from pathlib import Path
+
+import pandas as pd
+
+
+# Columnas del archivo original que se conservan junto al análisis
+CONTEXT_COLUMNS = [
+    "conversation_id",
+    "historial_de_mensajes_en_bot",
+    "historial_de_mensajes_en_asesor",
+    "tipificacion",
+    "company_name",
+    "group_name",
+    "user_name",
+    "fecha_primer_mensaje",
+    "tipo_origen"
+]
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """
+    Lee un archivo CSV, Excel o Parquet.
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        DataFrame con el contenido
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(path)
+    if suffix in (".xlsx", ".xls"):
+        return pd.read_excel(path)
+    if suffix == ".parquet":
+        return pd.read_parquet(path)
+    raise ValueError(f"Formato no soportado: {suffix} (usa .csv, .xlsx o .parquet)")
+
+
+def _suffix(source) -> str:
+    name = source if isinstance(source, (str, Path)) else getattr(source, "name", "")
+    return Path(str(name)).suffix.lower()
+
+
+def iter_chunks(source, chunksize: int = 1000):
+    """
+    Lee un archivo por bloques sin cargarlo completo en memoria.
+
+    Args:
+        source: Ruta o archivo abierto con atributo `name` (ej. UploadedFile)
+        chunksize: Filas por bloque
+
+    Yields:
+        DataFrames de hasta `chunksize` filas
+    """
+    suffix = _suffix(source)
+
+    if suffix == ".csv":
+        yield from pd.read_csv(source, chunksize=chunksize)
+
+    elif suffix in (".xlsx", ".xls"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(col) for col in next(rows, ())]
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) == chunksize:
+                yield pd.DataFrame(block, columns=header)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=header)
+        workbook.close()
+
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+    else:
+        raise ValueError(f"Formato no soportado: {suffix} (usa .csv, .xlsx o .parquet)")
+
+
+def sample_chunks(chunks, n: int, seed: int = None) -> pd.DataFrame:
+    """
+    Muestra aleatoria uniforme de `n` filas sobre un flujo de bloques.
+
+    Asigna una clave aleatoria a cada fila y conserva las `n` mayores,
+    así la memoria queda acotada por `n` y no por el tamaño del archivo.
+
+    Args:
+        chunks: Iterable de DataFrames
+        n: Tamaño de muestra
+        seed: Semilla opcional
+
+    Returns:
+        DataFrame con la muestra
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    kept = None
+    for chunk in chunks:
+        chunk = chunk.assign(_sample_key=rng.random(len(chunk)))
+        kept = chunk if kept is None else pd.concat([kept, chunk], ignore_index=True)
+        kept = kept.nlargest(n, "_sample_key")
+
+    if kept is None:
+        return pd.DataFrame()
+    return kept.drop(columns="_sample_key").reset_index(drop=True)
+
+
+def filter_with_advisor(df: pd.DataFrame) -> pd.DataFrame:
+    """Conserva solo las conversaciones con historial de asesor."""
+    return df[
+        df["historial_de_mensajes_en_asesor"].notna() &
+        (df["historial_de_mensajes_en_asesor"] != "")
+    ]
+
+
+class ResultWriter:
+    """Escribe filas de resultado a CSV o JSONL a medida que terminan."""
+
+    def __init__(self, path: str):
+        """
+        Inicializa el escritor y trunca el archivo de salida.
+
+        Args:
+            path: Ruta de salida (.csv o .jsonl)
+        """
+        self.path = path
+        self.format = Path(path).suffix.lower().lstrip(".")
+        if self.format not in ("csv", "jsonl"):
+            raise ValueError(f"Formato de salida no soportado: .{self.format} (usa .csv o .jsonl)")
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        open(path, "w", encoding="utf-8").close()
+        self.rows_written = 0
+        self.columns = None
+
+    def write(self, rows: list) -> None:
+        """
+        Agrega filas al archivo de salida.
+
+        Args:
+            rows: Lista de diccionarios
+        """
+        if not rows:
+            return
+
+        if self.format == "csv":
+            # Las columnas quedan fijas con el primer lote
+            frame = pd.DataFrame(rows)
+            if self.columns is None:
+                self.columns = frame.columns.tolist()
+            frame.reindex(columns=self.columns).to_csv(
+                self.path,
+                mode="a",
+                header=self.rows_written == 0,
+                index=False
+            )
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+        self.rows_written += len(rows)
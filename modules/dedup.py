@@ -0,0 +1,174 @@
+"""
+Módulo de Deduplicación
+Agrupa conversaciones casi idénticas con MinHash + LSH para analizar
+un solo representante por grupo
+"""
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Primo de Mersenne 2^31 - 1: a * x cabe en uint64 sin desbordar
+_PRIME = np.uint64((1 << 31) - 1)
+
+# Resultados de representantes que se conservan para bloques posteriores
+MAX_RESULTS = 10_000
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text) -> str:
+    """
+    Normaliza una conversación para compararla.
+
+    Minúsculas, sin acentos, números reemplazados por 0 y espacios
+    colapsados (precios, horas o RUT distintos no separan plantillas).
+    """
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return ""
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _DIGITS.sub("0", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Conjunto de n-gramas de palabras (hash CRC32) del texto normalizado."""
+    words = text.split()
+    if len(words) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+class BoundedResults(OrderedDict):
+    """Diccionario que descarta las entradas menos usadas al superar `maxsize`."""
+
+    def __init__(self, maxsize: int = MAX_RESULTS):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class NearDuplicateIndex:
+    """
+    Índice incremental de representantes.
+
+    Cada texto se compara contra los representantes ya registrados
+    (no contra otros miembros), de modo que los grupos no se encadenan
+    por similitud transitiva. El índice se puede reutilizar entre
+    bloques de un mismo archivo; `results` guarda el resultado de cada
+    representante para copiarlo a duplicados de bloques posteriores (hasta
+    `max_results`; un duplicado cuyo representante ya no está se analiza).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        bands: int = 8,
+        shingle_size: int = 3,
+        seed: int = 1,
+        max_results: int = MAX_RESULTS
+    ):
+        """
+        Inicializa el índice.
+
+        Args:
+            threshold: Similitud de Jaccard estimada mínima para agrupar
+            num_perm: Permutaciones de MinHash (largo de la firma)
+            bands: Bandas de LSH (num_perm debe ser divisible por bands)
+            shingle_size: Palabras por n-grama
+            seed: Semilla de las permutaciones
+            max_results: Resultados de representantes en memoria
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser divisible por bands")
+
+        rng = np.random.RandomState(seed)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, (1 << 31) - 1, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, (1 << 31) - 1, size=num_perm).astype(np.uint64)
+        self._exact = {}
+        self._buckets = {}
+        self._signatures = {}
+        self.results = BoundedResults(max_results)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Firma MinHash de un texto ya normalizado."""
+        values = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64) % _PRIME
+        hashed = (self._a[:, None] * values[None, :] + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, text, key: str) -> str:
+        """
+        Registra un texto y devuelve la clave de su representante.
+
+        Args:
+            text: Texto de la conversación
+            key: Clave única de la fila
+
+        Returns:
+            Clave del representante (la propia si el texto es nuevo o vacío)
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return key
+
+        digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if digest in self._exact:
+            return self._exact[digest]
+
+        signature = self.signature(normalized)
+        band_keys = self._band_keys(signature)
+
+        best_key, best_similarity = None, self.threshold
+        seen = set()
+        for band_key in band_keys:
+            for candidate in self._buckets.get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = candidate, similarity
+
+        if best_key is not None:
+            self._exact[digest] = best_key
+            return best_key
+
+        self._exact[digest] = key
+        self._signatures[key] = signature
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(key)
+        return key
@@ -0,0 +1,166 @@
+"""
+Módulo de Detección de Intereses
+Detecta intereses del cliente (financiamiento, prueba de manejo, contado,
+modelo) sobre columnas completas con patrones multi-palabra compilados
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Catálogo por defecto: categoría -> (etiqueta del resumen, palabras clave)
+DEFAULT_KEYWORDS = {
+    "financiamiento": ("FINANCIAMIENTO", ["financiamiento", "financiar", "crédito", "cuotas"]),
+    "test_drive": ("TEST DRIVE", ["prueba de manejo", "test drive", "cita", "visitar"]),
+    "contado": ("CONTADO", ["contado", "efectivo"])
+}
+
+# Modelos en orden de prioridad (se reporta el primero que aparezca en la lista)
+DEFAULT_MODELS = ["x50", "dashing", "t1", "t2", "s06"]
+
+NO_INFO = "Sin info"
+NO_INTEREST = "Sin interés específico"
+
+
+def trie_pattern(words: list) -> str:
+    """
+    Compila palabras clave a una expresión regular en forma de trie.
+
+    Los prefijos comunes se factorizan ("financiamiento|financiar" ->
+    "financia(?:miento|r)"), de modo que el motor recorre el texto una
+    sola vez por categoría como un autómata de múltiples patrones. Como
+    solo interesa saber si alguna palabra aparece, una palabra que es
+    prefijo de otra basta para cortar la rama.
+
+    Args:
+        words: Palabras clave (se comparan en minúsculas)
+
+    Returns:
+        Patrón de expresión regular (nunca coincide si la lista está vacía)
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word.lower():
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        if "" in node:
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return build(trie) if trie else "(?!)"
+
+
+class InterestDetector:
+    """Detector de intereses con catálogo configurable."""
+
+    def __init__(self, keywords: dict = None, models: list = None):
+        """
+        Compila el catálogo.
+
+        Args:
+            keywords: {categoría: (etiqueta, [palabras clave])} (default: DEFAULT_KEYWORDS)
+            models: Modelos en orden de prioridad (default: DEFAULT_MODELS)
+        """
+        self.keywords = keywords or DEFAULT_KEYWORDS
+        self.models = [model.lower() for model in (models or DEFAULT_MODELS)]
+        self._patterns = {
+            category: re.compile(trie_pattern(words))
+            for category, (_, words) in self.keywords.items()
+        }
+
+    @classmethod
+    def from_json(cls, path: str) -> "InterestDetector":
+        """
+        Carga el catálogo desde un JSON.
+
+        Formato: {"keywords": {"categoria": ["ETIQUETA", ["palabra", ...]]}, "models": [...]}
+        """
+        with open(path, encoding="utf-8") as f:
+            catalog = json.load(f)
+        keywords = {
+            category: (label, words)
+            for category, (label, words) in catalog.get("keywords", {}).items()
+        }
+        return cls(keywords or None, catalog.get("models"))
+
+    def _summary(self, flags: dict, model) -> str:
+        interests = [
+            label for category, (label, _) in self.keywords.items() if flags[category]
+        ]
+        if model:
+            interests.append(f"Modelo: {model}")
+        return ", ".join(interests) if interests else NO_INTEREST
+
+    def detect(self, text) -> dict:
+        """
+        Detecta intereses en un texto.
+
+        Args:
+            text: Historial del bot (cualquier capitalización)
+
+        Returns:
+            Diccionario con un booleano por categoría, 'modelo' y 'resumen'
+        """
+        if text is None or (not isinstance(text, str) and pd.isna(text)) or not text:
+            return {"financiamiento": False, "test_drive": False, "resumen": NO_INFO}
+
+        lowered = str(text).lower()
+        result = {category: bool(pattern.search(lowered)) for category, pattern in self._patterns.items()}
+        result["modelo"] = next((model.upper() for model in self.models if model in lowered), None)
+        result["resumen"] = self._summary(result, result["modelo"])
+        return result
+
+    def detect_frame(self, texts: pd.Series) -> pd.DataFrame:
+        """
+        Detecta intereses sobre una columna completa.
+
+        Cada categoría es una sola pasada vectorizada de str.contains con
+        su patrón compilado; los modelos respetan el orden de prioridad.
+
+        Args:
+            texts: Columna de historiales del bot
+
+        Returns:
+            DataFrame con el mismo índice: una columna booleana por
+            categoría, 'modelo' y 'resumen'
+        """
+        present = texts.notna() & texts.astype(str).ne("")
+        lowered = texts.where(present, "").astype(str).str.lower()
+
+        frame = pd.DataFrame(index=texts.index)
+        for category, pattern in self._patterns.items():
+            frame[category] = lowered.str.contains(pattern, regex=True).to_numpy() & present.to_numpy()
+
+        model = pd.Series(None, index=texts.index, dtype=object)
+        for name in reversed(self.models):
+            # En orden inverso: el de mayor prioridad sobrescribe al resto
+            model = model.mask(lowered.str.contains(name, regex=False), name.upper())
+        frame["modelo"] = model.where(present, None)
+
+        summary = pd.Series("", index=texts.index, dtype=object)
+        for category, (label, _) in self.keywords.items():
+            summary = summary + np.where(frame[category], label + ", ", "")
+        summary = summary + ("Modelo: " + frame["modelo"].fillna("") + ", ").where(frame["modelo"].notna(), "")
+        summary = summary.str[:-2].where(summary.ne(""), NO_INTEREST)
+        frame["resumen"] = summary.where(present, NO_INFO)
+
+        return frame
+
+
+_default_detector = None
+
+
+def get_default_detector() -> InterestDetector:
+    """Detector con el catálogo por defecto (compilado una vez por proceso)."""
+    global _default_detector
+    if _default_detector is None:
+        _default_detector = InterestDetector()
+    return _default_detector
@@ -2,31 +2,105 @@
 Módulo de Generación de Base de Conocimiento
 Extrae y consolida información de las conversaciones
 """
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-import time
+
+from modules.backends import create_backend
+from modules.compaction import compact_history
+from modules.conversation import get_parsed
+from modules.llm import generate_text
+from modules.metrics import run_in_context
+from modules.rate_limiter import estimate_tokens
+from modules.topics import TopicIndex, top_topics
+
+
+MODEL_NAME = "gemini-2.0-flash"
+
+# Map-reduce: tokens de conversaciones por extracto, tokens por conversación
+# dentro de un extracto y extractos que se consolidan por solicitud
+CHUNK_TOKENS = 6000
+CONVERSATION_TOKENS = 300
+REDUCE_FAN_IN = 8
+DEFAULT_WORKERS = 8
+
+KB_SECTIONS = """1. INFORMACIÓN DE PRODUCTOS
+   - Modelos disponibles
+   - Rangos de precio
+   - Características principales
+
+2. PROCESOS DE FINANCIAMIENTO
+   - Requisitos para asalariados
+   - Requisitos para independientes
+   - Porcentajes de abono inicial
+   - Documentos necesarios
+
+3. PROMOCIONES Y BENEFICIOS
+   - Promociones activas
+   - Beneficios incluidos
+
+4. INFORMACIÓN DE SERVICIO
+   - Sucursales disponibles
+   - Horarios de atención
+   - Servicios adicionales
+
+5. PREGUNTAS FRECUENTES (FAQ)
+   - Preguntas comunes de clientes
+   - Respuestas estándar
+
+6. OBJECIONES COMUNES
+   - Objeciones típicas
+   - Respuestas recomendadas
+"""
+
+MAP_PROMPT = """Estas son {count} conversaciones de servicio al cliente de un concesionario automotriz.
+
+{conversations}
+
+Extrae SOLO hechos concretos que aparezcan en las conversaciones y sirvan para una base de conocimiento (modelos, precios, cuotas, requisitos, documentos, promociones, sucursales, horarios, preguntas frecuentes, objeciones y cómo se respondieron). No inventes datos.
+
+Agrupa los hechos en estas secciones y omite las que no tengan datos:
+{sections}
+Formato: viñetas breves bajo cada sección.
+"""
+
+REDUCE_PROMPT = """Consolida estos {count} extractos parciales de una base de conocimiento en un solo extracto.
+
+{partials}
+
+Une los hechos equivalentes, elimina duplicados y conserva los datos concretos (cifras, requisitos, nombres). Si dos extractos se contradicen, conserva ambos valores indicando que varían.
+
+Usa las mismas secciones y viñetas breves.
+"""
+
+FINAL_PROMPT = """Basándote en estos extractos obtenidos de {rows} conversaciones de servicio al cliente, genera una BASE DE CONOCIMIENTO estructurada.
+
+{partials}
+
+GENERA UNA BASE DE CONOCIMIENTO que incluya:
+
+""" + KB_SECTIONS + """
+Formato: texto estructurado con secciones claras, información concreta y verificable. Usa solo datos presentes en los extractos.
+"""
 
 
-def generate_knowledge_base(df: pd.DataFrame, api_key: str) -> str:
+def generate_knowledge_base(df: pd.DataFrame, api_key: str, backend=None, topic_index=None) -> str:
     """
     Genera una base de conocimiento desde las conversaciones.
 
     Args:
         df: DataFrame con los análisis
         api_key: API Key de Gemini
+        backend: LLMBackend a usar (default: según create_backend)
+        topic_index: TopicIndex ya construido (default: conteo directo sobre df)
 
     Returns:
         Base de conocimiento generada
     """
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    backend = backend or create_backend(api_key, MODEL_NAME)
 
-    # Recopilar información de diferentes columnas
-    key_topics = []
-    if "key_topics" in df.columns:
-        for topics in df["key_topics"].dropna():
-            if topics and str(topics).strip():
-                key_topics.extend([t.strip() for t in str(topics).split(",")])
+    # Temas normalizados ("Precio", "precios" cuentan como uno)
+    frequent = topic_index.top(20) if topic_index is not None else top_topics(df, 20)
 
     intentions = []
     if "client_intention" in df.columns:
@@ -36,18 +110,10 @@ def generate_knowledge_base(df: pd.DataFrame, api_key: str) -> str:
     if "use_case" in df.columns:
         use_cases = df["use_case"].dropna().unique().tolist()
 
-    # Contar frecuencias de topics
-    topic_freq = {}
-    for topic in key_topics:
-        if topic:
-            topic_freq[topic] = topic_freq.get(topic, 0) + 1
-
-    top_topics = sorted(topic_freq.items(), key=lambda x: -x[1])[:20]
-
     prompt = f"""Basándote en el análisis de conversaciones de servicio al cliente, genera una BASE DE CONOCIMIENTO estructurada.
 
 TEMAS MÁS FRECUENTES EN LAS CONVERSACIONES:
-{chr(10).join([f"- {t[0]} ({t[1]} menciones)" for t in top_topics]) if top_topics else "No disponibles"}
+{chr(10).join([f"- {topic} ({count} menciones)" for topic, count in frequent.itertuples(index=False)]) if len(frequent) else "No disponibles"}
 
 INTENCIONES DE CLIENTES DETECTADAS:
 {chr(10).join([f"- {i}" for i in intentions[:15]]) if intentions else "No disponibles"}
@@ -57,75 +123,221 @@ CASOS DE USO IDENTIFICADOS:
 
 GENERA UNA BASE DE CONOCIMIENTO que incluya:
 
-1. INFORMACIÓN DE PRODUCTOS
-   - Modelos disponibles
-   - Rangos de precio
-   - Características principales
+{KB_SECTIONS}
+Formato: texto estructurado con secciones claras, información concreta y verificable.
+"""
 
-2. PROCESOS DE FINANCIAMIENTO
-   - Requisitos para asalariados
-   - Requisitos para independientes
-   - Porcentajes de abono inicial
-   - Documentos necesarios
+    try:
+        text = generate_text(backend, prompt, stage="knowledge_base")
+        return text.strip()
+    except Exception as e:
+        return f"Error generando KB: {str(e)}"
 
-3. PROMOCIONES Y BENEFICIOS
-   - Promociones activas
-   - Beneficios incluidos
 
-4. INFORMACIÓN DE SERVICIO
-   - Sucursales disponibles
-   - Horarios de atención
-   - Servicios adicionales
+def _conversation_digest(row: dict) -> str:
+    """Una conversación resumida para el extracto: historial compactado o su análisis."""
+    parts = []
+    if pd.notna(row.get("historial_de_mensajes_en_asesor")) and row.get("historial_de_mensajes_en_asesor"):
+        parts.append(compact_history(
+            get_parsed(row, "historial_de_mensajes_en_asesor"),
+            CONVERSATION_TOKENS
+        ))
+    for label, field in (("Intención", "client_intention"), ("Caso de uso", "use_case"),
+                         ("Temas", "key_topics"), ("Evaluación", "agent_score_text")):
+        value = row.get(field)
+        if value is not None and pd.notna(value) and str(value).strip():
+            parts.append(f"{label}: {str(value).strip()}")
+    return "\n".join(parts)
 
-5. PREGUNTAS FRECUENTES (FAQ)
-   - Preguntas comunes de clientes
-   - Respuestas estándar
 
-6. OBJECIONES COMUNES
-   - Objeciones típicas
-   - Respuestas recomendadas
+def chunk_conversations(df: pd.DataFrame, chunk_tokens: int = CHUNK_TOKENS) -> list:
+    """
+    Divide las conversaciones en bloques de hasta `chunk_tokens` tokens.
 
-Formato: texto estructurado con secciones claras, información concreta y verificable.
-"""
+    Los bloques dependen solo del contenido y del orden de las filas: al
+    repetir la generación (o agregar filas al final) los bloques iguales
+    producen el mismo prompt y se resuelven desde la caché del modelo.
 
+    Returns:
+        Lista de (cantidad de conversaciones, texto del bloque)
+    """
+    chunks = []
+    current, tokens = [], 0
+    for row in df.to_dict("records"):
+        digest = _conversation_digest(row)
+        if not digest:
+            continue
+        cost = estimate_tokens(digest) + 4
+        if current and tokens + cost > chunk_tokens:
+            chunks.append(current)
+            current, tokens = [], 0
+        current.append(digest)
+        tokens += cost
+    if current:
+        chunks.append(current)
+
+    return [
+        (len(chunk), "\n\n".join(f"--- Conversación {i + 1} ---\n{text}" for i, text in enumerate(chunk)))
+        for chunk in chunks
+    ]
+
+
+def _generate_all(backend, prompts: list, stage: str, max_workers: int, on_done=None) -> list:
+    """Genera los prompts en paralelo; los fallidos quedan como None."""
+    results = [None] * len(prompts)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            run_in_context(executor, generate_text, backend, prompt, stage=stage): i
+            for i, prompt in enumerate(prompts)
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result().strip()
+            except Exception:
+                pass
+            if on_done:
+                on_done()
+    return results
+
+
+def generate_knowledge_base_mapreduce(
+    df: pd.DataFrame,
+    api_key: str,
+    backend=None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    fan_in: int = REDUCE_FAN_IN,
+    max_workers: int = DEFAULT_WORKERS,
+    progress_callback=None
+) -> tuple:
+    """
+    Genera la base de conocimiento leyendo todas las conversaciones.
+
+    Map: cada bloque de conversaciones (ver chunk_conversations) se reduce
+    a un extracto de hechos, en paralelo. Reduce: los extractos se
+    consolidan de a `fan_in` por solicitud, en etapas paralelas, hasta que
+    quedan `fan_in` o menos; la última solicitud arma la KB con las
+    secciones habituales. Cada extracto pasa por la caché del modelo, de
+    modo que una regeneración solo paga los bloques que cambiaron.
+
+    Un bloque fallido queda fuera de la KB; un grupo fallido conserva sus
+    extractos sin consolidar, y si una etapa no reduce la cantidad de
+    extractos la consolidación se detiene y la solicitud final usa los que
+    haya. Ambos casos se informan en el reporte.
+
+    Args:
+        df: DataFrame con los análisis (usa los historiales si están presentes)
+        api_key: API Key de Gemini
+        backend: LLMBackend a usar (default: según create_backend)
+        chunk_tokens: Tokens de conversaciones por bloque
+        fan_in: Extractos consolidados por solicitud (mínimo 2)
+        max_workers: Solicitudes concurrentes por etapa
+        progress_callback: Función (hechas, total) llamada tras cada solicitud
+
+    Returns:
+        (base de conocimiento, reporte) con el reporte
+        {"chunks", "failed_chunks", "failed_groups"}
+    """
+    backend = backend or create_backend(api_key, MODEL_NAME)
+    fan_in = max(2, fan_in)
+
+    chunks = chunk_conversations(df, chunk_tokens)
+    report = {"chunks": len(chunks), "failed_chunks": 0, "failed_groups": 0}
+    if not chunks:
+        return generate_knowledge_base(df, api_key, backend=backend), report
+
+    # Total de solicitudes: map + etapas de reduce + la final
+    total, pending = len(chunks), len(chunks)
+    while pending > fan_in:
+        pending = -(-pending // fan_in)
+        total += pending
+    total += 1
+    done = 0
+
+    def advance():
+        nonlocal done
+        done += 1
+        if progress_callback:
+            progress_callback(done, total)
+
+    partials = _generate_all(
+        backend,
+        [
+            MAP_PROMPT.format(count=count, conversations=text, sections=KB_SECTIONS)
+            for count, text in chunks
+        ],
+        "knowledge_base_map",
+        max_workers,
+        advance
+    )
+    report["failed_chunks"] = sum(1 for partial in partials if not partial)
+    partials = [partial for partial in partials if partial]
+
+    while len(partials) > fan_in:
+        groups = [partials[k:k + fan_in] for k in range(0, len(partials), fan_in)]
+        reduced = _generate_all(
+            backend,
+            [
+                REDUCE_PROMPT.format(
+                    count=len(group),
+                    partials="\n\n".join(f"=== EXTRACTO {i + 1} ===\n{p}" for i, p in enumerate(group))
+                )
+                for group in groups
+            ],
+            "knowledge_base_reduce",
+            max_workers,
+            advance
+        )
+        report["failed_groups"] += sum(1 for text in reduced if not text)
+        # Un grupo fallido conserva sus extractos sin consolidar
+        stage = [
+            text for group, text in zip(groups, reduced)
+            for text in ([text] if text else group)
+        ]
+        if len(stage) >= len(partials):
+            # Sin avance (los grupos que fallan volverían a fallar): se pasa a la final
+            partials = stage
+            break
+        partials = stage
+
+    if not partials:
+        return "Error generando KB: ningún bloque de conversaciones pudo procesarse", report
+
+    prompt = FINAL_PROMPT.format(
+        rows=len(df),
+        partials="\n\n".join(f"=== EXTRACTO {i + 1} ===\n{p}" for i, p in enumerate(partials))
+    )
     try:
-        response = model.generate_content(prompt)
-        time.sleep(1)
-        return response.text.strip()
+        text = generate_text(backend, prompt, stage="knowledge_base")
+        return text.strip(), report
     except Exception as e:
-        return f"Error generando KB: {str(e)}"
+        return f"Error generando KB: {str(e)}", report
+    finally:
+        advance()
 
 
-def extract_product_info(df: pd.DataFrame, api_key: str) -> dict:
+def extract_product_info(df: pd.DataFrame, api_key: str, backend=None, topic_index=None) -> dict:
     """
     Extrae información específica de productos.
 
     Args:
         df: DataFrame con los análisis
         api_key: API Key de Gemini
+        backend: LLMBackend a usar (default: según create_backend)
+        topic_index: TopicIndex ya construido (default: uno en memoria sobre df)
 
     Returns:
         Diccionario con información de productos
     """
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    backend = backend or create_backend(api_key, MODEL_NAME)
 
-    # Recopilar topics relacionados con productos
+    # Temas relacionados con productos, del más al menos frecuente
     product_keywords = ['precio', 'modelo', 'característica', 'motor', 'color', 'versión']
-
-    key_topics = []
-    if "key_topics" in df.columns:
-        for topics in df["key_topics"].dropna():
-            if topics:
-                for topic in str(topics).split(","):
-                    topic = topic.strip().lower()
-                    if any(kw in topic for kw in product_keywords):
-                        key_topics.append(topic)
+    product_topics = (topic_index if topic_index is not None else TopicIndex.from_results(df)).matching(product_keywords)
 
     prompt = f"""Extrae información de productos mencionados en estas conversaciones:
 
 TEMAS DETECTADOS:
-{chr(10).join(set(key_topics[:30])) if key_topics else "No disponibles"}
+{chr(10).join(product_topics["topic"].head(30)) if len(product_topics) else "No disponibles"}
 
 Devuelve un resumen estructurado de:
 1. Modelos mencionados
@@ -137,11 +349,10 @@ Formato: texto organizado por categorías.
 """
 
     try:
-        response = model.generate_content(prompt)
-        time.sleep(1)
+        text = generate_text(backend, prompt, stage="product_info")
         return {
-            "raw_info": response.text.strip(),
-            "topics_found": len(set(key_topics))
+            "raw_info": text.strip(),
+            "topics_found": len(product_topics)
         }
     except Exception as e:
         return {
@@ -0,0 +1,106 @@
+"""
+Módulo de Llamadas al Modelo
+Punto único de acceso al modelo: caché persistente, control de cuota, reintentos y métricas
+"""
+import time
+
+from modules.llm_cache import get_default_cache
+from modules.metrics import get_collector
+from modules.rate_limiter import estimate_tokens, get_rate_limiter
+from modules.retry import call_with_retry, error_type
+
+
+def generate_text(
+    backend,
+    prompt: str,
+    generation_config: dict = None,
+    use_cache: bool = True,
+    retry_budget=None,
+    stage: str = "default",
+    cache_result: bool = True
+) -> str:
+    """
+    Genera texto con el modelo, usando la caché y la cuota compartidas.
+
+    Args:
+        backend: LLMBackend a usar (su model_name es clave de caché y de cuota)
+        prompt: Prompt a enviar
+        generation_config: Configuración de generación opcional
+        use_cache: Consultar y poblar la caché persistente
+        retry_budget: RetryBudget de la ejecución (opcional)
+        stage: Etapa del pipeline para las métricas (ej. "analysis")
+        cache_result: Guardar la respuesta nueva en la caché. Con False el
+            llamador la guarda con cache_response una vez que la validó
+            (y descarta con discard_cached una respuesta en caché inválida)
+
+    Returns:
+        Texto de la respuesta
+
+    Raises:
+        La excepción del modelo si es permanente o se agotan los reintentos
+    """
+    model_name = backend.model_name
+    cache = get_default_cache() if use_cache else None
+    metrics = get_collector()
+    start = time.perf_counter()
+
+    if cache is not None:
+        cached = cache.get(model_name, prompt, generation_config)
+        if cached is not None:
+            metrics.record_call(
+                stage=stage, model=model_name, prompt_chars=len(prompt),
+                latency=time.perf_counter() - start, wait=0.0, retries=0,
+                cache_hit=True, success=True
+            )
+            return cached
+
+    limiter = get_rate_limiter(model_name)
+    tokens = estimate_tokens(prompt)
+    usage = {"attempts": 0, "wait": 0.0, "response": None}
+
+    def attempt():
+        # Cada intento es una solicitud y consume cuota
+        usage["attempts"] += 1
+        usage["wait"] += limiter.acquire(tokens)
+        response = backend.generate(prompt, generation_config)
+        limiter.record_usage(tokens, response.total_tokens)
+        usage["response"] = response
+        return response
+
+    try:
+        text = call_with_retry(attempt, budget=retry_budget).text
+    except Exception as e:
+        metrics.record_call(
+            stage=stage, model=model_name, prompt_chars=len(prompt),
+            prompt_tokens=tokens, latency=time.perf_counter() - start,
+            wait=usage["wait"], retries=max(0, usage["attempts"] - 1),
+            cache_hit=False, success=False, error_type=error_type(e)
+        )
+        raise
+
+    response = usage["response"]
+    metrics.record_call(
+        stage=stage, model=model_name, prompt_chars=len(prompt),
+        prompt_tokens=response.prompt_tokens or tokens, output_tokens=response.output_tokens,
+        latency=time.perf_counter() - start, wait=usage["wait"],
+        retries=usage["attempts"] - 1, cache_hit=False, success=True
+    )
+
+    if cache is not None and cache_result:
+        cache.set(model_name, prompt, text, generation_config)
+
+    return text
+
+
+def cache_response(backend, prompt: str, text: str, generation_config: dict = None) -> None:
+    """Guarda en la caché una respuesta ya validada (ver cache_result en generate_text)."""
+    cache = get_default_cache()
+    if cache is not None:
+        cache.set(backend.model_name, prompt, text, generation_config)
+
+
+def discard_cached(backend, prompt: str, generation_config: dict = None) -> None:
+    """Elimina de la caché la respuesta de un prompt (ej. una que no se pudo validar)."""
+    cache = get_default_cache()
+    if cache is not None:
+        cache.delete(backend.model_name, prompt, generation_config)
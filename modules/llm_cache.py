@@ -0,0 +1,228 @@
+"""
+Módulo de Caché de Respuestas
+Caché persistente en SQLite para respuestas del modelo, direccionada por contenido
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+DEFAULT_CACHE_PATH = ".cache/llm_cache.sqlite"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+# Cada cuántas escrituras se revisa la expulsión
+EVICT_EVERY = 200
+
+
+class LLMCache:
+    """Caché en disco de respuestas de generate_content."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS
+    ):
+        """
+        Inicializa la caché.
+
+        Args:
+            path: Ruta del archivo SQLite
+            max_bytes: Tamaño máximo de las respuestas almacenadas
+            max_age_days: Antigüedad máxima de una entrada
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, config: dict = None) -> str:
+        """Hash SHA-256 de modelo + prompt + configuración de generación."""
+        payload = json.dumps(
+            [model, prompt, config or {}],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str, config: dict = None) -> Optional[str]:
+        """
+        Busca una respuesta en la caché.
+
+        Args:
+            model: Nombre del modelo
+            prompt: Prompt enviado
+            config: Configuración de generación
+
+        Returns:
+            Texto de la respuesta o None si no existe o expiró
+        """
+        key = self.make_key(model, prompt, config)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, model: str, prompt: str, value: str, config: dict = None) -> None:
+        """
+        Guarda una respuesta en la caché.
+
+        Args:
+            model: Nombre del modelo
+            prompt: Prompt enviado
+            value: Texto de la respuesta
+            config: Configuración de generación
+        """
+        key = self.make_key(model, prompt, config)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def delete(self, model: str, prompt: str, config: dict = None) -> None:
+        """
+        Elimina una respuesta de la caché.
+
+        Args:
+            model: Nombre del modelo
+            prompt: Prompt enviado
+            config: Configuración de generación
+        """
+        key = self.make_key(model, prompt, config)
+
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """
+        Elimina entradas expiradas y las menos usadas si se excede el tamaño.
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        cursor = self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?",
+            (time.time() - self.max_age,)
+        )
+        removed = cursor.rowcount
+
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        excess = total - self.max_bytes
+
+        if excess > 0:
+            victims = []
+            for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at"
+            ):
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            removed += len(victims)
+
+        self._conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        """Vacía la caché y reinicia los contadores."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Devuelve aciertos, fallos, entradas y tamaño de la caché."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[LLMCache]:
+    """
+    Obtiene la caché compartida del proceso.
+
+    Se configura con LLM_CACHE_PATH; LLM_CACHE_DISABLED=1 la desactiva.
+
+    Returns:
+        Caché compartida o None si está desactivada
+    """
+    global _default_cache
+
+    if os.environ.get("LLM_CACHE_DISABLED") == "1":
+        return None
+
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(
+                os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+            )
+        return _default_cache
@@ -0,0 +1,265 @@
+"""
+Módulo de Métricas
+Registro por llamada al modelo y agregados por ejecución y etapa
+"""
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+
+
+# Registros por llamada que se conservan para la exportación JSONL
+MAX_RECORDS = 10_000
+
+# Ejecuciones con agregados en memoria (se descartan las más antiguas)
+MAX_RUNS = 50
+
+# Latencias recientes por (ejecución, etapa) para los percentiles
+LATENCY_WINDOW = 2_000
+
+# Ejecución en curso: propia de cada hilo de Streamlit o proceso de la CLI
+_current_run = contextvars.ContextVar("metrics_run", default=None)
+
+
+class CallRecord:
+    """Métricas de una llamada a generate_text."""
+
+    __slots__ = (
+        "timestamp", "run", "stage", "model", "prompt_chars", "prompt_tokens",
+        "output_tokens", "latency", "wait", "retries", "cache_hit", "success", "error_type"
+    )
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field))
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class StageStats:
+    """Agregados de una (ejecución, etapa), con memoria acotada."""
+
+    __slots__ = (
+        "calls", "cache_hits", "errors", "retries", "parse_failures", "prompt_chars",
+        "prompt_tokens", "output_tokens", "wait", "latencies"
+    )
+
+    def __init__(self):
+        self.calls = self.cache_hits = self.errors = self.retries = self.parse_failures = 0
+        self.prompt_chars = self.prompt_tokens = self.output_tokens = 0
+        self.wait = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, record: CallRecord) -> None:
+        self.calls += 1
+        self.cache_hits += bool(record.cache_hit)
+        self.errors += not record.success
+        self.retries += record.retries or 0
+        self.prompt_chars += record.prompt_chars or 0
+        self.prompt_tokens += record.prompt_tokens or 0
+        self.output_tokens += record.output_tokens or 0
+        self.wait += record.wait or 0
+        # La latencia de aciertos de caché no representa al modelo
+        if not record.cache_hit and record.success:
+            self.latencies.append(record.latency)
+
+
+def run_in_context(executor, fn, *args, **kwargs):
+    """
+    executor.submit conservando la ejecución de métricas del hilo que llama.
+
+    Los hilos de un pool no heredan el contexto, así que sin esto sus
+    llamadas quedarían fuera de la ejecución en curso.
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class MetricsCollector:
+    """
+    Acumula agregados por ejecución y etapa y los últimos registros por llamada.
+
+    La memoria es acotada: se conservan MAX_RECORDS registros y los agregados
+    de las últimas MAX_RUNS ejecuciones.
+    """
+
+    def __init__(self):
+        self.records = deque(maxlen=MAX_RECORDS)
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+        # Ejecución de las llamadas hechas fuera de start_run
+        self.run_id = self._new_run_id("")
+
+    @staticmethod
+    def _new_run_id(name: str) -> str:
+        return f"{name or 'run'}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    def start_run(self, name: str = "") -> str:
+        """
+        Inicia una nueva ejecución en el contexto actual.
+
+        Los registros siguientes del mismo hilo (y de los pools lanzados con
+        run_in_context) se agrupan bajo ella; otras sesiones no se ven
+        afectadas.
+
+        Args:
+            name: Prefijo descriptivo (ej. "analisis")
+
+        Returns:
+            Identificador de la ejecución
+        """
+        run_id = self._new_run_id(name)
+        _current_run.set(run_id)
+        return run_id
+
+    def current_run(self) -> str:
+        """Ejecución a la que se asignan los registros del contexto actual."""
+        return _current_run.get() or self.run_id
+
+    def _stats(self, run: str, stage: str) -> StageStats:
+        # Llamar con el lock tomado
+        stages = self._runs.get(run)
+        if stages is None:
+            stages = self._runs[run] = {}
+            while len(self._runs) > MAX_RUNS:
+                self._runs.popitem(last=False)
+        stats = stages.get(stage)
+        if stats is None:
+            stats = stages[stage] = StageStats()
+        return stats
+
+    def record_call(self, **values) -> None:
+        """Registra una llamada (ver CallRecord para los campos)."""
+        record = CallRecord(timestamp=time.time(), run=self.current_run(), **values)
+        with self._lock:
+            self.records.append(record)
+            self._stats(record.run, record.stage).add(record)
+
+    def record_parse_failure(self, stage: str, count: int = 1) -> None:
+        """Registra respuestas que no se pudieron parsear como JSON válido."""
+        run = self.current_run()
+        with self._lock:
+            self._stats(run, stage).parse_failures += count
+
+    def reset(self, runs=None) -> None:
+        """
+        Descarta registros y agregados.
+
+        Args:
+            runs: Ejecuciones a descartar (default: todas)
+        """
+        with self._lock:
+            if runs is None:
+                self.records.clear()
+                self._runs.clear()
+                return
+            wanted = set(runs)
+            kept = [record for record in self.records if record.run not in wanted]
+            self.records = deque(kept, maxlen=MAX_RECORDS)
+            for run in wanted:
+                self._runs.pop(run, None)
+
+    def summary(self, runs=None) -> list:
+        """
+        Agregados por ejecución y etapa.
+
+        Args:
+            runs: Ejecuciones a incluir (default: todas las conservadas)
+
+        Returns:
+            Lista de diccionarios, uno por (run, stage)
+        """
+        wanted = set(runs) if runs is not None else None
+        rows = []
+
+        with self._lock:
+            for run, stages in self._runs.items():
+                if wanted is not None and run not in wanted:
+                    continue
+                for stage, stats in stages.items():
+                    latencies = list(stats.latencies)
+                    rows.append({
+                        "run": run,
+                        "stage": stage,
+                        "calls": stats.calls,
+                        "cache_hits": stats.cache_hits,
+                        "errors": stats.errors,
+                        "retries": stats.retries,
+                        "parse_failures": stats.parse_failures,
+                        "prompt_chars": stats.prompt_chars,
+                        "prompt_tokens": stats.prompt_tokens,
+                        "output_tokens": stats.output_tokens,
+                        "wait_seconds": round(stats.wait, 3),
+                        "latency_p50": round(_percentile(latencies, 50), 3),
+                        "latency_p95": round(_percentile(latencies, 95), 3),
+                        "latency_p99": round(_percentile(latencies, 99), 3)
+                    })
+        return rows
+
+    def to_prometheus(self, runs=None) -> str:
+        """Exporta los agregados (de `runs`, o todos) en formato de texto de Prometheus."""
+        counters = [
+            ("llm_calls_total", "calls", "Llamadas a generate_text"),
+            ("llm_cache_hits_total", "cache_hits", "Respuestas servidas desde la caché"),
+            ("llm_errors_total", "errors", "Llamadas fallidas tras reintentos"),
+            ("llm_retries_total", "retries", "Reintentos por errores transitorios"),
+            ("llm_parse_failures_total", "parse_failures", "Respuestas con JSON inválido"),
+            ("llm_prompt_tokens_total", "prompt_tokens", "Tokens de entrada"),
+            ("llm_output_tokens_total", "output_tokens", "Tokens de salida"),
+            ("llm_rate_limit_wait_seconds_total", "wait_seconds", "Segundos esperando cuota")
+        ]
+        summary = self.summary(runs)
+        lines = []
+
+        for metric, field, help_text in counters:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for row in summary:
+                lines.append(f'{metric}{{run="{row["run"]}",stage="{row["stage"]}"}} {row[field]}')
+
+        lines.append("# HELP llm_latency_seconds Latencia de llamadas al modelo")
+        lines.append("# TYPE llm_latency_seconds summary")
+        for row in summary:
+            for quantile in ("50", "95", "99"):
+                lines.append(
+                    f'llm_latency_seconds{{run="{row["run"]}",stage="{row["stage"]}",'
+                    f'quantile="0.{quantile}"}} {row["latency_p" + quantile]}'
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self, runs=None) -> str:
+        """Un registro JSON por llamada (los últimos MAX_RECORDS, de `runs` o todos)."""
+        wanted = set(runs) if runs is not None else None
+        with self._lock:
+            records = [r for r in self.records if wanted is None or r.run in wanted]
+        return "".join(json.dumps(r.to_dict(), ensure_ascii=False) + "\n" for r in records)
+
+    def export(self, path: str) -> None:
+        """
+        Escribe las métricas a disco según la extensión.
+
+        Args:
+            path: .prom/.txt para Prometheus, .jsonl para registros por llamada
+        """
+        content = self.to_jsonl() if path.endswith(".jsonl") else self.to_prometheus()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(content, encoding="utf-8")
+
+
+_collector = MetricsCollector()
+
+
+def get_collector() -> MetricsCollector:
+    """Colector compartido del proceso."""
+    return _collector
@@ -0,0 +1,159 @@
+"""
+Módulo de Control de Cuota
+Limitador token-bucket compartido por todos los módulos que llaman a Gemini
+"""
+import os
+import threading
+import time
+
+
+# Cuotas por modelo: (solicitudes por minuto, tokens por minuto)
+MODEL_LIMITS = {
+    "gemini-2.0-flash": (2000, 4_000_000),
+    "gemini-2.0-flash-lite": (4000, 4_000_000),
+    "gemini-1.5-flash": (2000, 4_000_000),
+    "gemini-1.5-pro": (1000, 4_000_000),
+    # Backend local de benchmarks: sin cuota efectiva
+    "stub": (1_000_000, 1_000_000_000),
+}
+
+DEFAULT_LIMITS = (1000, 1_000_000)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estima los tokens de un texto (~4 caracteres por token)."""
+    return len(text) // 4 + 1 if text else 0
+
+
+class _Bucket:
+    """Cubeta que se rellena de forma continua hasta su capacidad."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+
+    def refill(self, elapsed: float):
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` disponible."""
+        missing = amount - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class RateLimiter:
+    """Limitador de solicitudes y tokens por minuto para un modelo."""
+
+    def __init__(self, rpm: int, tpm: int):
+        """
+        Inicializa el limitador.
+
+        Args:
+            rpm: Solicitudes por minuto permitidas
+            tpm: Tokens por minuto permitidos
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        self._requests.refill(elapsed)
+        self._tokens.refill(elapsed)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Bloquea hasta que haya cuota para una solicitud de `tokens` tokens.
+
+        Args:
+            tokens: Tokens estimados de la solicitud
+
+        Returns:
+            Segundos esperados
+        """
+        tokens = min(float(tokens), self._tokens.capacity)
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                self._refill()
+                wait = max(
+                    self._requests.wait_time(1),
+                    self._tokens.wait_time(tokens)
+                )
+                if wait <= 0:
+                    self._requests.level -= 1
+                    self._tokens.level -= tokens
+                    return waited
+
+            time.sleep(wait)
+            waited += wait
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """
+        Ajusta la cubeta de tokens con el consumo real de la respuesta.
+
+        Args:
+            estimated: Tokens descontados en acquire()
+            actual: Tokens reportados por el backend (0 = desconocido)
+        """
+        if not actual:
+            return
+
+        with self._lock:
+            self._refill()
+            # Puede quedar negativo: las siguientes solicitudes esperan la deuda
+            self._tokens.level -= actual - estimated
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _configured_limits(model: str) -> tuple:
+    rpm, tpm = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+    rpm = int(os.environ.get("GEMINI_RPM", rpm))
+    tpm = int(os.environ.get("GEMINI_TPM", tpm))
+    return rpm, tpm
+
+
+def configure_limits(model: str, rpm: int, tpm: int) -> RateLimiter:
+    """
+    Define la cuota de un modelo y reemplaza su limitador.
+
+    Los analizadores creados después de la llamada usan la nueva cuota.
+
+    Args:
+        model: Nombre del modelo
+        rpm: Solicitudes por minuto
+        tpm: Tokens por minuto
+
+    Returns:
+        Nuevo limitador del modelo
+    """
+    with _limiters_lock:
+        MODEL_LIMITS[model] = (rpm, tpm)
+        _limiters[model] = RateLimiter(rpm, tpm)
+        return _limiters[model]
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """
+    Obtiene el limitador compartido del proceso para un modelo.
+
+    Args:
+        model: Nombre del modelo
+
+    Returns:
+        Limitador del modelo
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(*_configured_limits(model))
+        return _limiters[model]
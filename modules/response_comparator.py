@@ -2,11 +2,31 @@
 Módulo Comparador de Respuestas
 Compara respuestas de asesores vs respuestas generadas por IA
 """
-import google.generativeai as genai
-import json
-import re
-import time
-import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from modules.backends import create_backend
+from modules.compaction import BOT_HISTORY_TOKENS, compact_history
+from modules.conversation import ParsedConversation, get_parsed, parse_conversation
+from modules.interests import get_default_detector
+from modules.llm import generate_text
+from modules.metrics import run_in_context
+from modules.retry import RetryBudget, error_type
+from modules.sampling import (
+    DEFAULT_BATCH_SIZE, DEFAULT_CONFIDENCE, DEFAULT_MIN_SAMPLES, DEFAULT_SCORE_MARGIN,
+    DEFAULT_WIN_MARGIN, comparison_estimate, sequential_looks, should_stop
+)
+from modules.structured import generate_validated
+
+
+# Esquema de la evaluación (ver modules.structured)
+EVALUATION_FIELDS = {
+    "advisor_score": {"type": "integer", "minimum": 1, "maximum": 5},
+    "ai_score": {"type": "integer", "minimum": 1, "maximum": 5},
+    "advisor_justification": {"type": "string"},
+    "ai_justification": {"type": "string"},
+    "winner": {"type": "string", "enum": ["asesor", "ia", "empate"]},
+    "decisive_criterion": {"type": "string"}
+}
 
 
 class ResponseComparator:
@@ -17,7 +37,11 @@ class ResponseComparator:
         api_key: str,
         sales_script: str = "",
         knowledge_base: str = "",
-        model: str = "gemini-2.0-flash"
+        model: str = "gemini-2.0-flash",
+        max_retries: int = 200,
+        backend=None,
+        bot_tokens: int = BOT_HISTORY_TOKENS,
+        interest_detector=None
     ):
         """
         Inicializa el comparador.
@@ -27,94 +51,70 @@ class ResponseComparator:
             sales_script: Script de ventas a usar
             knowledge_base: Base de conocimiento
             model: Modelo a usar
+            max_retries: Reintentos de errores transitorios permitidos en
+                toda la vida del comparador (una ejecución)
+            backend: LLMBackend a usar (default: según create_backend)
+            bot_tokens: Presupuesto de tokens del historial con el bot
+            interest_detector: InterestDetector con el catálogo de intereses
+                y modelos (default: catálogo por defecto)
         """
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
+        self.backend = backend or create_backend(api_key, model)
         self.sales_script = sales_script
         self.knowledge_base = knowledge_base
+        self.retry_budget = RetryBudget(max_retries)
+        self.bot_tokens = bot_tokens
+        self.interest_detector = interest_detector or get_default_detector()
+
+    def _generate(self, prompt: str, stage: str) -> str:
+        """Llama al modelo a través de la caché, la cuota y los reintentos."""
+        return generate_text(
+            self.backend,
+            prompt,
+            retry_budget=self.retry_budget,
+            stage=stage
+        )
 
-    def _safe_str(self, val, max_len: int = 2000) -> str:
-        """Convierte valor a string de forma segura."""
-        if pd.isna(val) or val is None:
-            return ""
-        s = str(val)
-        return s[:max_len] if len(s) > max_len else s
-
-    def _extract_first_advisor_response(self, historial_asesor: str) -> str:
-        """Extrae la primera respuesta del asesor."""
-        if not historial_asesor or pd.isna(historial_asesor):
-            return ""
-
-        historial = str(historial_asesor)
-        lines = historial.split('\n')
-
-        first_response_parts = []
-        found_user_message = False
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Detectar mensajes del asesor (USER)
-            if 'USER:' in line or line.startswith('[USER]'):
-                found_user_message = True
-                if 'USER:' in line:
-                    content = line.split('USER:', 1)[1].strip()
-                else:
-                    content = line.split('[USER]', 1)[1].strip()
-
-                if content:
-                    first_response_parts.append(content)
-
-            # Si encontramos mensaje del cliente después del asesor, paramos
-            elif found_user_message and ('CLIENT:' in line or '[CLIENT]' in line):
-                break
-
-        result = '\n'.join(first_response_parts)
-        return result[:1500] if result else historial[:500]
-
-    def _detect_client_interest(self, historial_bot: str) -> dict:
-        """Detecta el interés del cliente desde el bot."""
-        if not historial_bot or pd.isna(historial_bot):
-            return {'financiamiento': False, 'test_drive': False, 'resumen': 'Sin info'}
-
-        texto = str(historial_bot).lower()
-
-        result = {
-            'financiamiento': any(kw in texto for kw in ['financiamiento', 'financiar', 'crédito', 'cuotas']),
-            'test_drive': any(kw in texto for kw in ['prueba de manejo', 'test drive', 'cita', 'visitar']),
-            'contado': any(kw in texto for kw in ['contado', 'efectivo']),
-            'modelo': None
+    def _error_evaluation(self, exc: Exception) -> dict:
+        """Evaluación de una fila fallida (no cuenta en los promedios)."""
+        return {
+            "advisor_score": 0,
+            "ai_score": 0,
+            "advisor_justification": f"Error: {str(exc)}",
+            "ai_justification": f"Error: {str(exc)}",
+            "winner": "error",
+            "decisive_criterion": "Error",
+            "error": str(exc),
+            "error_type": error_type(exc)
         }
 
-        # Detectar modelo
-        modelos = ['x50', 'dashing', 't1', 't2', 's06']
-        for modelo in modelos:
-            if modelo in texto:
-                result['modelo'] = modelo.upper()
-                break
-
-        intereses = []
-        if result['financiamiento']:
-            intereses.append('FINANCIAMIENTO')
-        if result['test_drive']:
-            intereses.append('TEST DRIVE')
-        if result['contado']:
-            intereses.append('CONTADO')
-        if result['modelo']:
-            intereses.append(f"Modelo: {result['modelo']}")
+    def _extract_first_advisor_response(self, historial_asesor) -> str:
+        """Extrae la primera respuesta del asesor (texto o ParsedConversation)."""
+        parsed = historial_asesor if isinstance(historial_asesor, ParsedConversation) \
+            else parse_conversation(historial_asesor)
+        if not parsed.text:
+            return ""
 
-        result['resumen'] = ', '.join(intereses) if intereses else 'Sin interés específico'
+        # Mensajes del asesor (USER) hasta la primera respuesta del cliente
+        result = '\n'.join(parsed.first_reply("USER", stop_role="CLIENT"))
+        return result[:1500] if result else parsed.text[:500]
 
-        return result
+    def _detect_client_interest(self, historial_bot) -> dict:
+        """Detecta el interés del cliente desde el bot (texto o ParsedConversation)."""
+        if isinstance(historial_bot, ParsedConversation):
+            historial_bot = historial_bot.text
+        return self.interest_detector.detect(historial_bot)
 
     def _generate_ai_response(self, historial_bot: str, intereses: dict) -> str:
-        """Genera una respuesta de IA basada en el contexto."""
+        """
+        Genera una respuesta de IA basada en el contexto.
+
+        Los errores se propagan para que la fila quede marcada como fallida
+        en lugar de evaluar un mensaje de error.
+        """
         prompt = f"""Eres un asesor de ventas experto de un concesionario automotriz.
 
 CONTEXTO DE LA CONVERSACIÓN CON EL BOT:
-{self._safe_str(historial_bot, 2000) or "Sin historial previo"}
+{historial_bot or "Sin historial previo"}
 
 INTERESES DETECTADOS DEL CLIENTE:
 {intereses['resumen']}
@@ -137,12 +137,7 @@ INSTRUCCIONES:
 Responde SOLO con el texto de la respuesta.
 """
 
-        try:
-            response = self.model.generate_content(prompt)
-            time.sleep(0.5)
-            return response.text.strip()
-        except Exception as e:
-            return f"Error: {str(e)}"
+        return self._generate(prompt, "comparison_generation").strip()
 
     def _evaluate_responses(
         self,
@@ -155,7 +150,7 @@ Responde SOLO con el texto de la respuesta.
         prompt = f"""Eres un evaluador de calidad de servicio al cliente.
 
 CONTEXTO (conversación con bot):
-{self._safe_str(historial_bot, 1000)}
+{compact_history(historial_bot, self.bot_tokens // 2, anchor_role=None)}
 
 INTERESES DEL CLIENTE:
 {intereses['resumen']}
@@ -186,31 +181,49 @@ Responde SOLO con JSON:
 """
 
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            time.sleep(0.5)
-
-            json_match = re.search(r'\{[\s\S]*\}', text)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {
-                    "advisor_score": 3,
-                    "ai_score": 3,
-                    "advisor_justification": "No evaluado",
-                    "ai_justification": "No evaluado",
-                    "winner": "empate",
-                    "decisive_criterion": "N/A"
-                }
+            return generate_validated(
+                self.backend,
+                prompt,
+                EVALUATION_FIELDS,
+                stage="comparison_evaluation",
+                retry_budget=self.retry_budget
+            )
         except Exception as e:
-            return {
-                "advisor_score": 0,
-                "ai_score": 0,
-                "advisor_justification": f"Error: {str(e)}",
-                "ai_justification": f"Error: {str(e)}",
-                "winner": "error",
-                "decisive_criterion": "Error"
-            }
+            # Incluye SchemaError: una evaluación inválida queda como error, no como empate
+            return self._error_evaluation(e)
+
+    def _prepare(self, conversation_data: dict) -> dict:
+        """Extrae la respuesta del asesor y los intereses (sin llamar al modelo)."""
+        parsed_bot = get_parsed(conversation_data, "historial_de_mensajes_en_bot")
+        parsed_asesor = get_parsed(conversation_data, "historial_de_mensajes_en_asesor")
+        historial_bot = compact_history(parsed_bot, self.bot_tokens, anchor_role=None)
+
+        return {
+            "conversation_id": conversation_data.get("conversation_id", ""),
+            "historial_bot": historial_bot,
+            # Extraer primera respuesta del asesor
+            "advisor_response": self._extract_first_advisor_response(parsed_asesor),
+            # Detectar intereses
+            "intereses": self._detect_client_interest(parsed_bot)
+        }
+
+    def _build_result(self, context: dict, ai_response: str, evaluation: dict) -> dict:
+        """Arma la fila de resultado de una comparación."""
+        return {
+            "conversation_id": context["conversation_id"],
+            "client_interests": context["intereses"]['resumen'],
+            "advisor_response": context["advisor_response"][:500],
+            "ai_response": ai_response[:500],
+            "advisor_score": evaluation.get("advisor_score", 0),
+            "ai_score": evaluation.get("ai_score", 0),
+            "advisor_justification": evaluation.get("advisor_justification", ""),
+            "ai_justification": evaluation.get("ai_justification", ""),
+            "winner": evaluation.get("winner", ""),
+            "decisive_criterion": evaluation.get("decisive_criterion", ""),
+            "comparison_success": evaluation.get("winner") != "error",
+            "error": evaluation.get("error"),
+            "error_type": evaluation.get("error_type")
+        }
 
     def compare(self, conversation_data: dict) -> dict:
         """
@@ -222,39 +235,229 @@ Responde SOLO con JSON:
         Returns:
             Diccionario con la comparación
         """
-        historial_bot = self._safe_str(
-            conversation_data.get("historial_de_mensajes_en_bot", "")
-        )
-        historial_asesor = self._safe_str(
-            conversation_data.get("historial_de_mensajes_en_asesor", "")
-        )
-
-        # Extraer primera respuesta del asesor
-        advisor_response = self._extract_first_advisor_response(historial_asesor)
-
-        # Detectar intereses
-        intereses = self._detect_client_interest(historial_bot)
+        context = self._prepare(conversation_data)
 
         # Generar respuesta de IA
-        ai_response = self._generate_ai_response(historial_bot, intereses)
+        try:
+            ai_response = self._generate_ai_response(
+                context["historial_bot"],
+                context["intereses"]
+            )
+        except Exception as e:
+            return self._build_result(context, "", self._error_evaluation(e))
 
         # Evaluar ambas
         evaluation = self._evaluate_responses(
-            advisor_response,
+            context["advisor_response"],
             ai_response,
-            historial_bot,
-            intereses
+            context["historial_bot"],
+            context["intereses"]
         )
 
-        return {
-            "conversation_id": conversation_data.get("conversation_id", ""),
-            "client_interests": intereses['resumen'],
-            "advisor_response": advisor_response[:500],
-            "ai_response": ai_response[:500],
-            "advisor_score": evaluation.get("advisor_score", 0),
-            "ai_score": evaluation.get("ai_score", 0),
-            "advisor_justification": evaluation.get("advisor_justification", ""),
-            "ai_justification": evaluation.get("ai_justification", ""),
-            "winner": evaluation.get("winner", ""),
-            "decisive_criterion": evaluation.get("decisive_criterion", "")
-        }
+        return self._build_result(context, ai_response, evaluation)
+
+    def compare_batch(
+        self,
+        conversations: list,
+        progress_callback=None,
+        generation_workers: int = 4,
+        evaluation_workers: int = 4,
+        journal=None
+    ) -> list:
+        """
+        Compara un lote de conversaciones con las dos etapas en paralelo.
+
+        La generación de la respuesta IA y la evaluación corren en pools
+        separados: apenas termina la generación de una fila se encola su
+        evaluación, así que la evaluación de la fila i se solapa con la
+        generación de las siguientes. El progreso se reporta desde el hilo
+        que llama.
+
+        Args:
+            conversations: Lista de diccionarios con datos
+            progress_callback: Función para reportar progreso
+            generation_workers: Generaciones concurrentes
+            evaluation_workers: Evaluaciones concurrentes
+            journal: RunJournal opcional; las filas ya registradas se
+                reutilizan y cada comparación exitosa se agrega al terminar
+
+        Returns:
+            Lista de comparaciones en el mismo orden que la entrada
+        """
+        total = len(conversations)
+        results = [None] * total
+        completed = journal.take(
+            conv.get("conversation_id", "") for conv in conversations
+        ) if journal else {}
+
+        pending = []
+        for i, conv in enumerate(conversations):
+            previous = completed.get(str(conv.get("conversation_id", "")))
+            if previous is not None:
+                results[i] = previous
+            else:
+                pending.append(i)
+
+        done = total - len(pending)
+        if progress_callback and done:
+            progress_callback(done, total)
+
+        contexts = {}
+
+        def finish(i, ai_response, evaluation):
+            nonlocal done
+            result = self._build_result(contexts.pop(i), ai_response, evaluation)
+            results[i] = result
+
+            if journal and result["comparison_success"]:
+                journal.append(result)
+
+            done += 1
+            if progress_callback:
+                progress_callback(done, total)
+
+        with ThreadPoolExecutor(max_workers=max(1, generation_workers)) as generation_pool, \
+                ThreadPoolExecutor(max_workers=max(1, evaluation_workers)) as evaluation_pool:
+            in_flight = {}
+
+            for i in pending:
+                context = self._prepare(conversations[i])
+                contexts[i] = context
+                future = run_in_context(
+                    generation_pool,
+                    self._generate_ai_response,
+                    context["historial_bot"],
+                    context["intereses"]
+                )
+                in_flight[future] = ("generation", i)
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    stage, i = in_flight.pop(future)
+                    context = contexts[i]
+
+                    if stage == "evaluation":
+                        finish(i, context["ai_response"], future.result())
+                        continue
+
+                    try:
+                        context["ai_response"] = future.result()
+                    except Exception as e:
+                        # Sin respuesta IA no hay nada que evaluar
+                        finish(i, "", self._error_evaluation(e))
+                        continue
+
+                    evaluation = run_in_context(
+                        evaluation_pool,
+                        self._evaluate_responses,
+                        context["advisor_response"],
+                        context["ai_response"],
+                        context["historial_bot"],
+                        context["intereses"]
+                    )
+                    in_flight[evaluation] = ("evaluation", i)
+
+        return results
+
+    def compare_adaptive(
+        self,
+        conversations: list,
+        win_margin: float = DEFAULT_WIN_MARGIN,
+        score_margin: float = DEFAULT_SCORE_MARGIN,
+        confidence: float = DEFAULT_CONFIDENCE,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        progress_callback=None,
+        generation_workers: int = 4,
+        evaluation_workers: int = 4,
+        journal=None
+    ) -> tuple:
+        """
+        Compara por tandas hasta que el veredicto es estable.
+
+        Tras las primeras `min_samples` conversaciones y después de cada
+        tanda se calculan los intervalos de la tasa de victorias de la IA y
+        de la diferencia de puntaje (ver modules.sampling); la ejecución se
+        detiene cuando ambos son más angostos que los márgenes pedidos o
+        cuando se acaban las conversaciones.
+
+        Args:
+            conversations: Conversaciones en orden de muestreo (ver
+                stratified_order); su largo es el máximo a comparar
+            win_margin: Semiancho máximo del intervalo de la tasa de victorias
+            score_margin: Semiancho máximo del intervalo de la diferencia de puntaje
+            confidence: Nivel de confianza global (corregido por revisiones)
+            min_samples: Conversaciones antes de la primera revisión
+            batch_size: Conversaciones por tanda
+            progress_callback: Función (completadas, máximo)
+            generation_workers: Generaciones concurrentes
+            evaluation_workers: Evaluaciones concurrentes
+            journal: RunJournal opcional (ver compare_batch)
+
+        Returns:
+            (comparaciones de las primeras conversaciones, en orden;
+            estimación final de comparison_estimate con 'stopped_early')
+        """
+        total = len(conversations)
+        looks = sequential_looks(total, batch_size, min_samples)
+        results = []
+        estimate = comparison_estimate(results, confidence, looks)
+
+        while len(results) < total:
+            offset = len(results)
+            size = max(batch_size, min_samples - offset)
+            results += self.compare_batch(
+                conversations[offset:offset + size],
+                progress_callback=(
+                    (lambda done, _: progress_callback(offset + done, total)) if progress_callback else None
+                ),
+                generation_workers=generation_workers,
+                evaluation_workers=evaluation_workers,
+                journal=journal
+            )
+
+            estimate = comparison_estimate(results, confidence, looks)
+            if should_stop(estimate, win_margin, score_margin, min_samples):
+                break
+
+        estimate["stopped_early"] = len(results) < total
+        return results, estimate
+
+    def retry_failed(
+        self,
+        conversations: list,
+        results: list,
+        progress_callback=None,
+        generation_workers: int = 4,
+        evaluation_workers: int = 4,
+        journal=None
+    ) -> list:
+        """
+        Recompara solo las conversaciones que fallaron en un lote previo.
+
+        Args:
+            conversations: Lista original de diccionarios con datos
+            results: Resultados de compare_batch para esa lista
+            progress_callback: Función para reportar progreso
+            generation_workers: Generaciones concurrentes
+            evaluation_workers: Evaluaciones concurrentes
+            journal: RunJournal opcional
+
+        Returns:
+            Lista de comparaciones con las filas fallidas reemplazadas
+        """
+        failed = [i for i, result in enumerate(results) if not result.get("comparison_success")]
+        retried = self.compare_batch(
+            [conversations[i] for i in failed],
+            progress_callback=progress_callback,
+            generation_workers=generation_workers,
+            evaluation_workers=evaluation_workers,
+            journal=journal
+        )
+
+        merged = list(results)
+        for i, result in zip(failed, retried):
+            merged[i] = result
+        return merged
@@ -0,0 +1,490 @@
+"""
+Módulo de Almacén de Resultados
+Dataset Parquet particionado por empresa/grupo/fecha con los resultados de
+cada ejecución; los reportes leen solo las columnas y particiones que usan
+"""
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import unquote
+
+import pandas as pd
+
+
+DEFAULT_STORE_DIR = ".results"
+
+PARTITION_COLUMNS = ["company_name", "group_name", "date"]
+
+# Esquemas fijos por tipo de resultado: (columna, tipo)
+SCHEMAS = {
+    "analysis": [
+        ("conversation_id", "string"),
+        ("user_name", "string"),
+        ("agent_score_numeric", "int64"),
+        ("agent_score_text", "string"),
+        ("first_response_efficient", "bool"),
+        ("efficiency_notes", "string"),
+        ("client_intention", "string"),
+        ("use_case", "string"),
+        ("key_topics", "string"),
+        ("analysis_success", "bool"),
+        ("error", "string"),
+        ("error_type", "string"),
+        ("duplicate_of", "string"),
+        ("heuristic", "bool"),
+        ("reused", "bool"),
+        ("content_hash", "string"),
+        ("run_id", "string"),
+        ("stored_at", "float64")
+    ],
+    "comparison": [
+        ("conversation_id", "string"),
+        ("user_name", "string"),
+        ("client_interests", "string"),
+        ("advisor_response", "string"),
+        ("ai_response", "string"),
+        ("advisor_score", "int64"),
+        ("ai_score", "int64"),
+        ("advisor_justification", "string"),
+        ("ai_justification", "string"),
+        ("winner", "string"),
+        ("decisive_criterion", "string"),
+        ("comparison_success", "bool"),
+        ("error", "string"),
+        ("error_type", "string"),
+        ("run_id", "string"),
+        ("stored_at", "float64")
+    ]
+}
+
+MISSING_PARTITION = "N/A"
+
+# Filas que StoreWriter acumula antes de escribir
+STORE_BUFFER_ROWS = 50_000
+
+# Archivos por partición a partir de los cuales se compactan en uno
+COMPACT_MIN_FILES = 8
+
+# Archivo con la revisión de cada tipo (el prefijo "_" lo excluye del dataset)
+MANIFEST_NAME = "_manifest.json"
+
+# Columna de éxito por tipo (lookup solo reutiliza resultados exitosos)
+SUCCESS_COLUMNS = {"analysis": "analysis_success", "comparison": "comparison_success"}
+
+# Columnas del almacén que no forman parte del resultado en sí
+STORE_COLUMNS = ["run_id", "stored_at"] + PARTITION_COLUMNS
+
+
+def _arrow_schema(kind: str):
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "int64": pa.int64(), "bool": pa.bool_(), "float64": pa.float64()}
+    if kind not in SCHEMAS:
+        raise ValueError(f"Tipo de resultado desconocido: {kind} (usa {', '.join(SCHEMAS)})")
+    fields = [(name, types[dtype]) for name, dtype in SCHEMAS[kind]]
+    fields += [(name, pa.string()) for name in PARTITION_COLUMNS]
+    return pa.schema(fields)
+
+
+def _coerce(df: pd.DataFrame, kind: str) -> pd.DataFrame:
+    """Columnas del esquema con tipos estables (las faltantes quedan nulas)."""
+    frame = pd.DataFrame(index=df.index)
+    for name, dtype in SCHEMAS[kind]:
+        column = df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if dtype == "string":
+            frame[name] = column.where(column.isna(), column.astype(str)).astype(object)
+            frame[name] = frame[name].where(frame[name].notna(), None)
+        elif dtype == "int64":
+            frame[name] = pd.to_numeric(column, errors="coerce").fillna(0).astype("int64")
+        elif dtype == "bool":
+            frame[name] = column.fillna(False).astype(bool)
+        else:
+            frame[name] = pd.to_numeric(column, errors="coerce").astype("float64")
+
+    for name in PARTITION_COLUMNS[:2]:
+        values = df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        values = values.where(values.notna() & values.astype(str).str.strip().ne(""), MISSING_PARTITION)
+        frame[name] = values.astype(str)
+    return frame
+
+
+class ResultStore:
+    """
+    Dataset Parquet con particiones hive: {tipo}/company_name=/group_name=/date=/
+
+    Cada tipo guarda su revisión en {tipo}/_manifest.json, que cambia con
+    cada escritura; las particiones que acumulan COMPACT_MIN_FILES archivos
+    se unen en uno solo al escribir.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        """
+        Inicializa el almacén.
+
+        Args:
+            root: Directorio raíz del dataset
+        """
+        self.root = Path(root)
+
+    def _dataset(self, kind: str):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        schema = _arrow_schema(kind)
+        partition_schema = pa.schema([schema.field(name) for name in PARTITION_COLUMNS])
+        return ds.dataset(
+            str(self.root / kind),
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(partition_schema, flavor="hive")
+        )
+
+    def append(self, df: pd.DataFrame, kind: str, run_id: str = None, date: str = None) -> int:
+        """
+        Agrega resultados escribiendo de inmediato.
+
+        Escribe un archivo nuevo por partición (no reescribe los existentes,
+        aunque se repita el run_id); las columnas fuera del esquema se
+        descartan. Para una ejecución por bloques usar writer(), que junta
+        los bloques y escribe una sola vez.
+
+        Args:
+            df: Resultados (analyze_batch o compare_batch con las columnas
+                de contexto company_name, group_name y user_name)
+            kind: "analysis" o "comparison"
+            run_id: Identificador de la ejecución (default: uno nuevo)
+            date: Fecha de la partición YYYY-MM-DD (default: hoy)
+
+        Returns:
+            Filas escritas
+        """
+        if df is None or not len(df):
+            return 0
+
+        run_id = run_id or _new_run_id()
+        frame = self._frame(df, kind, run_id, date)
+        self._write(frame, kind, run_id)
+        return len(frame)
+
+    def writer(
+        self,
+        kind: str,
+        run_id: str = None,
+        date: str = None,
+        max_rows: int = STORE_BUFFER_ROWS,
+        on_write=None
+    ):
+        """
+        Escritor con buffer para una ejecución (ver StoreWriter).
+
+        Args:
+            kind: "analysis" o "comparison"
+            run_id: Identificador de la ejecución (default: uno nuevo)
+            date: Fecha de la partición YYYY-MM-DD (default: hoy)
+            max_rows: Filas acumuladas que fuerzan una escritura
+            on_write: Función llamada con cada DataFrame escrito (ej. para
+                actualizar el índice de temas una vez por escritura)
+
+        Returns:
+            StoreWriter
+        """
+        return StoreWriter(self, kind, run_id or _new_run_id(), date, max_rows, on_write)
+
+    def _frame(self, df: pd.DataFrame, kind: str, run_id: str, date: str = None) -> pd.DataFrame:
+        """Filas con el esquema fijo y las columnas de partición."""
+        frame = _coerce(df.assign(run_id=run_id, stored_at=time.time()), kind)
+        frame["date"] = date or time.strftime("%Y-%m-%d")
+        return frame
+
+    def _write(self, frame: pd.DataFrame, kind: str, run_id: str) -> None:
+        """Escribe un archivo por partición, compacta las que acumulan archivos y actualiza la revisión."""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        schema = _arrow_schema(kind)
+        table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+        directories = set()
+        partition_schema = pa.schema([schema.field(name) for name in PARTITION_COLUMNS])
+        ds.write_dataset(
+            table,
+            str(self.root / kind),
+            format="parquet",
+            partitioning=ds.partitioning(partition_schema, flavor="hive"),
+            basename_template=f"{run_id}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=lambda written: directories.add(os.path.dirname(written.path))
+        )
+
+        for directory in directories:
+            self._compact_partition(directory, kind)
+        self._bump_revision(kind)
+
+    def _compact_partition(self, directory: str, kind: str, min_files: int = COMPACT_MIN_FILES) -> bool:
+        """
+        Une los archivos de una partición en uno solo si son min_files o más.
+
+        El archivo nuevo se escribe antes de borrar los anteriores: una
+        caída en medio deja filas repetidas (read las descarta), nunca
+        filas perdidas.
+
+        Returns:
+            True si se compactó
+        """
+        files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith(".parquet")
+        )
+        if len(files) < min_files:
+            return False
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        # Los archivos no guardan las columnas de partición (van en la ruta);
+        # con el esquema del tipo, los escritos antes de agregar una columna
+        # la leen como nula
+        schema = _arrow_schema(kind)
+        file_schema = pa.schema([field for field in schema if field.name not in PARTITION_COLUMNS])
+        table = ds.dataset(files, schema=file_schema, format="parquet").to_table()
+
+        target = os.path.join(directory, f"compact-{uuid.uuid4().hex[:8]}.parquet")
+        staging = os.path.join(directory, f"_{os.path.basename(target)}")
+        pq.write_table(table, staging)
+        os.replace(staging, target)
+        for path in files:
+            os.remove(path)
+        return True
+
+    def compact(self, kind: str, min_files: int = 2) -> int:
+        """
+        Compacta todas las particiones de un tipo.
+
+        Args:
+            kind: "analysis" o "comparison"
+            min_files: Archivos mínimos para compactar una partición
+
+        Returns:
+            Particiones compactadas
+        """
+        compacted = 0
+        for dirpath, dirnames, _ in os.walk(self.root / kind):
+            if not dirnames:
+                compacted += self._compact_partition(dirpath, kind, min_files)
+        if compacted:
+            self._bump_revision(kind)
+        return compacted
+
+    def _bump_revision(self, kind: str) -> None:
+        """Registra una nueva revisión en el manifiesto del tipo (escritura atómica)."""
+        base = self.root / kind
+        base.mkdir(parents=True, exist_ok=True)
+        staging = base / f"_{uuid.uuid4().hex[:8]}.tmp"
+        staging.write_text(
+            json.dumps({"revision": uuid.uuid4().hex, "updated_at": time.time()}),
+            encoding="utf-8"
+        )
+        os.replace(staging, base / MANIFEST_NAME)
+
+    def read(
+        self,
+        kind: str,
+        columns: list = None,
+        companies: list = None,
+        groups: list = None,
+        date_from: str = None,
+        date_to: str = None,
+        latest: bool = True
+    ) -> pd.DataFrame:
+        """
+        Lee resultados con proyección de columnas y filtros por partición.
+
+        Args:
+            kind: "analysis" o "comparison"
+            columns: Columnas a leer (default: todas)
+            companies: Empresas a incluir (default: todas)
+            groups: Grupos a incluir (default: todos)
+            date_from: Fecha mínima YYYY-MM-DD (inclusive)
+            date_to: Fecha máxima YYYY-MM-DD (inclusive)
+            latest: Conservar solo el resultado más reciente por conversación
+
+        Returns:
+            DataFrame (vacío con las columnas pedidas si no hay datos)
+        """
+        schema = _arrow_schema(kind)
+        columns = list(columns) if columns else schema.names
+        if not (self.root / kind).exists():
+            return pd.DataFrame(columns=columns)
+
+        import pyarrow.dataset as ds
+
+        condition = None
+        for name, values in (("company_name", companies), ("group_name", groups)):
+            if values:
+                clause = ds.field(name).isin(list(values))
+                condition = clause if condition is None else condition & clause
+        if date_from:
+            clause = ds.field("date") >= date_from
+            condition = clause if condition is None else condition & clause
+        if date_to:
+            clause = ds.field("date") <= date_to
+            condition = clause if condition is None else condition & clause
+
+        needed = list(columns)
+        if latest:
+            needed += [name for name in ("conversation_id", "stored_at") if name not in needed]
+
+        frame = self._dataset(kind).to_table(columns=needed, filter=condition).to_pandas()
+
+        if latest and len(frame):
+            frame = (
+                frame.sort_values("stored_at", kind="stable")
+                .drop_duplicates("conversation_id", keep="last")
+                .sort_index()
+            )
+        return frame[columns].reset_index(drop=True)
+
+    def lookup(self, kind: str, hashes) -> dict:
+        """
+        Resultados exitosos previos por huella de contenido.
+
+        Args:
+            kind: Tipo de resultado con content_hash ("analysis")
+            hashes: Huellas a buscar
+
+        Returns:
+            {content_hash: resultado} con el resultado más reciente de cada
+            huella encontrada, sin las columnas propias del almacén. Solo
+            cuentan los análisis hechos por el modelo: las filas resueltas
+            por reglas (heuristic) o copiadas de un duplicado (duplicate_of)
+            no se reutilizan
+        """
+        schema = _arrow_schema(kind)
+        if "content_hash" not in schema.names:
+            raise ValueError(f"Los resultados de tipo {kind} no guardan content_hash")
+
+        hashes = list(set(hashes))
+        if not hashes or not (self.root / kind).exists():
+            return {}
+
+        import pyarrow.dataset as ds
+
+        # user_name es contexto de la fila, no parte del resultado
+        columns = [name for name in schema.names if name not in STORE_COLUMNS + ["user_name"]] + ["stored_at"]
+        condition = ds.field("content_hash").isin(hashes) & (ds.field(SUCCESS_COLUMNS[kind]) == True)
+        condition &= (ds.field("heuristic") == False) & ds.field("duplicate_of").is_null()
+
+        frame = self._dataset(kind).to_table(columns=columns, filter=condition).to_pandas()
+        if not len(frame):
+            return {}
+
+        frame = frame.sort_values("stored_at", kind="stable").drop_duplicates("content_hash", keep="last")
+        frame = frame.drop(columns=["stored_at"]).astype(object)
+        frame = frame.where(frame.notna(), None)
+        return {record["content_hash"]: record for record in frame.to_dict("records")}
+
+    def revision(self, kind: str) -> str:
+        """Revisión actual (cambia con cada escritura); solo lee el manifiesto."""
+        try:
+            manifest = json.loads((self.root / kind / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return ""
+        return manifest.get("revision", "")
+
+    def partitions(self, kind: str) -> dict:
+        """
+        Valores de partición disponibles (sin leer archivos Parquet).
+
+        Returns:
+            {"company_name": [...], "group_name": [...], "date": [...]}
+        """
+        values = {name: set() for name in PARTITION_COLUMNS}
+        base = self.root / kind
+        if not base.exists():
+            return {name: [] for name in PARTITION_COLUMNS}
+
+        for dirpath, dirnames, _ in os.walk(base):
+            for dirname in dirnames:
+                name, _, value = dirname.partition("=")
+                if name in values:
+                    values[name].add(unquote(value))
+        return {name: sorted(found) for name, found in values.items()}
+
+
+class StoreWriter:
+    """
+    Junta los resultados de una ejecución por bloques y los escribe juntos.
+
+    Escribe al cerrar (o al acumular max_rows filas), así una ejecución deja
+    un archivo por partición en lugar de uno por bloque. Como gestor de
+    contexto escribe lo acumulado también si la ejecución se interrumpe.
+    """
+
+    def __init__(
+        self,
+        store: ResultStore,
+        kind: str,
+        run_id: str,
+        date: str = None,
+        max_rows: int = STORE_BUFFER_ROWS,
+        on_write=None
+    ):
+        self.store = store
+        self.on_write = on_write
+        self.kind = kind
+        self.run_id = run_id
+        self.date = date
+        self.max_rows = max_rows
+        self.rows_written = 0
+        self._frames = []
+        self._buffered = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        Agrega resultados al buffer.
+
+        Args:
+            df: Resultados (mismo formato que ResultStore.append)
+        """
+        if df is None or not len(df):
+            return
+        self._frames.append(self.store._frame(df, self.kind, self.run_id, self.date))
+        self._buffered += len(df)
+        if self._buffered >= self.max_rows:
+            self.flush()
+
+    def flush(self) -> int:
+        """Escribe lo acumulado; devuelve las filas escritas."""
+        if not self._frames:
+            return 0
+        frame = pd.concat(self._frames, ignore_index=True)
+        self._frames, self._buffered = [], 0
+        self.store._write(frame, self.kind, self.run_id)
+        self.rows_written += len(frame)
+        if self.on_write:
+            self.on_write(frame)
+        return len(frame)
+
+    def close(self) -> int:
+        """Escribe lo pendiente; devuelve el total de filas escritas."""
+        self.flush()
+        return self.rows_written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def _new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def get_result_store() -> ResultStore:
+    """Almacén configurado (RESULTS_STORE_PATH o .results)."""
+    return ResultStore(os.environ.get("RESULTS_STORE_PATH", DEFAULT_STORE_DIR))
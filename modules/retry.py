@@ -0,0 +1,120 @@
+"""
+Módulo de Reintentos
+Clasifica errores del modelo y reintenta los transitorios con backoff exponencial
+"""
+import random
+import threading
+import time
+
+
+# Códigos HTTP transitorios: cuota, errores del servidor y timeouts
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+RETRYABLE_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "GatewayTimeout",
+    "BadGateway",
+    "Aborted"
+}
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    Indica si un error es transitorio (429, 5xx, timeouts, conexión).
+
+    Args:
+        exc: Excepción lanzada por la llamada al modelo
+
+    Returns:
+        True si vale la pena reintentar
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+
+    return type(exc).__name__ in RETRYABLE_NAMES
+
+
+def error_type(exc: Exception) -> str:
+    """Clasificación legible: 'transitorio' o 'permanente'."""
+    return "transitorio" if is_retryable(exc) else "permanente"
+
+
+class RetryBudget:
+    """Presupuesto de reintentos compartido por todas las llamadas de una ejecución."""
+
+    def __init__(self, max_retries: int):
+        """
+        Inicializa el presupuesto.
+
+        Args:
+            max_retries: Reintentos totales permitidos en la ejecución
+        """
+        self.max_retries = max_retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self) -> bool:
+        """Consume un reintento; False si el presupuesto se agotó."""
+        with self._lock:
+            if self.used >= self.max_retries:
+                return False
+            self.used += 1
+            return True
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.max_retries - self.used)
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BASE_DELAY, cap: float = DEFAULT_MAX_DELAY) -> float:
+    """Espera con jitter completo para el intento `attempt` (desde 0)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retry(
+    func,
+    budget: RetryBudget = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY
+):
+    """
+    Ejecuta `func` reintentando solo los errores transitorios.
+
+    Args:
+        func: Función sin argumentos a ejecutar
+        budget: Presupuesto de reintentos de la ejecución (opcional)
+        max_attempts: Intentos máximos por llamada
+        base_delay: Espera base en segundos
+        max_delay: Espera máxima en segundos
+
+    Returns:
+        Resultado de `func`
+
+    Raises:
+        La última excepción si es permanente, se agotan los intentos
+        o se agota el presupuesto
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            attempt += 1
+            if not is_retryable(e) or attempt >= max_attempts:
+                raise
+            if budget is not None and not budget.consume():
+                raise
+            time.sleep(backoff_delay(attempt - 1, base_delay, max_delay))
@@ -0,0 +1,148 @@
+"""
+Módulo de Muestreo Adaptativo
+Ordena las conversaciones como una muestra estratificada que se puede cortar
+en cualquier punto y decide cuándo el veredicto de la comparación ya es
+estable (intervalos de confianza revisados tras cada tanda)
+"""
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+
+# Estratos por defecto: grupo, asesor e interés principal detectado en el bot
+DEFAULT_STRATA = ["group_name", "user_name", "interest"]
+
+DEFAULT_CONFIDENCE = 0.95
+
+# Semiancho máximo de los intervalos para dar el veredicto por estable
+DEFAULT_WIN_MARGIN = 0.10
+DEFAULT_SCORE_MARGIN = 0.30
+
+# Conversaciones mínimas antes de revisar y tamaño de cada tanda
+DEFAULT_MIN_SAMPLES = 30
+DEFAULT_BATCH_SIZE = 20
+
+NO_INTEREST = "ninguno"
+
+# Aporte de cada veredicto a la tasa de victorias de la IA
+WIN_VALUES = {"ia": 1.0, "empate": 0.5, "asesor": 0.0}
+
+
+def primary_interest(interests: pd.DataFrame, categories: list) -> pd.Series:
+    """
+    Interés principal por fila: la primera categoría detectada en el orden dado.
+
+    Args:
+        interests: Salida de InterestDetector.detect_frame
+        categories: Categorías en orden de prioridad (ej. detector.keywords)
+
+    Returns:
+        Serie con la categoría o NO_INTEREST, con el mismo índice
+    """
+    result = pd.Series(NO_INTEREST, index=interests.index, dtype=object)
+    for category in reversed(list(categories)):
+        # En orden inverso: la de mayor prioridad sobrescribe al resto
+        result = result.mask(interests[category].astype(bool), category)
+    return result
+
+
+def stratified_order(df: pd.DataFrame, strata: list = None, seed: int = None) -> pd.DataFrame:
+    """
+    Ordena las filas para que cualquier prefijo sea una muestra estratificada.
+
+    Cada estrato se baraja y sus filas se reparten uniformemente a lo largo
+    del orden (la k-ésima de un estrato de n filas queda cerca de la
+    posición relativa k/n), así que los primeros m registros contienen de
+    cada estrato una parte proporcional a su tamaño. Con la misma semilla
+    el orden es el mismo, lo que permite reanudar una ejecución.
+
+    Args:
+        df: Conversaciones
+        strata: Columnas que definen los estratos (default: DEFAULT_STRATA;
+            las que no existen se ignoran)
+        seed: Semilla del muestreo
+
+    Returns:
+        DataFrame con las mismas filas en orden de muestreo
+    """
+    if not len(df):
+        return df
+
+    rng = np.random.default_rng(seed)
+    columns = [col for col in (strata or DEFAULT_STRATA) if col in df.columns]
+    if columns:
+        codes = df[columns].astype(str).groupby(columns, sort=False).ngroup().to_numpy()
+    else:
+        codes = np.zeros(len(df), dtype=np.int64)
+
+    shuffled = rng.permutation(len(df))
+    ranks = np.empty(len(df), dtype=np.float64)
+    ranks[shuffled] = pd.Series(codes[shuffled]).groupby(codes[shuffled]).cumcount().to_numpy()
+    sizes = np.bincount(codes)
+
+    keys = (ranks + rng.random(len(df))) / sizes[codes]
+    return df.iloc[np.argsort(keys, kind="stable")]
+
+
+def sequential_looks(total: int, batch_size: int = DEFAULT_BATCH_SIZE, min_samples: int = DEFAULT_MIN_SAMPLES) -> int:
+    """Revisiones que hará compare_adaptive sobre `total` conversaciones."""
+    remaining = max(0, total - min_samples)
+    return 1 + math.ceil(remaining / max(1, batch_size))
+
+
+def comparison_estimate(results: list, confidence: float = DEFAULT_CONFIDENCE, looks: int = 1) -> dict:
+    """
+    Intervalos de la tasa de victorias de la IA y de la diferencia de puntaje.
+
+    La tasa cuenta los empates como media victoria y usa el intervalo de
+    Agresti-Coull (no colapsa a cero con muestras unánimes). La diferencia
+    es ai_score - advisor_score con intervalo normal. Con `looks` > 1 el
+    nivel se corrige por Bonferroni: revisar tras cada tanda no aumenta la
+    probabilidad de cortar con un intervalo que no cubre el valor real.
+
+    Args:
+        results: Comparaciones (las fallidas se ignoran)
+        confidence: Nivel de confianza global
+        looks: Revisiones planificadas (ver sequential_looks)
+
+    Returns:
+        {"n", "win_rate", "win_margin", "score_diff", "score_margin"}
+        (márgenes infinitos con menos de dos comparaciones)
+    """
+    ok = [result for result in results if result and result.get("comparison_success")]
+    n = len(ok)
+    if n < 2:
+        return {"n": n, "win_rate": float("nan"), "win_margin": float("inf"),
+                "score_diff": float("nan"), "score_margin": float("inf")}
+
+    alpha = (1 - confidence) / max(1, looks)
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+
+    wins = np.array([WIN_VALUES.get(result["winner"], 0.5) for result in ok])
+    adjusted = (wins.sum() + z * z / 2) / (n + z * z)
+
+    diffs = np.array([result["ai_score"] - result["advisor_score"] for result in ok], dtype=np.float64)
+
+    return {
+        "n": n,
+        "win_rate": float(wins.mean()),
+        "win_margin": float(z * math.sqrt(adjusted * (1 - adjusted) / (n + z * z))),
+        "score_diff": float(diffs.mean()),
+        "score_margin": float(z * diffs.std(ddof=1) / math.sqrt(n))
+    }
+
+
+def should_stop(
+    estimate: dict,
+    win_margin: float = DEFAULT_WIN_MARGIN,
+    score_margin: float = DEFAULT_SCORE_MARGIN,
+    min_samples: int = DEFAULT_MIN_SAMPLES
+) -> bool:
+    """Indica si ambos intervalos ya son suficientemente angostos."""
+    return (
+        estimate["n"] >= min_samples
+        and estimate["win_margin"] <= win_margin
+        and estimate["score_margin"] <= score_margin
+    )
@@ -2,24 +2,52 @@
 Módulo de Generación de Scripts de Venta
 Genera scripts consolidados a partir de las conversaciones analizadas
 """
-import google.generativeai as genai
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-import time
 
+from modules.backends import create_backend
+from modules.llm import generate_text
+from modules.metrics import run_in_context
+
+
+MODEL_NAME = "gemini-2.0-flash"
+
+DEFAULT_WORKERS = 8
+
+# Análisis de cada caso de uso que entran en su prompt
+USE_CASE_SAMPLE_ROWS = 5
+
+USE_CASE_PROMPT = """Genera un SCRIPT DE VENTAS específico para: {use_case}
+
+INFORMACIÓN DE CONVERSACIONES EXITOSAS:
+{info}
+
+El script debe incluir:
+1. Saludo contextualizado al caso de uso
+2. Preguntas específicas para este tipo de cliente
+3. Información relevante a proporcionar
+4. Datos a solicitar
+5. Cierre apropiado
 
-def generate_sales_script(df: pd.DataFrame, api_key: str) -> str:
+Formato: texto estructurado con frases textuales entre comillas.
+"""
+
+
+def generate_sales_script(df: pd.DataFrame, api_key: str, backend=None) -> str:
     """
     Genera un script de ventas consolidado desde las conversaciones.
 
     Args:
         df: DataFrame con los análisis (debe tener agent_score_numeric)
         api_key: API Key de Gemini
+        backend: LLMBackend a usar (default: según create_backend)
 
     Returns:
         Script de ventas generado
     """
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    backend = backend or create_backend(api_key, MODEL_NAME)
 
     # Filtrar mejores conversaciones (score >= 4)
     if "agent_score_numeric" in df.columns:
@@ -93,14 +121,47 @@ Formato: texto estructurado con secciones claras, frases textuales entre comilla
 """
 
     try:
-        response = model.generate_content(prompt)
-        time.sleep(1)
-        return response.text.strip()
+        text = generate_text(backend, prompt, stage="sales_script")
+        return text.strip()
     except Exception as e:
         return f"Error generando script: {str(e)}"
 
 
-def generate_script_by_use_case(df: pd.DataFrame, api_key: str, use_case: str) -> str:
+def _use_case_prompt(filtered_df: pd.DataFrame, use_case: str) -> str:
+    """Prompt del script de un caso de uso a partir de sus análisis."""
+    info = []
+    if "agent_score_text" in filtered_df.columns:
+        for _, row in filtered_df.head(USE_CASE_SAMPLE_ROWS).iterrows():
+            if pd.notna(row.get("agent_score_text")):
+                info.append(str(row["agent_score_text"]))
+
+    return USE_CASE_PROMPT.format(
+        use_case=use_case,
+        info=chr(10).join(info) if info else "No disponible"
+    )
+
+
+def use_case_fingerprint(filtered_df: pd.DataFrame, use_case: str) -> str:
+    """
+    Huella del script de un caso de uso.
+
+    Se calcula sobre el prompt mismo: cambia solo si cambian las filas y
+    campos que entran en él (agent_score_text de los primeros
+    USE_CASE_SAMPLE_ROWS análisis) o la plantilla USE_CASE_PROMPT.
+    """
+    return _fingerprint(_use_case_prompt(filtered_df, use_case))
+
+
+def _fingerprint(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def generate_script_by_use_case(
+    df: pd.DataFrame,
+    api_key: str,
+    use_case: str,
+    backend=None
+) -> str:
     """
     Genera un script específico para un caso de uso.
 
@@ -108,12 +169,12 @@ def generate_script_by_use_case(df: pd.DataFrame, api_key: str, use_case: str) -
         df: DataFrame con los análisis
         api_key: API Key de Gemini
         use_case: Caso de uso específico
+        backend: LLMBackend a usar (default: según create_backend)
 
     Returns:
         Script específico
     """
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    backend = backend or create_backend(api_key, MODEL_NAME)
 
     # Filtrar por caso de uso
     if "use_case" in df.columns:
@@ -121,31 +182,83 @@ def generate_script_by_use_case(df: pd.DataFrame, api_key: str, use_case: str) -
     else:
         filtered_df = df
 
-    # Recopilar info
-    info = []
-    if "agent_score_text" in filtered_df.columns:
-        for _, row in filtered_df.head(5).iterrows():
-            if pd.notna(row.get("agent_score_text")):
-                info.append(str(row["agent_score_text"]))
+    try:
+        text = generate_text(backend, _use_case_prompt(filtered_df, use_case), stage="use_case_script")
+        return text.strip()
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-    prompt = f"""Genera un SCRIPT DE VENTAS específico para: {use_case}
 
-INFORMACIÓN DE CONVERSACIONES EXITOSAS:
-{chr(10).join(info) if info else "No disponible"}
+def generate_scripts_by_use_case(
+    df: pd.DataFrame,
+    api_key: str,
+    backend=None,
+    previous: dict = None,
+    max_workers: int = DEFAULT_WORKERS,
+    progress_callback=None
+) -> dict:
+    """
+    Genera en paralelo un script por cada caso de uso de los resultados.
 
-El script debe incluir:
-1. Saludo contextualizado al caso de uso
-2. Preguntas específicas para este tipo de cliente
-3. Información relevante a proporcionar
-4. Datos a solicitar
-5. Cierre apropiado
+    Todas las solicitudes comparten el backend, de modo que regenerar el
+    conjunto completo tarda lo que la solicitud más lenta. Los scripts de
+    `previous` cuya huella (ver use_case_fingerprint) coincide se
+    reutilizan sin llamar al modelo.
 
-Formato: texto estructurado con frases textuales entre comillas.
-"""
+    Args:
+        df: DataFrame con los análisis (debe tener use_case)
+        api_key: API Key de Gemini
+        backend: LLMBackend a usar (default: según create_backend)
+        previous: Resultado de una llamada anterior
+        max_workers: Solicitudes concurrentes
+        progress_callback: Función (completados, total)
 
-    try:
-        response = model.generate_content(prompt)
-        time.sleep(1)
-        return response.text.strip()
-    except Exception as e:
-        return f"Error: {str(e)}"
+    Returns:
+        {use_case: {"script", "fingerprint", "success", "reused"}} ordenado
+        por caso de uso
+    """
+    if "use_case" not in df.columns:
+        return {}
+
+    previous = previous or {}
+    frame = df.dropna(subset=["use_case"])
+
+    scripts, pending = {}, {}
+    for use_case, positions in sorted(frame.groupby("use_case").indices.items()):
+        use_case = str(use_case)
+        # Solo las filas que entran en el prompt
+        prompt = _use_case_prompt(frame.iloc[positions[:USE_CASE_SAMPLE_ROWS]], use_case)
+        fingerprint = _fingerprint(prompt)
+        cached = previous.get(use_case)
+        if cached and cached.get("success") and cached.get("fingerprint") == fingerprint:
+            scripts[use_case] = {**cached, "reused": True}
+        else:
+            scripts[use_case] = {"fingerprint": fingerprint}
+            pending[use_case] = prompt
+
+    total = len(scripts)
+    done = total - len(pending)
+    if progress_callback and done:
+        progress_callback(done, total)
+    if not pending:
+        return scripts
+
+    backend = backend or create_backend(api_key, MODEL_NAME)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            run_in_context(executor, generate_text, backend, prompt, stage="use_case_script"): use_case
+            for use_case, prompt in pending.items()
+        }
+        for future in as_completed(futures):
+            use_case = futures[future]
+            try:
+                result = {"script": future.result().strip(), "success": True}
+            except Exception as e:
+                result = {"script": f"Error: {str(e)}", "success": False}
+            scripts[use_case].update(result, reused=False)
+
+            done += 1
+            if progress_callback:
+                progress_callback(done, total)
+
+    return scripts
@@ -0,0 +1,308 @@
+"""
+Módulo de Salida Estructurada
+Declara el esquema JSON de cada respuesta, lo valida localmente y vuelve a
+pedir solo los campos inválidos en una solicitud corta
+"""
+import json
+import re
+import unicodedata
+
+from modules.llm import cache_response, discard_cached, generate_text
+from modules.metrics import get_collector
+
+
+# Reintentos de campos inválidos por respuesta
+DEFAULT_MAX_REASKS = 1
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+_TRUE = {"true", "si", "sí", "yes", "1"}
+_FALSE = {"false", "no", "0"}
+
+
+class SchemaError(ValueError):
+    """Respuesta sin JSON utilizable o con campos inválidos tras los reintentos."""
+
+    def __init__(self, message: str, fields: list = None):
+        super().__init__(message)
+        self.fields = fields or []
+
+
+def response_schema(fields: dict, array: bool = False, extra: dict = None) -> dict:
+    """
+    Esquema en el formato de response_schema de Gemini.
+
+    Los rangos (minimum/maximum) solo se validan localmente: el esquema
+    declara tipos, enumeraciones y campos requeridos.
+
+    Args:
+        fields: {campo: {"type": ..., "enum": [...], "minimum": n, "maximum": n}}
+        array: Arreglo de objetos en lugar de un objeto
+        extra: Campos adicionales del objeto (ej. conversation_id en paquetes)
+
+    Returns:
+        Diccionario serializable a JSON
+    """
+    properties = {}
+    for name, spec in {**(extra or {}), **fields}.items():
+        prop = {"type": spec["type"]}
+        if "enum" in spec:
+            prop["enum"] = list(spec["enum"])
+        properties[name] = prop
+
+    schema = {"type": "object", "properties": properties, "required": list(properties)}
+    return {"type": "array", "items": schema} if array else schema
+
+
+def json_config(fields: dict, array: bool = False, extra: dict = None) -> dict:
+    """generation_config que pide JSON con el esquema de `fields`."""
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": response_schema(fields, array=array, extra=extra)
+    }
+
+
+def parse_json(text: str):
+    """
+    Decodifica el primer valor JSON de una respuesta.
+
+    Acepta bloques ```json y texto antes del JSON; a diferencia de una
+    expresión regular codiciosa, se detiene al cerrar el primer objeto o
+    arreglo completo.
+
+    Raises:
+        SchemaError: Si no hay JSON decodificable
+    """
+    text = _FENCE.sub("", (text or "").strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[\[{]", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+            return value
+        except json.JSONDecodeError:
+            continue
+    raise SchemaError("La respuesta no contiene JSON válido")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.strip().upper())
+    return "".join(c for c in text if not unicodedata.combining(c)).replace(" ", "_")
+
+
+def coerce_field(value, spec: dict):
+    """
+    Valida un valor contra su especificación.
+
+    Se aceptan variantes inequívocas ("4" o 4.0 para un entero, "sí" para
+    un booleano, mayúsculas o tildes distintas en una enumeración).
+
+    Returns:
+        (válido, valor normalizado)
+    """
+    kind = spec["type"]
+
+    if kind == "integer":
+        if isinstance(value, bool):
+            return False, None
+        if isinstance(value, str) and re.fullmatch(r"\s*-?\d+(?:\.0+)?\s*", value):
+            value = float(value)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if not isinstance(value, int):
+            return False, None
+        if not spec.get("minimum", value) <= value <= spec.get("maximum", value):
+            return False, None
+        return True, value
+
+    if kind == "boolean":
+        if isinstance(value, bool):
+            return True, value
+        if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+            return True, value.strip().lower() in _TRUE
+        return False, None
+
+    # string
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and "enum" not in spec:
+        value = str(value)
+    if not isinstance(value, str):
+        return False, None
+    if "enum" in spec:
+        options = {_normalize(option): option for option in spec["enum"]}
+        option = options.get(_normalize(value))
+        return (True, option) if option is not None else (False, None)
+    return True, value
+
+
+def validate(item, fields: dict) -> tuple:
+    """
+    Valida un objeto contra el esquema.
+
+    Returns:
+        (campos válidos normalizados, lista de campos faltantes o inválidos)
+    """
+    if not isinstance(item, dict):
+        return {}, list(fields)
+
+    valid, invalid = {}, []
+    for name, spec in fields.items():
+        ok, value = coerce_field(item.get(name), spec) if name in item else (False, None)
+        if ok:
+            valid[name] = value
+        else:
+            invalid.append(name)
+    return valid, invalid
+
+
+def describe_fields(fields: dict) -> str:
+    """Descripción compacta de los campos para el prompt de re-solicitud."""
+    lines = []
+    for name, spec in fields.items():
+        if "enum" in spec:
+            detail = " | ".join(spec["enum"])
+        elif spec["type"] == "integer" and "minimum" in spec:
+            detail = f"entero del {spec['minimum']} al {spec['maximum']}"
+        else:
+            detail = {"integer": "entero", "boolean": "true o false"}.get(spec["type"], "texto")
+        lines.append(f'  "{name}": <{detail}>')
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+REASK_PROMPT = """{prompt}
+
+TU RESPUESTA ANTERIOR:
+{previous}
+
+Los campos {names} faltan o no cumplen el formato. Responde ÚNICAMENTE con un JSON que contenga solo esos campos:
+{schema}
+"""
+
+
+def complete_fields(
+    backend,
+    prompt: str,
+    previous: str,
+    result: dict,
+    invalid: list,
+    fields: dict,
+    stage: str,
+    retry_budget=None,
+    max_reasks: int = DEFAULT_MAX_REASKS
+) -> dict:
+    """
+    Vuelve a pedir solo los campos inválidos de una respuesta.
+
+    Cada re-solicitud (etapa "{stage}_reask") incluye el prompt original,
+    la respuesta anterior y el esquema de los campos pendientes; los campos
+    ya válidos se conservan. Las re-solicitudes no pasan por la caché (una
+    respuesta inválida guardada se repetiría en cada reintento). Cada
+    respuesta que no valida se registra como fallo de parseo de la etapa.
+
+    Args:
+        backend: LLMBackend a usar
+        prompt: Prompt original (contexto necesario para responder)
+        previous: Texto de la respuesta anterior
+        result: Campos válidos obtenidos hasta ahora
+        invalid: Campos faltantes o inválidos
+        fields: Esquema completo {campo: especificación} (ver coerce_field)
+        stage: Etapa para métricas
+        retry_budget: RetryBudget de la ejecución
+        max_reasks: Re-solicitudes permitidas
+
+    Returns:
+        Diccionario con todos los campos de `fields` normalizados
+
+    Raises:
+        SchemaError: Si quedan campos inválidos tras las re-solicitudes
+        La excepción del modelo si la llamada falla
+    """
+    result = dict(result)
+    for _ in range(max_reasks):
+        if not invalid:
+            break
+        get_collector().record_parse_failure(stage)
+
+        pending = {name: fields[name] for name in invalid}
+        previous = generate_text(
+            backend,
+            REASK_PROMPT.format(
+                prompt=prompt,
+                previous=(previous or "").strip()[:2000],
+                names=", ".join(invalid),
+                schema=describe_fields(pending)
+            ),
+            generation_config=json_config(pending),
+            use_cache=False,
+            retry_budget=retry_budget,
+            stage=f"{stage}_reask"
+        )
+        try:
+            fixed, invalid = validate(parse_json(previous), pending)
+        except SchemaError:
+            fixed = {}
+        result.update(fixed)
+
+    if invalid:
+        get_collector().record_parse_failure(stage)
+        raise SchemaError(f"Campos inválidos en la respuesta: {', '.join(invalid)}", invalid)
+
+    return result
+
+
+def generate_validated(
+    backend,
+    prompt: str,
+    fields: dict,
+    stage: str,
+    retry_budget=None,
+    max_reasks: int = DEFAULT_MAX_REASKS
+) -> dict:
+    """
+    Genera un objeto JSON declarando su esquema y lo valida localmente.
+
+    La respuesta se guarda en la caché solo si valida completa; si no, se
+    descarta de la caché (pudo venir de ella) y los campos inválidos se
+    completan con complete_fields.
+
+    Args:
+        backend: LLMBackend a usar
+        prompt: Prompt a enviar
+        fields: Esquema {campo: especificación} (ver coerce_field)
+        stage: Etapa para métricas
+        retry_budget: RetryBudget de la ejecución
+        max_reasks: Re-solicitudes permitidas
+
+    Returns:
+        Diccionario con todos los campos de `fields` normalizados
+
+    Raises:
+        SchemaError: Si quedan campos inválidos tras las re-solicitudes
+        La excepción del modelo si la llamada falla
+    """
+    config = json_config(fields)
+    text = generate_text(
+        backend,
+        prompt,
+        generation_config=config,
+        retry_budget=retry_budget,
+        stage=stage,
+        cache_result=False
+    )
+    try:
+        result, invalid = validate(parse_json(text), fields)
+    except SchemaError:
+        result, invalid = {}, list(fields)
+
+    if invalid:
+        discard_cached(backend, prompt, config)
+    else:
+        cache_response(backend, prompt, text, config)
+
+    return complete_fields(
+        backend, prompt, text, result, invalid, fields, stage,
+        retry_budget=retry_budget, max_reasks=max_reasks
+    )
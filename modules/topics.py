@@ -0,0 +1,344 @@
+"""
+Módulo de Índice de Temas
+Normaliza los key_topics de los análisis ("Precio", "precio ", "precios" son
+el mismo tema) y los cuenta con operaciones vectorizadas sobre un índice
+persistente que se actualiza por conversación
+"""
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from modules.interests import trie_pattern
+from modules.result_store import DEFAULT_STORE_DIR
+
+
+INDEX_FILENAME = "topics.parquet"
+
+# Columnas por las que se puede filtrar el índice
+FILTER_COLUMNS = ["company_name", "group_name", "use_case"]
+
+INDEX_COLUMNS = ["conversation_id"] + FILTER_COLUMNS + ["key", "topic"]
+
+# Plural regular en español: "colores" -> "color", "intereses" -> "interés",
+# "precios" -> "precio". Se aplica antes de quitar las tildes, así un
+# singular con tilde final ("interés", "país") no se confunde con un plural;
+# solo en palabras de 4+ letras para no tocar "mes", "tres", "dos"
+_LETTER = "[a-záéíóúüñ]"
+_PLURAL = re.compile(
+    rf"(?<={_LETTER}{{2}}[rlndz])es\b"   # consonante + es: colores, canciones
+    rf"|(?<={_LETTER}[eéí]s)es\b"         # s + es: intereses, meses, países
+    rf"|(?<={_LETTER}{{3}}[aeiou])s\b"    # vocal átona + s: precios, clases
+)
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_topic(topic: str) -> tuple:
+    """
+    Normaliza un tema individual.
+
+    Returns:
+        (etiqueta, clave): el texto limpio en minúsculas para mostrar y la
+        clave sin tildes, puntuación ni plural regular para agrupar
+    """
+    label = " ".join(str(topic).split()).lower()
+    key = _PLURAL.sub("", _PUNCTUATION.sub(" ", label.casefold()))
+    key = unicodedata.normalize("NFKD", key).encode("ascii", "ignore").decode("ascii")
+    return label, " ".join(key.split())
+
+
+def normalize_keyword(word: str) -> str:
+    """Normaliza una palabra clave igual que las claves de tema."""
+    return normalize_topic(word)[1]
+
+
+def _split_topics(df: pd.DataFrame) -> tuple:
+    """
+    Temas de cada fila normalizados, una vez por conversación y clave.
+
+    Returns:
+        (filas, códigos, etiquetas, claves): posición de la fila y código del
+        tema por cada (conversación, tema); etiquetas y claves por código
+    """
+    raw = pd.Series(df["key_topics"].to_numpy(), dtype=object).str.split(",").explode().dropna()
+    rows = raw.index.to_numpy(dtype=np.intp)
+
+    # Los temas se repiten mucho: se normalizan solo los valores distintos
+    codes, uniques = pd.factorize(raw)
+    labels, keys = zip(*map(normalize_topic, uniques)) if len(uniques) else ((), ())
+    labels, keys = np.array(labels, dtype=object), np.array(keys, dtype=object)
+    key_codes, key_uniques = pd.factorize(keys)
+
+    # Un tema cuenta una vez por conversación aunque aparezca en dos variantes
+    ids = df["conversation_id"].astype(str).to_numpy() if "conversation_id" in df.columns else np.arange(len(df))
+    pairs = pd.factorize(ids)[0][rows].astype(np.int64) * (len(key_uniques) + 1) + key_codes[codes]
+    keep = np.sort(np.unique(pairs, return_index=True)[1])
+    keep = keep[keys[codes[keep]] != ""]
+    return rows[keep], codes[keep], labels, keys
+
+
+def explode_topics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Una fila por (conversación, tema) con las columnas del índice.
+
+    Args:
+        df: Resultados del análisis con key_topics (separados por coma)
+
+    Returns:
+        DataFrame con INDEX_COLUMNS (vacío si no hay key_topics)
+    """
+    if "key_topics" not in df.columns or not len(df):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+
+    rows, codes, labels, keys = _split_topics(df)
+    ids = (
+        df["conversation_id"].astype(str).to_numpy() if "conversation_id" in df.columns
+        else np.array([f"row_{i}" for i in df.index], dtype=object)
+    )
+    frame = pd.DataFrame({"conversation_id": ids[rows]})
+    for column in FILTER_COLUMNS:
+        if column in df.columns:
+            frame[column] = df[column].fillna("N/A").astype(str).to_numpy()[rows]
+        else:
+            frame[column] = "N/A"
+    frame["key"] = keys[codes]
+    frame["topic"] = labels[codes]
+    return frame
+
+
+def count_topics(frame: pd.DataFrame, columns: list = ()) -> pd.DataFrame:
+    """
+    Conteo de (columnas, clave, tema) de una salida de explode_topics.
+
+    Equivale a value_counts, pero con columnas categóricas solo devuelve
+    las combinaciones presentes (no el producto de todas las categorías).
+
+    Args:
+        frame: Filas (conversación, tema) con 'key' y 'topic'
+        columns: Columnas adicionales por las que agrupar
+
+    Returns:
+        DataFrame con las columnas, 'key', 'topic' y 'count'
+    """
+    return (
+        frame.groupby(list(columns) + ["key", "topic"], observed=True, sort=False)
+        .size().rename("count").reset_index()
+    )
+
+
+def _rank(counts: pd.DataFrame, n: int = None) -> pd.DataFrame:
+    """
+    Ordena temas por frecuencia.
+
+    Los conteos ya vienen agregados (pocas filas), así que se ordenan con
+    numpy: con pandas el costo fijo de cada groupby supera al del cálculo.
+
+    Args:
+        counts: Conteos con 'key', 'topic' y 'count' (una o más filas por clave)
+        n: Cantidad de temas (None: todos)
+
+    Returns:
+        DataFrame con 'topic' (la variante más frecuente de cada clave) y
+        'count'; los empates se ordenan por clave y por etiqueta
+    """
+    if not len(counts):
+        return pd.DataFrame({"topic": pd.Series(dtype=object), "count": pd.Series(dtype=np.int64)})
+
+    key_codes, key_uniques = pd.factorize(np.asarray(counts["key"], dtype=object), sort=True)
+    topic_codes, topic_uniques = pd.factorize(np.asarray(counts["topic"], dtype=object), sort=True)
+    weights = counts["count"].to_numpy(dtype=np.int64)
+
+    totals = np.bincount(key_codes, weights=weights, minlength=len(key_uniques)).astype(np.int64)
+    order = np.argsort(-totals, kind="stable")[:n or None]
+
+    # Variante más frecuente de cada clave: por clave, conteo descendente y etiqueta
+    pairs, inverse = np.unique(key_codes.astype(np.int64) * len(topic_uniques) + topic_codes, return_inverse=True)
+    pair_counts = np.bincount(inverse.ravel(), weights=weights)
+    pair_keys, pair_topics = pairs // len(topic_uniques), pairs % len(topic_uniques)
+    ranked = np.lexsort((pair_topics, -pair_counts, pair_keys))
+    best = ranked[np.r_[True, pair_keys[ranked][1:] != pair_keys[ranked][:-1]]]
+
+    return pd.DataFrame({
+        "topic": topic_uniques[pair_topics[best]][order].astype(str),
+        "count": totals[order]
+    })
+
+
+def top_topics(df: pd.DataFrame, n: int = 20) -> pd.DataFrame:
+    """
+    Temas más frecuentes de un DataFrame de resultados, sin construir un índice.
+
+    Args:
+        df: Resultados del análisis con key_topics
+        n: Cantidad de temas (None: todos)
+
+    Returns:
+        DataFrame con 'topic' y 'count'
+    """
+    if "key_topics" not in df.columns or not len(df):
+        return pd.DataFrame(columns=["topic", "count"])
+
+    # Se cuenta por código de tema (pocos valores) en lugar de por fila
+    _, codes, labels, keys = _split_topics(df)
+    counts = pd.Series(codes).value_counts(sort=False)
+    return _rank(pd.DataFrame({
+        "key": keys[counts.index.to_numpy()],
+        "topic": labels[counts.index.to_numpy()],
+        "count": counts.to_numpy()
+    }), n)
+
+
+def _categorical(frame: pd.DataFrame) -> pd.DataFrame:
+    """Columnas del índice como categorías de texto (mismo tipo en todas las uniones)."""
+    columns = {}
+    for column in INDEX_COLUMNS:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Solo se convierten las categorías, no cada fila
+            columns[column] = values.cat.rename_categories(values.cat.categories.astype(str))
+        else:
+            columns[column] = values.astype(str).astype("category")
+    return pd.DataFrame(columns)
+
+
+class TopicIndex:
+    """
+    Índice de temas por conversación.
+
+    Guarda una fila por (conversación, tema) con columnas categóricas; al
+    actualizar con resultados nuevos, las conversaciones reanalizadas
+    reemplazan sus temas anteriores. Las consultas usan conteos agregados
+    por (empresa, grupo, caso de uso, tema), recalculados una vez después
+    de cada actualización.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Inicializa el índice.
+
+        Args:
+            path: Archivo Parquet donde persistir (None: solo en memoria).
+                Si existe se carga.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._counts = None
+        self._frame = _categorical(pd.DataFrame(columns=INDEX_COLUMNS))
+        if path and Path(path).exists():
+            self._frame = _categorical(pd.read_parquet(path))
+
+    @classmethod
+    def from_results(cls, df: pd.DataFrame) -> "TopicIndex":
+        """Índice en memoria de un DataFrame de resultados."""
+        index = cls()
+        index.update(df)
+        return index
+
+    def update(self, df: pd.DataFrame) -> int:
+        """
+        Agrega o reemplaza los temas de las conversaciones de `df`.
+
+        Args:
+            df: Resultados del análisis (conversation_id, key_topics y,
+                si existen, company_name, group_name, use_case)
+
+        Returns:
+            Filas (conversación, tema) agregadas
+        """
+        new = _categorical(explode_topics(df))
+        ids = df["conversation_id"].astype(str) if "conversation_id" in df.columns else new["conversation_id"]
+
+        with self._lock:
+            if not len(self._frame):
+                self._frame, self._counts = new, None
+                return len(new)
+            old = self._frame[~self._frame["conversation_id"].isin(ids.unique())]
+            # Unión de categorías: no se convierte el índice existente a texto
+            self._frame = pd.DataFrame({
+                column: union_categoricals(
+                    [old[column], new[column]], ignore_order=True
+                )
+                for column in INDEX_COLUMNS
+            })
+            self._counts = None
+        return len(new)
+
+    def save(self) -> None:
+        """Escribe el índice en su archivo Parquet."""
+        if not self.path:
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            frame = self._frame
+        tmp_path = f"{self.path}.tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    def _aggregated(self) -> pd.DataFrame:
+        with self._lock:
+            if self._counts is None:
+                self._counts = count_topics(self._frame, FILTER_COLUMNS)
+            return self._counts
+
+    def _filtered(self, companies=None, groups=None, use_cases=None) -> pd.DataFrame:
+        counts = self._aggregated()
+        for column, values in zip(FILTER_COLUMNS, (companies, groups, use_cases)):
+            if values:
+                counts = counts[counts[column].isin(list(values))]
+        return counts
+
+    def top(self, n: int = 20, companies=None, groups=None, use_cases=None) -> pd.DataFrame:
+        """
+        Temas más frecuentes.
+
+        Args:
+            n: Cantidad de temas (None: todos)
+            companies: Empresas a incluir (default: todas)
+            groups: Grupos a incluir (default: todos)
+            use_cases: Casos de uso a incluir (default: todos)
+
+        Returns:
+            DataFrame con 'topic' y 'count' (conversaciones que lo mencionan)
+        """
+        return _rank(self._filtered(companies, groups, use_cases), n)
+
+    def matching(self, keywords: list, n: int = None, **filters) -> pd.DataFrame:
+        """
+        Temas que contienen alguna palabra clave ("precio" encuentra "precios del x50").
+
+        Args:
+            keywords: Palabras clave (se normalizan como los temas)
+            n: Cantidad de temas (None: todos)
+            **filters: companies, groups, use_cases (ver top)
+
+        Returns:
+            DataFrame con 'topic' y 'count'
+        """
+        counts = self._filtered(**filters)
+        pattern = trie_pattern([normalize_keyword(word) for word in keywords])
+        categories = counts["key"].cat.categories
+        wanted = categories[pd.Series(categories).str.contains(pattern, regex=True).to_numpy()]
+        return _rank(counts[counts["key"].isin(wanted)], n)
+
+    def values(self, column: str) -> list:
+        """Valores presentes de una columna de filtro."""
+        return sorted(self._aggregated()[column].astype(str).unique().tolist())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_topic_index() -> TopicIndex:
+    """Índice persistente del proceso, junto al almacén de resultados (RESULTS_STORE_PATH)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            root = os.environ.get("RESULTS_STORE_PATH", DEFAULT_STORE_DIR)
+            _index = TopicIndex(os.path.join(root, INDEX_FILENAME))
+        return _index
@@ -0,0 +1,104 @@
+"""
+Módulo de Triaje
+Resuelve localmente las conversaciones triviales (sin respuesta del asesor
+o con un único saludo genérico sin seguimiento) antes de llamar al modelo
+"""
+import re
+import unicodedata
+
+from modules.conversation import get_parsed
+from modules.interests import get_default_detector
+
+
+# "¿En qué le puedo ayudar?" y variantes: pregunta genérica sin contenido
+GENERIC_QUESTION = re.compile(
+    r"en (?:que|q) (?:le|les|te|lo|la)? ?(?:puedo|podemos|podria|podriamos) "
+    r"(?:ayudar|servir|apoyar|colaborar|asesorar)"
+)
+
+# Un saludo genérico es corto y no trae datos (precios, cuotas, horarios)
+GENERIC_MAX_WORDS = 30
+_DATA = re.compile(r"[\d$%]")
+
+# Caso de uso según el interés detectado en el bot
+INTEREST_USE_CASES = [
+    ("financiamiento", "FINANCIAMIENTO"),
+    ("test_drive", "PRUEBA_MANEJO"),
+    ("contado", "VENTA_VEHICULO")
+]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def is_generic_greeting(message: str) -> bool:
+    """Indica si un mensaje es solo un saludo con pregunta genérica."""
+    normalized = _normalize(message)
+    return (
+        len(normalized.split()) <= GENERIC_MAX_WORDS
+        and not _DATA.search(normalized)
+        and bool(GENERIC_QUESTION.search(normalized))
+    )
+
+
+def _bot_context(conversation_data: dict) -> tuple:
+    """Intención y caso de uso a partir de lo que el cliente expresó en el bot."""
+    interests = get_default_detector().detect(conversation_data.get("historial_de_mensajes_en_bot"))
+    use_case = next((case for key, case in INTEREST_USE_CASES if interests.get(key)), "OTRO")
+    resumen = interests["resumen"]
+    intention = resumen if resumen not in ("Sin info", "Sin interés específico") else "No determinado"
+    return intention, use_case
+
+
+def triage_conversation(conversation_data: dict):
+    """
+    Evalúa una conversación con reglas si el caso es trivial.
+
+    Casos resueltos localmente:
+    - Historial con el asesor vacío o sin ningún mensaje del asesor (score 1)
+    - Un único mensaje del asesor, saludo con pregunta genérica y sin
+      respuesta del cliente (score 2)
+
+    Args:
+        conversation_data: Diccionario con datos de la conversación
+
+    Returns:
+        Análisis con los mismos campos que analyze_conversation, o None si
+        la conversación debe evaluarla el modelo
+    """
+    parsed = get_parsed(conversation_data, "historial_de_mensajes_en_asesor")
+    turns = list(parsed.items())
+
+    # Texto sin marcadores de rol: no se puede saber quién habló
+    if any(role is None for role, _ in turns):
+        return None
+
+    advisor = [content for role, content in turns if role == "USER" and content.strip()]
+    client_replies = sum(1 for role, _ in turns if role == "CLIENT")
+
+    if not advisor:
+        score = 1
+        summary = "El asesor no respondió al cliente después de la derivación del bot."
+        notes = "Responder al cliente reconociendo el contexto que ya entregó al bot."
+    elif len(advisor) == 1 and client_replies == 0 and is_generic_greeting(advisor[0]):
+        score = 2
+        summary = "Única respuesta: saludo con pregunta genérica, sin reconocer el contexto del bot ni aportar información; el cliente no continuó."
+        notes = "Abrir con el interés que el cliente ya indicó y ofrecer un dato o siguiente paso concreto."
+    else:
+        return None
+
+    intention, use_case = _bot_context(conversation_data)
+    return {
+        "agent_score_numeric": score,
+        "agent_score_text": summary,
+        "first_response_efficient": False,
+        "efficiency_notes": notes,
+        "client_intention": intention,
+        "use_case": use_case,
+        "key_topics": "",
+        "analysis_success": True,
+        "error": None,
+        "error_type": None
+    }
@@ -0,0 +1,27 @@
+from modules.compaction import compact_history
+
+
+def _history(*turns):
+    return "\n".join(f"{role}: {content}" for role, content in turns)
+
+
+def test_consecutive_repeats_collapse():
+    history = _history(("CLIENT", "hola"), ("BOT", "Elige una opción"), ("BOT", "elige una  opción"))
+
+    assert compact_history(history, max_tokens=12) == "CLIENT: hola\nBOT: Elige una opción (x2)"
+
+
+def test_repeated_templates_collapse_only_when_over_budget():
+    reminder = "Le recuerdo que tenemos promociones vigentes este mes"
+    turns = [("CLIENT", "hola"), ("USER", "Buen día, ¿en qué le ayudo?")]
+    for i in range(6):
+        turns += [("CLIENT", f"pregunta {i}"), ("USER", reminder)]
+    history = _history(*turns)
+
+    assert compact_history(history, max_tokens=1000) == history
+
+    compacted = compact_history(history, max_tokens=60)
+    assert compacted.count(reminder) == 1
+    assert f"USER: {reminder} (x6)" in compacted
+    assert "CLIENT: pregunta 5" in compacted
+    assert "omitidos" not in compacted
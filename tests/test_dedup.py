@@ -0,0 +1,67 @@
+from modules.advisor_analyzer import AdvisorAnalyzer
+from modules.dedup import BoundedResults, NearDuplicateIndex
+
+
+class _Analyzer(AdvisorAnalyzer):
+    """Analizador sin backend; falla en las conversaciones de `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.analyzed = []
+
+    def _analyze_batch(self, conversations, progress_callback=None, max_workers=1, journal=None,
+                       pack_size=1, dedup=None, triage=False):
+        if dedup is not None:
+            return self._analyze_deduplicated(conversations, progress_callback, max_workers, journal, pack_size, dedup)
+        self.analyzed.extend(conv["conversation_id"] for conv in conversations)
+        return [
+            {"conversation_id": conv["conversation_id"], "analysis_success": conv["conversation_id"] not in self.failing}
+            for conv in conversations
+        ]
+
+
+def _conversations(ids):
+    return [{"conversation_id": conv_id, "historial_de_mensajes_en_asesor": "hola quiero informes del auto"}
+            for conv_id in ids]
+
+
+def test_bounded_results_evicts_least_recently_used():
+    results = BoundedResults(maxsize=2)
+    results["a"] = 1
+    results["b"] = 2
+    results.get("a")
+    results["c"] = 3
+
+    assert list(results) == ["a", "c"]
+
+
+def test_duplicates_copy_a_successful_representative():
+    analyzer = _Analyzer()
+
+    results = analyzer._analyze_batch(_conversations(["a", "b", "c"]), dedup=NearDuplicateIndex())
+
+    assert analyzer.analyzed == ["a"]
+    assert [r["duplicate_of"] for r in results] == [None, "a", "a"]
+    assert all(r["analysis_success"] for r in results)
+
+
+def test_failed_representative_is_replaced_by_a_duplicate():
+    analyzer = _Analyzer(failing={"a"})
+
+    results = analyzer._analyze_batch(_conversations(["a", "b", "c"]), dedup=NearDuplicateIndex())
+
+    assert analyzer.analyzed == ["a", "b"]
+    assert [r["analysis_success"] for r in results] == [False, True, True]
+    assert [r["duplicate_of"] for r in results] == [None, None, "a"]
+    assert results[2]["conversation_id"] == "c"
+
+
+def test_evicted_representative_is_analyzed_again():
+    analyzer = _Analyzer()
+    dedup = NearDuplicateIndex(max_results=1)
+    analyzer._analyze_batch(_conversations(["a"]), dedup=dedup)
+    dedup.results["otro"] = {}
+
+    analyzer._analyze_batch(_conversations(["b"]), dedup=dedup)
+
+    assert analyzer.analyzed == ["a", "b"]
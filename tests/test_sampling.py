@@ -0,0 +1,88 @@
+import math
+from statistics import NormalDist
+
+import pandas as pd
+import pytest
+
+from modules.sampling import comparison_estimate, sequential_looks, should_stop, stratified_order
+
+
+def _results(winners, diffs):
+    return [
+        {"comparison_success": True, "winner": winner, "ai_score": 3 + diff, "advisor_score": 3}
+        for winner, diff in zip(winners, diffs)
+    ]
+
+
+def test_stratified_order_is_a_seeded_permutation():
+    df = pd.DataFrame({"group_name": ["a"] * 30 + ["b"] * 10, "value": range(40)})
+
+    first = stratified_order(df, strata=["group_name"], seed=7)
+
+    assert sorted(first["value"]) == list(range(40))
+    assert first.index.equals(stratified_order(df, strata=["group_name"], seed=7).index)
+
+
+def test_stratified_order_prefixes_are_proportional():
+    df = pd.DataFrame({"group_name": ["a"] * 300 + ["b"] * 100})
+
+    ordered = stratified_order(df, strata=["group_name"], seed=1)
+
+    for size in (20, 40, 100):
+        share = (ordered["group_name"].head(size) == "b").mean()
+        assert share == pytest.approx(0.25, abs=0.06)
+
+
+def test_stratified_order_ignores_missing_strata_and_empty_frames():
+    df = pd.DataFrame({"value": range(5)})
+
+    assert sorted(stratified_order(df, seed=3)["value"]) == list(range(5))
+    assert stratified_order(df.iloc[:0], seed=3).empty
+
+
+@pytest.mark.parametrize("total, looks", [(0, 1), (30, 1), (31, 2), (50, 2), (51, 3), (130, 6)])
+def test_sequential_looks(total, looks):
+    assert sequential_looks(total, batch_size=20, min_samples=30) == looks
+
+
+def test_estimate_is_bonferroni_corrected():
+    results = _results(["ia", "asesor", "empate", "ia"] * 25, [1, -1, 0, 2] * 25)
+
+    single = comparison_estimate(results, confidence=0.95, looks=1)
+    corrected = comparison_estimate(results, confidence=0.95, looks=5)
+
+    # Con 5 revisiones cada intervalo usa alpha = 0.05 / 5
+    z = NormalDist().inv_cdf(1 - 0.01 / 2)
+    wins = sum({"ia": 1.0, "empate": 0.5, "asesor": 0.0}[r["winner"]] for r in results)
+    adjusted = (wins + z * z / 2) / (100 + z * z)
+    assert corrected["win_margin"] == pytest.approx(z * math.sqrt(adjusted * (1 - adjusted) / (100 + z * z)))
+    assert corrected["win_margin"] > single["win_margin"]
+    assert corrected["score_margin"] > single["score_margin"]
+    assert corrected["win_rate"] == single["win_rate"] == pytest.approx(0.625)
+
+
+def test_estimate_ignores_failed_and_needs_two_results():
+    failed = [{"comparison_success": False, "winner": "error", "ai_score": 0, "advisor_score": 0}]
+
+    estimate = comparison_estimate(_results(["ia"], [1]) + failed)
+
+    assert estimate["n"] == 1
+    assert math.isinf(estimate["win_margin"]) and math.isinf(estimate["score_margin"])
+
+
+def test_should_stop_when_both_intervals_are_narrow():
+    results = _results(["ia"] * 200, [1, 1, 2, 1] * 50)
+
+    estimate = comparison_estimate(results, looks=sequential_looks(400))
+
+    assert should_stop(estimate, win_margin=0.10, score_margin=0.30, min_samples=30)
+
+
+def test_should_not_stop_with_wide_intervals_or_few_samples():
+    split = comparison_estimate(_results(["ia", "asesor"] * 20, [2, -2] * 20), looks=3)
+    unanimous = comparison_estimate(_results(["ia"] * 20, [1] * 20))
+
+    assert not should_stop(split)
+    # Intervalos angostos, pero menos conversaciones que el mínimo
+    assert should_stop(unanimous, win_margin=0.2, score_margin=0.3, min_samples=10)
+    assert not should_stop(unanimous, win_margin=0.2, score_margin=0.3, min_samples=30)
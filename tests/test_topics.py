@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from modules.topics import TopicIndex, explode_topics, normalize_topic, top_topics
+
+
+@pytest.mark.parametrize("singular, plural", [
+    ("interés", "intereses"),
+    ("país", "países"),
+    ("mes", "meses"),
+    ("canción", "canciones"),
+    ("color", "colores"),
+    ("precio", "precios"),
+    ("clase", "clases"),
+])
+def test_plural_shares_key_with_singular(singular, plural):
+    assert normalize_topic(singular)[1] == normalize_topic(plural)[1]
+
+
+@pytest.mark.parametrize("topic, key", [
+    ("Interés", "interes"),
+    ("Intereses ", "interes"),
+    ("tres", "tres"),
+    ("dos", "dos"),
+    ("Pruebas de manejo", "prueba de manejo"),
+])
+def test_normalize_topic_key(topic, key):
+    assert normalize_topic(topic)[1] == key
+
+
+def test_topic_counts_once_per_conversation():
+    df = pd.DataFrame({
+        "conversation_id": ["a", "b", "c"],
+        "key_topics": ["Precio, precios, interés", "intereses,colores", None]
+    })
+
+    frame = explode_topics(df)
+
+    assert sorted(frame.loc[frame["conversation_id"] == "a", "key"]) == ["interes", "precio"]
+    assert top_topics(df, None)["count"].tolist() == [2, 1, 1]
+
+
+def test_top_topics_matches_index():
+    df = pd.DataFrame({
+        "conversation_id": [str(i) for i in range(7)],
+        "key_topics": ["precio, color", "Precios", "interés", "intereses, color", "", "colores", "Interés"]
+    })
+
+    expected = pd.DataFrame({"topic": ["color", "interés", "precio"], "count": [3, 3, 2]})
+
+    pd.testing.assert_frame_equal(top_topics(df, None), expected)
+    pd.testing.assert_frame_equal(TopicIndex.from_results(df).top(None), expected)